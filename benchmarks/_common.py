@@ -0,0 +1,109 @@
+"""
+Utilitários compartilhados pelos benchmarks offline.
+
+Nada aqui acessa serviços externos: banco SQLite temporário (ou DATABASE_URL, ex.: um Postgres local),
+fakeredis no lugar do Redis e Celery em modo eager.
+"""
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fidc_api"))
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+    }
+
+
+def write_result(result, output=None):
+    print(json.dumps(result, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+def add_common_arguments(parser):
+    parser.add_argument("--database-url", help="Banco do benchmark (padrão: SQLite temporário)")
+    parser.add_argument("--with-logs", action="store_true", help="Mantém os logs INFO da aplicação")
+    parser.add_argument("--output")
+
+
+def configure_offline(database_url=None, with_logs=False):
+    """Aponta a aplicação para o banco do benchmark e credenciais fictícias de S3."""
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("MINIO_BUCKET", "fidc-exports")
+    if not with_logs:
+        logging.disable(logging.INFO)
+    return os.environ["DATABASE_URL"]
+
+
+def create_bench_app():
+    """App completo (rotas incluídas) com schema recriado do zero e Redis/Celery locais."""
+    import fakeredis
+    from app import create_app
+    from app.db import db
+    from app.services import idempotency_service, progress_service
+    from app.services.price_cache import price_cache
+    from app.services.rate_limiter import rate_limiter
+    from app.workers import tasks
+
+    redis_client = fakeredis.FakeRedis()
+    progress_service.get_redis_client = lambda: redis_client
+    idempotency_service.get_redis_client = lambda: redis_client
+    price_cache._redis = redis_client
+    rate_limiter._redis = redis_client
+    tasks.celery.conf.task_always_eager = True
+    tasks.celery.conf.task_eager_propagates = True
+
+    app = create_app()
+    tasks.get_worker_app = lambda: app
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def database_dialect(app):
+    from app.db import db
+    with app.app_context():
+        return db.engine.dialect.name
+
+
+class NullS3:
+    """S3 que descarta o conteúdo: isola a memória do exportador da memória do stand-in."""
+
+    def __init__(self):
+        self.bytes_received = 0
+
+    def head_bucket(self, **kwargs):
+        return {}
+
+    def create_bucket(self, **kwargs):
+        return {}
+
+    def put_object(self, Body, **kwargs):
+        self.bytes_received += len(Body)
+        return {}
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "bench"}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        self.bytes_received += len(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {}
@@ -0,0 +1,86 @@
+"""
+Benchmark: vazão e pico de memória da exportação por formato.
+
+- throughput: exportação completa com moto como S3 local (linhas/s e MB/s).
+- peak_memory: mesma exportação sob tracemalloc, com um S3 que descarta o conteúdo,
+  para que o armazenamento do stand-in não entre na conta.
+Roda offline. Uso:
+    python benchmarks/bench_export.py --rows 100000 --formats csv csv.gz parquet --output export.json
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _common import (
+    NullS3, add_common_arguments, configure_offline, create_bench_app, database_dialect, write_result
+)
+
+
+def seed(db, Operation, FidcCash, rows, batch=50_000):
+    db.session.add(FidcCash(fidc_id="FIDC001", available_cash=0.0))
+    start_date = datetime(2024, 9, 1)
+    for start in range(0, rows, batch):
+        db.session.execute(db.insert(Operation), [
+            {
+                "id": f"op_{i:09d}", "asset_code": f"ASSET{i % 50}", "operation_type": "BUY", "quantity": 100,
+                "status": "PROCESSED", "execution_price": 10.5, "total_value": 1055.25, "tax_paid": 5.25,
+                "created_at": start_date + timedelta(seconds=i), "fidc_id": "FIDC001"
+            }
+            for i in range(start, min(rows, start + batch))
+        ])
+    db.session.commit()
+
+
+def run(rows=100_000, formats=("csv", "csv.gz", "parquet"), database_url=None, with_logs=False):
+    configure_offline(database_url, with_logs)
+    app = create_bench_app()
+
+    import boto3
+    from moto import mock_aws
+    from app.db import db
+    from app.db.models import FidcCash, Operation
+    from app.services import export_service
+
+    results = []
+    with app.app_context():
+        seed(db, Operation, FidcCash, rows)
+        for export_format in formats:
+            with mock_aws():
+                export_service.get_s3_client = lambda: boto3.client("s3", region_name="us-east-1")
+                start = time.perf_counter()
+                summary = export_service.export_operations("FIDC001", export_format=export_format)
+                elapsed = time.perf_counter() - start
+
+            null_s3 = NullS3()
+            export_service.get_s3_client = lambda: null_s3
+            tracemalloc.start()
+            export_service.export_operations("FIDC001", export_format=export_format)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results.append({
+                "format": export_format,
+                "rows": summary["total_operations"],
+                "bytes": summary["bytes"],
+                "parts": summary["parts"],
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(summary["total_operations"] / elapsed, 1),
+                "mb_per_sec": round(summary["bytes"] / elapsed / 1024 / 1024, 2),
+                "peak_memory_mb": round(peak / 1024 / 1024, 2),
+            })
+
+    return {"benchmark": "export", "database": database_dialect(app), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "csv.gz", "parquet"])
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    write_result(run(args.rows, args.formats, args.database_url, args.with_logs), args.output)
+
+
+if __name__ == "__main__":
+    main()
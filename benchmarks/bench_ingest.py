@@ -0,0 +1,100 @@
+"""
+Benchmark: vazão de POST /operations/process por tamanho de payload.
+
+Mede o lado da API (validação, criação do job, gravação das operações PENDING e progresso),
+com o disparo do Celery substituído por um stub. Roda offline. Uso:
+    python benchmarks/bench_ingest.py --sizes 10 1000 50000 --output ingest.json
+    python benchmarks/bench_ingest.py --stream   # POST /operations/process:stream (NDJSON)
+"""
+import argparse
+import json
+import time
+
+from _common import add_common_arguments, configure_offline, create_bench_app, database_dialect, summarize, write_result
+
+# Requisições por tamanho de payload (payloads grandes repetem menos)
+DEFAULT_REQUESTS = {10: 200, 1000: 30, 50000: 3}
+
+
+def build_payload(request_index, size):
+    return {
+        "fidc_id": "FIDC001",
+        "operations": [
+            {
+                "id": f"op_{request_index:05d}_{i:06d}",
+                "asset_code": f"ASSET{i % 50}",
+                "operation_type": "BUY" if i % 2 else "SELL",
+                "quantity": 10
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def post_payload(client, payload, stream):
+    if not stream:
+        return client.post("/operations/process", json=payload)
+    body = "".join(json.dumps(op) + "\n" for op in payload["operations"])
+    return client.post(
+        f"/operations/process:stream?fidc_id={payload['fidc_id']}", data=body, content_type="application/x-ndjson"
+    )
+
+
+def run(sizes=(10, 1000, 50000), requests=None, database_url=None, with_logs=False, stream=False):
+    configure_offline(database_url, with_logs)
+    app = create_bench_app()
+
+    from app.db import db
+    from app.db.models import FidcCash
+    from app.workers import tasks
+    tasks.process_operations_job.delay = lambda *args: None
+    with app.app_context():
+        db.session.add(FidcCash(fidc_id="FIDC001", available_cash=0.0))
+        db.session.commit()
+
+    client = app.test_client()
+    results = []
+    request_index = 0
+    for size in sizes:
+        total_requests = requests or DEFAULT_REQUESTS.get(size, 10)
+        payloads = []
+        for _ in range(total_requests):
+            payloads.append(build_payload(request_index, size))
+            request_index += 1
+
+        samples = []
+        for payload in payloads:
+            start = time.perf_counter()
+            response = post_payload(client, payload, stream)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 201:
+                raise RuntimeError(f"Resposta inesperada: {response.status_code} {response.get_data(as_text=True)}")
+
+        elapsed = sum(samples)
+        results.append({
+            "operations_per_request": size,
+            "requests": total_requests,
+            "requests_per_sec": round(total_requests / elapsed, 2),
+            "operations_per_sec": round(total_requests * size / elapsed, 1),
+            "latency": summarize(samples),
+        })
+
+    return {
+        "benchmark": "ingest_stream" if stream else "ingest",
+        "database": database_dialect(app),
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--requests", type=int, help="Requisições por tamanho (padrão: conforme o tamanho)")
+    parser.add_argument("--stream", action="store_true", help="Usa o endpoint NDJSON /operations/process:stream")
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    write_result(run(args.sizes, args.requests, args.database_url, args.with_logs, args.stream), args.output)
+
+
+if __name__ == "__main__":
+    main()
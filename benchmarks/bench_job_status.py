@@ -0,0 +1,101 @@
+"""
+Benchmark: latência da consulta de status de job conforme a tabela operations cresce.
+
+- legacy: três COUNT(*) separados, sem índices (comportamento antigo).
+- aggregate: um único GROUP BY status, com o índice (job_id, status).
+
+Roda offline com SQLite. Uso:
+    python benchmarks/bench_job_status.py --sizes 10000 100000 1000000 --output status.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fidc_api"))
+
+OPERATIONS_PER_JOB = 1000
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+def seed(db, Operation, ProcessingJob, total, batch=50_000):
+    jobs = [f"job_{i:06d}" for i in range(max(1, total // OPERATIONS_PER_JOB))]
+    db.session.execute(db.insert(ProcessingJob), [{"job_id": job_id, "status": "COMPLETED"} for job_id in jobs])
+    created_at = datetime(2024, 9, 1)
+    for start in range(0, total, batch):
+        db.session.execute(db.insert(Operation), [
+            {
+                "id": f"op_{i:09d}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1,
+                "status": "PROCESSED" if i % 10 else "FAILED", "created_at": created_at,
+                "job_id": jobs[i % len(jobs)]
+            }
+            for i in range(start, min(total, start + batch))
+        ])
+    db.session.commit()
+    return jobs[len(jobs) // 2]
+
+def run(sizes=(10_000, 100_000, 500_000), iterations=20):
+    from flask import Flask
+    from app.db import db
+    from app.db.models import Operation, ProcessingJob
+    from app.services.job_service import get_operation_counts
+
+    results = []
+    for size in sizes:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'status.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            job_id = seed(db, Operation, ProcessingJob, size)
+
+            aggregate = timed(lambda: get_operation_counts(job_id), iterations)
+
+            # Remove os índices para reproduzir o cenário antigo
+            for index in Operation.__table__.indexes:
+                index.drop(db.engine)
+
+            def legacy():
+                db.session.query(Operation).filter_by(job_id=job_id).count()
+                db.session.query(Operation).filter_by(job_id=job_id, status="PROCESSED").count()
+                db.session.query(Operation).filter_by(job_id=job_id, status="FAILED").count()
+
+            results.append({
+                "operations": size,
+                "aggregate": aggregate,
+                "legacy": timed(legacy, iterations),
+            })
+            db.session.remove()
+            db.engine.dispose()
+
+    return {"benchmark": "job_status", "operations_per_job": OPERATIONS_PER_JOB, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    result = run(args.sizes, args.iterations)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: vazão do worker em process_operations_job (chord de preparação + liquidação).
+
+Celery em modo eager, fakeredis e preço de ativo determinístico (sem a latência nem as falhas
+simuladas de get_asset_price), para medir o custo próprio do worker. Roda offline. Uso:
+    python benchmarks/bench_worker.py --sizes 1000 10000 50000 --output worker.json
+"""
+import argparse
+import time
+
+from _common import add_common_arguments, configure_offline, create_bench_app, database_dialect, write_result
+
+
+def run(sizes=(1000, 10000, 50000), database_url=None, with_logs=False):
+    configure_offline(database_url, with_logs)
+    app = create_bench_app()
+
+    from app.db import db
+    from app.db.models import FidcCash, ProcessingJob
+    from app.services.operation_service import bulk_insert_pending_operations
+    from app.services.price_cache import price_cache
+    from app.workers import tasks
+
+    price_cache._fetcher = lambda asset_code: 10.0
+
+    results = []
+    with app.app_context():
+        for run_index, size in enumerate(sizes):
+            fidc_id = f"FIDC{run_index:03d}"
+            operations = [
+                {
+                    "id": f"op_{run_index:03d}_{i:07d}",
+                    "asset_code": f"ASSET{i % 50}",
+                    "operation_type": "BUY" if i % 2 else "SELL",
+                    "quantity": 10
+                }
+                for i in range(size)
+            ]
+            db.session.add(FidcCash(fidc_id=fidc_id, available_cash=10_000_000.0))
+            job = ProcessingJob(status="PROCESSING")
+            db.session.add(job)
+            db.session.commit()
+            bulk_insert_pending_operations(job.job_id, operations, fidc_id=fidc_id)
+            db.session.commit()
+            job_id = job.job_id
+            price_cache.clear()
+
+            start = time.perf_counter()
+            tasks.process_operations_job.apply(args=(job_id, fidc_id))
+            elapsed = time.perf_counter() - start
+
+            db.session.expire_all()
+            status = db.session.get(ProcessingJob, job_id).status
+            results.append({
+                "operations": size,
+                "chunks": len(tasks.split_sequence_range(0, size - 1, tasks.JOB_CHUNK_SIZE)),
+                "status": status,
+                "seconds": round(elapsed, 3),
+                "operations_per_sec": round(size / elapsed, 1),
+            })
+
+    return {"benchmark": "worker", "database": database_dialect(app), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    write_result(run(args.sizes, args.database_url, args.with_logs), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: latência de cold start vs. task com app aquecido no worker.
+
+- cold: comportamento antigo, create_app() completo (Swagger, rotas, create_all) a cada task.
+- warm: app do worker criado uma vez por processo (get_worker_app) e reaproveitado.
+
+Roda offline com SQLite. Uso:
+    python benchmarks/bench_worker_bootstrap.py --iterations 50 --output bootstrap.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fidc_api"))
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+    }
+
+def run_task(app):
+    from sqlalchemy import text
+    from app.db import db
+
+    with app.app_context():
+        db.session.execute(text("SELECT 1"))
+        db.session.remove()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+    from app import create_app
+    from app.workers.bootstrap import get_worker_app
+
+    cold = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        run_task(create_app())
+        cold.append(time.perf_counter() - start)
+
+    app = get_worker_app()
+    run_task(app)
+    warm = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        run_task(app)
+        warm.append(time.perf_counter() - start)
+
+    result = {
+        "benchmark": "worker_bootstrap",
+        "iterations": args.iterations,
+        "cold": summarize(cold),
+        "warm": summarize(warm),
+        "speedup_p50": round(statistics.median(cold) / statistics.median(warm), 1),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
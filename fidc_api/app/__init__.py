@@ -1,14 +1,19 @@
 import os
 from flask import Flask
-from flasgger import Swagger
+from flask_migrate import Migrate
 
 from app.db import db
 from app.db import models
-from app.routes import api_bp
-from app.routes.health import health_bp
+from app.db.routing import init_app_read_replicas, replica_binds
+from app.utils.metrics import init_app_metrics
 
-def create_app():
-    app = Flask(__name__)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+def get_database_uri():
+    # DATABASE_URL tem precedência (ex.: SQLite local para benchmarks)
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return database_url
 
     # Config DB via .env
     db_user = os.getenv("DB_USER")
@@ -20,10 +25,51 @@ def create_app():
     if not all([db_user, db_pass, db_name, db_host]):
         raise RuntimeError("Variáveis de ambiente do banco de dados não configuradas corretamente.")
 
-    app.config['SQLALCHEMY_DATABASE_URI'] = (
-        f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-    )
+    return f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+
+def get_engine_options(database_uri):
+    # Pool de conexões configurável (SQLite usa o pool padrão do SQLAlchemy)
+    if database_uri.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+def create_app(worker=False, testing=False):
+    app = Flask(__name__)
+
+    # Testes: SQLite em memória, sem depender das variáveis do banco (o schema vem de db.create_all())
+    database_uri = "sqlite://" if testing else get_database_uri()
+    app.config['TESTING'] = testing
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(database_uri)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Réplicas de leitura (DATABASE_REPLICA_URLS): só a API lê delas; o worker escreve no primário
+    if not (worker or testing):
+        app.config['SQLALCHEMY_BINDS'] = replica_binds(engine_options=get_engine_options)
+
+    # Init DB
+    db.init_app(app)
+
+    # Modo worker: sem Swagger, rotas ou migrations (o schema é responsabilidade da API)
+    if worker:
+        return app
+
+    # Migrations (Alembic): o schema é criado/atualizado com "flask db upgrade"
+    Migrate(app, db, directory=MIGRATIONS_DIR)
+
+    # Comandos de manutenção (flask positions rebuild, flask partitions ensure|archive)
+    from app.cli import partitions_cli, positions_cli
+    app.cli.add_command(positions_cli)
+    app.cli.add_command(partitions_cli)
+
+    from flasgger import Swagger
+    from app.routes import api_bp
+    from app.routes.health import health_bp
+    from app.routes.metrics import metrics_bp
 
     # Swagger
     app.config['SWAGGER'] = {
@@ -32,13 +78,15 @@ def create_app():
     }
     Swagger(app)
 
-    # Init DB
-    db.init_app(app)
-    with app.app_context():
-        db.create_all()
-
     # Registra rotas
     app.register_blueprint(api_bp)
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Latência por rota exposta em /metrics
+    init_app_metrics(app)
+
+    # Endpoints somente leitura (REPLICA_ENDPOINTS) consultam a réplica
+    init_app_read_replicas(app)
 
-    return app
\ No newline at end of file
+    return app
@@ -0,0 +1,48 @@
+import click
+from flask.cli import AppGroup
+from app.services.position_service import PositionsRebuildError, rebuild_positions
+from app.services.partition_service import (
+    archive_partitions, ensure_partitions, is_partitioned,
+    OPERATIONS_ARCHIVE_DROP, OPERATIONS_HOT_MONTHS, OPERATIONS_PARTITIONS_AHEAD
+)
+
+positions_cli = AppGroup("positions", help="Posições materializadas por FIDC.")
+
+@positions_cli.command("rebuild")
+@click.option("--fidc-id", default=None, help="Reconstrói só este FIDC (padrão: todos).")
+def rebuild_positions_command(fidc_id):
+    """Recalcula a tabela positions a partir do histórico de operações PROCESSED."""
+    try:
+        rebuilt = rebuild_positions(fidc_id)
+    except PositionsRebuildError as exc:
+        raise click.ClickException(str(exc))
+    for rebuilt_fidc_id, total in rebuilt.items():
+        click.echo(f"{rebuilt_fidc_id}: {total} posições")
+    click.echo(f"{len(rebuilt)} FIDC(s) reconstruído(s)")
+
+partitions_cli = AppGroup("partitions", help="Partições mensais de operations (Postgres).")
+
+@partitions_cli.command("ensure")
+@click.option("--months-ahead", default=OPERATIONS_PARTITIONS_AHEAD, show_default=True, type=int,
+              help="Meses criados à frente do corrente.")
+def ensure_partitions_command(months_ahead):
+    """Cria as partições do mês corrente e dos próximos meses que ainda não existem."""
+    if not is_partitioned():
+        click.echo("operations não é particionada: nada a fazer")
+        return
+    created = ensure_partitions(months_ahead)
+    for name in created:
+        click.echo(name)
+    click.echo(f"{len(created)} partição(ões) criada(s)")
+
+@partitions_cli.command("archive")
+@click.option("--hot-months", default=OPERATIONS_HOT_MONTHS, show_default=True, type=int,
+              help="Meses mantidos no banco, contando o corrente.")
+@click.option("--drop/--keep", default=OPERATIONS_ARCHIVE_DROP, show_default=True,
+              help="Remove a partição do banco depois de desanexada.")
+def archive_partitions_command(hot_months, drop):
+    """Exporta para o S3 e desanexa as partições fora da janela quente."""
+    archived = archive_partitions(hot_months, drop=drop)
+    for item in archived:
+        click.echo(f"{item['partition']}: {item['operations']} operações em s3://{item['bucket']}/{item['key']}")
+    click.echo(f"{len(archived)} partição(ões) arquivada(s)")
@@ -1,3 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
\ No newline at end of file
+from app.db.routing import RoutingSession
+
+# Sessão com roteamento de leituras para réplicas (ver app.db.routing)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
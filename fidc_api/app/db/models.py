@@ -32,6 +32,75 @@ class Operation(db.Model):
     execution_price = db.Column(db.Float, nullable=True)
     total_value = db.Column(db.Float, nullable=True)
     tax_paid = db.Column(db.Float, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Coluna de partição no Postgres (partições mensais, migração 0006): a PK física é (id, created_at)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     job_id = db.Column(db.String, db.ForeignKey("processing_jobs.job_id"))
-    fidc_id = db.Column(db.String, db.ForeignKey("fidc_cash.fidc_id"), nullable=True)
\ No newline at end of file
+    fidc_id = db.Column(db.String, db.ForeignKey("fidc_cash.fidc_id"), nullable=True)
+    # Posição da operação no envio: o worker lê e liquida as operações do job nessa ordem
+    sequence = db.Column(db.Integer, nullable=True)
+    # Motivo da falha definitiva (status FAILED): preço indisponível após as tentativas, tipo inválido
+    failure_reason = db.Column(db.String, nullable=True)
+
+    __table_args__ = (
+        # Status do job: contagem agrupada por status dentro de um job
+        db.Index("ix_operations_job_id_status", "job_id", "status"),
+        # Worker: leitura das operações do job em ordem de envio, por faixa de sequence
+        db.Index("ix_operations_job_id_sequence", "job_id", "sequence"),
+        # Exportação: filtro por FIDC e intervalo de created_at
+        db.Index("ix_operations_fidc_id_created_at", "fidc_id", "created_at"),
+        # Exportação incremental: operação PENDING mais antiga
+        db.Index("ix_operations_status_created_at", "status", "created_at"),
+        db.Index("ix_operations_asset_code", "asset_code"),
+    )
+
+class OperationId(db.Model):
+    """
+    Registro dos ids de operação, gravado junto com operations. Com operations particionada a PK
+    (id, created_at) não garante o id sozinho: a PK desta tabela garante, inclusive contra
+    ids de partições já arquivadas.
+    """
+    __tablename__ = "operation_ids"
+
+    id = db.Column(db.String, primary_key=True)
+
+class ArchivedPartition(db.Model):
+    """
+    Partições de operations arquivadas no S3 e desanexadas (ou removidas) do banco. Gravada antes do
+    DETACH: com algum registro, o histórico em operations está incompleto (rebuild de posições recusado).
+    """
+    __tablename__ = "archived_partitions"
+
+    partition = db.Column(db.String, primary_key=True)
+    bucket = db.Column(db.String, nullable=False)
+    key = db.Column(db.String, nullable=False)
+    operations = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Position(db.Model):
+    """Posição materializada do FIDC por ativo, atualizada pelo worker no mesmo commit do caixa."""
+    __tablename__ = "positions"
+
+    fidc_id = db.Column(db.String, db.ForeignKey("fidc_cash.fidc_id"), primary_key=True)
+    asset_code = db.Column(db.String, primary_key=True)
+    # Quantidade líquida (negativa em posição vendida)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    # Custo médio por unidade, com taxas (zero quando a posição está zerada)
+    average_cost = db.Column(db.Float, nullable=False, default=0.0)
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExportManifest(db.Model):
+    __tablename__ = "export_manifests"
+
+    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    fidc_id = db.Column(db.String, nullable=False)
+    format = db.Column(db.String, nullable=False)
+    watermark_created_at = db.Column(db.DateTime, nullable=True)
+    watermark_id = db.Column(db.String, nullable=True)
+    object_keys = db.Column(db.JSON, nullable=False, default=list)
+    total_operations = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_export_manifests_fidc_id_format_created_at", "fidc_id", "format", "created_at"),
+    )
@@ -0,0 +1,171 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Réplicas de leitura: URLs separadas por vírgula, registradas como binds replica_0, replica_1, ...
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_BIND_PREFIX = "replica_"
+# Endpoints somente leitura atendidos pela réplica
+REPLICA_ENDPOINTS = frozenset(
+    endpoint.strip()
+    for endpoint in os.getenv(
+        "REPLICA_ENDPOINTS",
+        "api.jobs.job_status,api.jobs.job_events,api.jobs.jobs_status_batch,api.operations.export_operations,"
+        "api.fidcs.fidc_positions"
+    ).split(",")
+    if endpoint.strip()
+)
+# Guarda de atraso: réplica com lag acima do limite não recebe leituras (volta ao primário)
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+
+# Na réplica: 0 se tudo o que foi recebido já foi aplicado, senão a idade da última transação aplicada.
+# No primário as funções retornam NULL (lag 0)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Chaves em session.info
+READ_REPLICA = "read_replica"
+FORCE_PRIMARY = "force_primary"
+WROTE = "wrote"
+REPLICA_BIND = "replica_bind"
+
+_replica_lag = {}
+_replica_lag_lock = threading.Lock()
+
+
+def replica_binds(replica_urls=None, engine_options=None):
+    """Binds do Flask-SQLAlchemy (SQLALCHEMY_BINDS) para as réplicas configuradas."""
+    engine_options = engine_options or (lambda url: {})
+    return {
+        f"{REPLICA_BIND_PREFIX}{index}": {"url": url, **engine_options(url)}
+        for index, url in enumerate(DATABASE_REPLICA_URLS if replica_urls is None else replica_urls)
+    }
+
+
+def _is_read(clause):
+    # SELECT ... FOR UPDATE trava linhas: só o primário
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def replica_lag(engine):
+    """Atraso de replicação em segundos. Bancos sem replicação nativa (SQLite) contam como sem atraso."""
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as connection:
+        return float(connection.execute(REPLICA_LAG_SQL).scalar() or 0.0)
+
+
+def is_replica_fresh(name, engine):
+    """Lag da réplica dentro de REPLICA_MAX_LAG_SECONDS, medido no máximo a cada REPLICA_LAG_CHECK_INTERVAL."""
+    now = time.monotonic()
+    with _replica_lag_lock:
+        checked = _replica_lag.get(name)
+    if checked is None or now - checked[0] >= REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = replica_lag(engine)
+        except Exception as exc:
+            logger.warning("Falha ao medir o atraso da réplica", extra={"replica": name, "error": str(exc)})
+            lag = float("inf")
+        with _replica_lag_lock:
+            _replica_lag[name] = (now, lag)
+        if lag > REPLICA_MAX_LAG_SECONDS:
+            logger.warning("Réplica atrasada: leituras no primário", extra={
+                "replica": name,
+                "lag_seconds": lag,
+                "max_lag_seconds": REPLICA_MAX_LAG_SECONDS
+            })
+    else:
+        lag = checked[1]
+    return lag <= REPLICA_MAX_LAG_SECONDS
+
+
+class RoutingSession(Session):
+    """
+    Sessão que envia leituras para uma réplica quando a requisição foi marcada como somente leitura.
+    - Só SELECT sem FOR UPDATE vai para a réplica; flush, UPDATE/INSERT/DELETE e SQL textual ficam no primário.
+    - Depois da primeira escrita da sessão, as leituras voltam ao primário (read-after-write).
+    - A réplica é fixada por sessão e descartada se o lag passar de REPLICA_MAX_LAG_SECONDS.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not _is_read(clause)):
+                self.info[WROTE] = True
+            elif self.reads_from_replica():
+                replica = self._replica()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self):
+        return bool(self.info.get(READ_REPLICA) and not self.info.get(FORCE_PRIMARY) and not self.info.get(WROTE))
+
+    def _replica(self):
+        engines = self._db.engines
+        name = self.info.get(REPLICA_BIND)
+        if name is None:
+            candidates = [key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+            if not candidates:
+                return None
+            name = self.info[REPLICA_BIND] = random.choice(candidates)
+        if not is_replica_fresh(name, engines[name]):
+            return None
+        return engines[name]
+
+
+def reads_from_replica():
+    """A sessão atual está lendo de uma réplica (requisição somente leitura, sem escrita até aqui)."""
+    from app.db import db
+
+    session = db.session()
+    return isinstance(session, RoutingSession) and session.reads_from_replica()
+
+
+@contextmanager
+def use_primary():
+    """Força as leituras do bloco no primário (ex.: dado recém-gravado, ainda não replicado)."""
+    from app.db import db
+
+    info = db.session.info
+    previous = info.get(FORCE_PRIMARY)
+    info[FORCE_PRIMARY] = True
+    try:
+        yield
+    finally:
+        info[FORCE_PRIMARY] = previous
+
+
+def init_app_read_replicas(app, endpoints=REPLICA_ENDPOINTS):
+    """Marca as requisições dos endpoints somente leitura para usar a réplica, se houver uma configurada."""
+    from app.db import db
+
+    if not app.config.get("SQLALCHEMY_BINDS"):
+        return
+
+    def reset_routing():
+        for key in (READ_REPLICA, FORCE_PRIMARY, WROTE, REPLICA_BIND):
+            db.session.info.pop(key, None)
+
+    # A sessão pode sobreviver à requisição (app context externo): o roteamento vale só dentro dela
+    @app.before_request
+    def route_reads_to_replica():
+        reset_routing()
+        if request.endpoint in endpoints:
+            db.session.info[READ_REPLICA] = True
+
+    @app.teardown_request
+    def reset_replica_routing(exc=None):
+        reset_routing()
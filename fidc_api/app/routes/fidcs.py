@@ -0,0 +1,70 @@
+from flask import Blueprint, jsonify
+from flasgger.utils import swag_from
+from app.db import db
+from app.db.models import FidcCash
+from app.services.position_service import get_positions
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+fidcs_bp = Blueprint("fidcs", __name__)
+
+@fidcs_bp.route("/<fidc_id>/positions", methods=["GET"])
+@swag_from({
+    "tags": ["FIDCs"],
+    "description": "Posição atual do FIDC por ativo (quantidade, custo médio e resultado realizado)",
+    "parameters": [{
+        "name": "fidc_id",
+        "in": "path",
+        "type": "string",
+        "required": True
+    }],
+    "responses": {
+        200: {
+            "description": "Posições do FIDC",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "fidc_id": {"type": "string"},
+                    "available_cash": {"type": "number"},
+                    "positions": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "asset_code": {"type": "string"},
+                                "quantity": {"type": "integer"},
+                                "average_cost": {"type": "number"},
+                                "realized_pnl": {"type": "number"},
+                                "updated_at": {"type": ["string", "null"], "format": "date-time"}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        404: {"description": "FIDC não encontrado"}
+    }
+})
+def fidc_positions(fidc_id):
+    fidc = db.session.get(FidcCash, fidc_id)
+    if not fidc:
+        logger.warning("FIDC não encontrado", extra={"fidc_id": fidc_id})
+        return jsonify({"error": "FIDC not found"}), 404
+
+    # Tabela materializada: uma linha por ativo, sem varrer operations
+    positions = get_positions(fidc_id)
+    return jsonify({
+        "fidc_id": fidc_id,
+        "available_cash": fidc.available_cash,
+        "positions": [
+            {
+                "asset_code": position.asset_code,
+                "quantity": position.quantity,
+                "average_cost": position.average_cost,
+                "realized_pnl": position.realized_pnl,
+                "updated_at": position.updated_at.isoformat() if position.updated_at else None
+            }
+            for position in positions
+        ]
+    }), 200
@@ -1,13 +1,58 @@
-from flask import Blueprint, jsonify
+import json
+import os
+import time
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flasgger.utils import swag_from
-from app.db.models import ProcessingJob, Operation
+from app.db.models import ProcessingJob
 from app.db import db
+from app.db.routing import reads_from_replica, use_primary
+from app.schemas.schemas import JobStatusBatchSchema
+from marshmallow import ValidationError
+from app.services.job_service import get_operation_counts, get_jobs_status
+from app.services.progress_service import (
+    TERMINAL_STATUSES, get_job_progress, subscribe_job_events, wait_for_job_event
+)
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 jobs_bp = Blueprint("jobs", __name__)
 
+# Long-poll: tempo máximo que uma requisição pode ficar aguardando (?wait=<segundos>)
+JOB_STATUS_MAX_WAIT = float(os.getenv("JOB_STATUS_MAX_WAIT", "30"))
+# SSE: intervalo do heartbeat (mantém proxies abertos) e duração máxima da conexão
+JOB_EVENTS_HEARTBEAT = float(os.getenv("JOB_EVENTS_HEARTBEAT", "15"))
+JOB_EVENTS_MAX_DURATION = float(os.getenv("JOB_EVENTS_MAX_DURATION", "3600"))
+
+def load_job_status(job_id):
+    """
+    Monta o status do job: progresso ao vivo publicado pelo worker no Redis e banco apenas como fallback.
+    Retorna (payload, source) ou (None, None) se o job não existir.
+    """
+    progress = get_job_progress(job_id)
+    if progress:
+        return {"job_id": job_id, **progress}, "redis"
+
+    # Busca o job pelo ID; job recém-criado pode ainda não estar na réplica
+    job = db.session.get(ProcessingJob, job_id)
+    if not job and reads_from_replica():
+        with use_primary():
+            job = db.session.get(ProcessingJob, job_id)
+    if not job:
+        return None, None
+
+    # Contagem das operações do job por status (uma única consulta agregada)
+    counts = get_operation_counts(job_id)
+    payload = {
+        "job_id": job.job_id,
+        "status": job.status,
+        **counts,
+        "prepared": None,
+        "ops_per_sec": None,
+        "estimated_completion": job.completed_at.isoformat() if job.completed_at else None
+    }
+    return payload, "database"
+
 @jobs_bp.route("/<job_id>/status", methods=["GET"])
 @swag_from({
     "tags": ["Jobs"],
@@ -17,6 +62,17 @@ jobs_bp = Blueprint("jobs", __name__)
         "in": "path",
         "type": "string",
         "required": True
+    }, {
+        "name": "wait",
+        "in": "query",
+        "type": "number",
+        "required": False,
+        "description": "Long-poll: segundos para aguardar a próxima mudança de status (máx. JOB_STATUS_MAX_WAIT)"
+    }, {
+        "name": "If-None-Match",
+        "in": "header",
+        "type": "string",
+        "required": False
     }],
     "responses": {
         200: {
@@ -27,42 +83,154 @@ jobs_bp = Blueprint("jobs", __name__)
                     "job_id": {"type": "string"},
                     "status": {"type": "string"},
                     "total_operations": {"type": "integer"},
-                    "processed": {"type": "integer"},
-                    "failed": {"type": "integer"},
+                    "prepared": {
+                        "type": ["integer", "null"],
+                        "description": "Operações já precificadas e validadas (null quando lido do banco)"
+                    },
+                    "processed": {
+                        "type": "integer",
+                        "description": "Operações liquidadas: só avança na liquidação, de uma vez ao final do job"
+                    },
+                    "failed": {
+                        "type": "integer",
+                        "description": "Falhas definitivas, somadas a cada chunk preparado"
+                    },
+                    "ops_per_sec": {"type": ["number", "null"]},
                     "estimated_completion": {"type": ["string", "null"], "format": "date-time"}
                 }
             }
         },
+        304: {"description": "Status inalterado desde o ETag informado em If-None-Match"},
         404: {"description": "Job não encontrado"}
     }
 })
 def job_status(job_id):
-    # Busca o job pelo ID
-    job = db.session.get(ProcessingJob, job_id)
-    if not job:
-        logger.warning("Job não encontrado na consulta de status", extra={"job_id": job_id})
-        return jsonify({"error": "Job not found"}), 404
+    wait = min(request.args.get("wait", 0, type=float) or 0, JOB_STATUS_MAX_WAIT)
 
-    # Busca operações relacionadas ao job
-    total_operations = db.session.query(Operation).filter_by(job_id=job_id).count()
-    processed = db.session.query(Operation).filter_by(job_id=job_id, status="PROCESSED").count()
-    failed = db.session.query(Operation).filter_by(job_id=job_id, status="FAILED").count()
+    # Assina o canal antes da leitura para não perder eventos publicados entre as duas
+    pubsub = subscribe_job_events(job_id) if wait > 0 else None
+    try:
+        payload, source = load_job_status(job_id)
+        if not payload:
+            logger.warning("Job não encontrado na consulta de status", extra={"job_id": job_id})
+            return jsonify({"error": "Job not found"}), 404
 
-    estimated_completion = job.completed_at.isoformat() if job.completed_at else None
+        # Long-poll: se o cliente já tem a versão atual (ou não informou ETag), aguarda o próximo
+        # evento do worker ou o timeout antes de responder
+        if wait > 0 and payload["status"] not in TERMINAL_STATUSES:
+            response = jsonify(payload)
+            response.add_etag()
+            if not request.if_none_match or request.if_none_match.contains(response.get_etag()[0]):
+                if wait_for_job_event(pubsub, wait):
+                    payload, source = load_job_status(job_id)
+    finally:
+        if pubsub is not None:
+            pubsub.close()
 
     logger.info("Consulta de status do job realizada com sucesso", extra={
         "job_id": job_id,
-        "status": job.status,
-        "total_operations": total_operations,
-        "processed": processed,
-        "failed": failed
+        "status": payload["status"],
+        "total_operations": payload["total_operations"],
+        "processed": payload["processed"],
+        "failed": payload["failed"],
+        "source": source,
+        "wait": wait
     })
 
-    return jsonify({
-        "job_id": job.job_id,
-        "status": job.status,
-        "total_operations": total_operations,
-        "processed": processed,
-        "failed": failed,
-        "estimated_completion": estimated_completion
-    })
\ No newline at end of file
+    # ETag sobre o conteúdo: polls sem mudança recebem 304 sem corpo
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+@jobs_bp.route("/<job_id>/events", methods=["GET"])
+@swag_from({
+    "tags": ["Jobs"],
+    "description": (
+        "Stream Server-Sent Events com o status do job: um evento 'status' a cada progresso "
+        "publicado pelo worker, encerrando após COMPLETED ou FAILED"
+    ),
+    "produces": ["text/event-stream"],
+    "parameters": [{
+        "name": "job_id",
+        "in": "path",
+        "type": "string",
+        "required": True
+    }],
+    "responses": {
+        200: {"description": "Stream de eventos do job"},
+        404: {"description": "Job não encontrado"}
+    }
+})
+def job_events(job_id):
+    pubsub = subscribe_job_events(job_id)
+    payload, _ = load_job_status(job_id)
+    if not payload:
+        if pubsub is not None:
+            pubsub.close()
+        logger.warning("Job não encontrado no stream de eventos", extra={"job_id": job_id})
+        return jsonify({"error": "Job not found"}), 404
+
+    def stream(payload):
+        deadline = time.monotonic() + JOB_EVENTS_MAX_DURATION
+        try:
+            yield _sse_event(payload)
+            while payload["status"] not in TERMINAL_STATUSES and time.monotonic() < deadline:
+                event = wait_for_job_event(pubsub, JOB_EVENTS_HEARTBEAT)
+                current, _ = load_job_status(job_id)
+                if current is None:
+                    break
+                # Sem evento no intervalo: relê o status mesmo assim (cobre eventos perdidos)
+                if current != payload:
+                    payload = current
+                    yield _sse_event(payload)
+                elif event is None:
+                    yield ": keepalive\n\n"
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+            logger.info("Stream de eventos do job encerrado", extra={"job_id": job_id, "status": payload["status"]})
+
+    return Response(
+        stream_with_context(stream(payload)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@jobs_bp.route("/status:batch", methods=["POST"])
+@swag_from({
+    "tags": ["Jobs"],
+    "description": (
+        "Consulta o status de vários jobs em uma requisição (duas consultas ao banco, "
+        "independente da quantidade). Jobs inexistentes são informados na própria lista"
+    ),
+    "parameters": [{
+        "in": "body",
+        "name": "body",
+        "schema": {
+            "example": {"job_ids": ["uuid-1", "uuid-2"]}
+        }
+    }],
+    "responses": {
+        200: {"description": "Status dos jobs, na ordem dos job_ids informados"},
+        400: {"description": "Payload inválido ou acima de JOB_STATUS_BATCH_MAX_IDS job_ids"}
+    }
+})
+def jobs_status_batch():
+    try:
+        validated = JobStatusBatchSchema().load(request.get_json(silent=True) or {})
+    except ValidationError as err:
+        logger.warning("Payload inválido para status em lote", extra={"error": err.messages})
+        return jsonify({"error": "Invalid input", "messages": err.messages}), 400
+
+    job_ids = list(dict.fromkeys(validated["job_ids"]))
+    statuses = get_jobs_status(job_ids)
+    jobs = [statuses.get(job_id, {"job_id": job_id, "error": "Job not found"}) for job_id in job_ids]
+
+    logger.info("Consulta de status em lote realizada com sucesso", extra={
+        "requested": len(job_ids),
+        "found": len(statuses)
+    })
+    return jsonify({"jobs": jobs})
+
+def _sse_event(payload):
+    return f"event: status\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from app.utils.metrics import render_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    # Formato de exposição do Prometheus (fora do Swagger, como o /health)
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
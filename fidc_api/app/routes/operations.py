@@ -1,25 +1,38 @@
-import os
-import csv
 import io
-from datetime import datetime
+import os
 from flask import Blueprint, request, jsonify
 from flasgger.utils import swag_from
-from app.db.models import ProcessingJob, Operation
+from app.db.models import FidcCash, ProcessingJob
 from app.db import db
 from app.schemas.schemas import ProcessOperationsSchema, ExportOperationsSchema
 from marshmallow import ValidationError
-from app.utils.s3_client import get_s3_client
+from sqlalchemy.exc import IntegrityError
+from app.services.operation_service import (
+    bulk_insert_pending_operations, delete_job_operations, find_existing_operation_ids, ingest_ndjson_operations,
+    is_unique_violation
+)
+from app.services import export_service, idempotency_service
+from app.services.progress_service import start_job_progress
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 operations_bp = Blueprint("operations", __name__)
 
+STREAM_READ_BUFFER_SIZE = 64 * 1024
+# Payloads JSON acima do limite são recusados: lotes grandes devem usar /operations/process:stream
+PROCESS_MAX_PAYLOAD_BYTES = int(os.getenv("PROCESS_MAX_PAYLOAD_BYTES", str(10 * 1024 * 1024)))
+
 @operations_bp.route("/process", methods=["POST"])
 @swag_from({
     "tags": ["Operations"],
     "description": "Cria um job e processa operações",
     "parameters": [{
+        "name": "Idempotency-Key",
+        "in": "header",
+        "type": "string",
+        "required": False
+    }, {
         "in": "body",
         "name": "body",
         "schema": {
@@ -37,44 +50,234 @@ operations_bp = Blueprint("operations", __name__)
         }
     }],
     "responses": {
-        201: {"description": "Job criado com sucesso"}
+        201: {"description": "Job criado com sucesso"},
+        400: {"description": "Payload inválido"},
+        404: {"description": "FIDC não encontrado"},
+        409: {"description": "Operações já existentes, ou requisição original com a mesma Idempotency-Key ainda em andamento"},
+        413: {"description": "Payload acima de PROCESS_MAX_PAYLOAD_BYTES (use /operations/process:stream)"},
+        422: {"description": "Idempotency-Key já utilizada com outro payload"}
     }
 })
 def process_operations():
     from app.workers.tasks import process_operations_job
+    if request.content_length is not None and request.content_length > PROCESS_MAX_PAYLOAD_BYTES:
+        logger.warning("Payload de processamento acima do limite", extra={
+            "content_length": request.content_length,
+            "limit": PROCESS_MAX_PAYLOAD_BYTES
+        })
+        return jsonify({
+            "error": "Payload too large",
+            "message": "Use POST /operations/process:stream (NDJSON) para lotes grandes",
+            "limit_bytes": PROCESS_MAX_PAYLOAD_BYTES
+        }), 413
     data = request.get_json()
     try:
         validated = ProcessOperationsSchema().load(data)
     except ValidationError as err:
         logger.warning("Payload inválido para processamento de operações", extra={"error": err.messages})
         return jsonify({"error": "Invalid input", "messages": err.messages}), 400
+    if db.session.get(FidcCash, validated["fidc_id"]) is None:
+        return fidc_not_found(validated["fidc_id"])
 
-    # Cria o job de processamento
-    job = ProcessingJob(status="PROCESSING")
-    db.session.add(job)
-    db.session.commit()
-    logger.info("Job de processamento criado", extra={"job_id": job.job_id})
-
-    # Salva as operações associadas ao job
-    for op_data in validated["operations"]:
-        op = Operation(
-            id=op_data["id"],
-            asset_code=op_data["asset_code"],
-            operation_type=op_data["operation_type"],
-            quantity=op_data["quantity"],
-            job_id=job.job_id,
-            status="PENDING"
-        )
-        db.session.add(op)
-    db.session.commit()
-    logger.info("Operações associadas ao job salvas", extra={"job_id": job.job_id, "total_operations": len(validated["operations"])})
+    # Reenvios (pela Idempotency-Key ou, sem ela, pelo hash do payload) devolvem o job original
+    # sem criar outro job nem tocar a fila do worker
+    fingerprint = idempotency_service.payload_fingerprint(request.get_data())
+    idempotency_key = idempotency_service.idempotency_key(
+        f"process:{validated['fidc_id']}", request.headers.get("Idempotency-Key"), fingerprint
+    )
+    replay = reserve_idempotency_key(idempotency_key, fingerprint)
+    if replay is not None:
+        return replay
+
+    # Depois da idempotência: o reenvio de um job aceito encontra as próprias operações gravadas
+    existing = find_existing_operation_ids(op_data["id"] for op_data in validated["operations"])
+    if existing:
+        idempotency_service.release(idempotency_key)
+        logger.warning("Operações já existentes no processamento", extra={"existing": len(existing)})
+        return jsonify({"error": "Operações já existentes", "ids": sorted(existing)[:100]}), 409
+
+    try:
+        # Cria o job de processamento
+        job = ProcessingJob(status="PROCESSING")
+        db.session.add(job)
+        db.session.commit()
+        logger.info("Job de processamento criado", extra={"job_id": job.job_id})
+
+        # Salva as operações associadas ao job (PENDING, em lote)
+        try:
+            bulk_insert_pending_operations(job.job_id, validated["operations"], fidc_id=validated["fidc_id"])
+            db.session.commit()
+        except IntegrityError as exc:
+            # Job ainda não despachado: sai junto com as operações (NOT NULL/FK também chegam aqui)
+            job_id = job.job_id
+            discard_job(job_id)
+            if not is_unique_violation(exc):
+                raise
+            # Outra requisição gravou algum dos ids depois da verificação (PK de operation_ids)
+            idempotency_service.release(idempotency_key)
+            logger.warning("Operações já existentes no processamento", extra={"job_id": job_id})
+            return jsonify({"error": "Operações já existentes"}), 409
+        logger.info("Operações associadas ao job salvas", extra={"job_id": job.job_id, "total_operations": len(validated["operations"])})
+
+        # Progresso ao vivo do job no Redis (consultado por /jobs/<job_id>/status)
+        start_job_progress(job.job_id, len(validated["operations"]))
 
-    # Dispara o processamento assíncrono (Celery)
-    process_operations_job.delay(job.job_id, validated["fidc_id"], validated["operations"])
-    logger.info("Processamento assíncrono disparado", extra={"job_id": job.job_id})
+        # Dispara o processamento assíncrono (Celery): a mensagem leva só os ids,
+        # o worker lê as operações PENDING do banco
+        process_operations_job.delay(job.job_id, validated["fidc_id"])
+        logger.info("Processamento assíncrono disparado", extra={"job_id": job.job_id})
+    except Exception:
+        idempotency_service.release(idempotency_key)
+        raise
+    idempotency_service.complete(idempotency_key, job.job_id, fingerprint)
 
     return jsonify({"job_id": job.job_id, "message": "Job criado com sucesso"}), 201
 
+def fidc_not_found(fidc_id):
+    # As operações guardam o fidc_id (FK) desde a ingestão: o FIDC precisa existir antes do job
+    logger.warning("FIDC não encontrado para processamento", extra={"fidc_id": fidc_id})
+    return jsonify({"error": "FIDC não encontrado", "fidc_id": fidc_id}), 404
+
+def reserve_idempotency_key(key, fingerprint=None):
+    """
+    Reserva a chave de idempotência. Retorna a resposta a devolver ao cliente quando a requisição
+    é um reenvio (201 com o job original) ou conflita com outra (409/422); None se deve seguir.
+    """
+    try:
+        job_id = idempotency_service.reserve(key, fingerprint)
+    except idempotency_service.IdempotencyConflict as exc:
+        logger.warning("Conflito de idempotência", extra={"key": key, "error": str(exc)})
+        if exc.in_progress:
+            return jsonify({"error": str(exc)}), 409, {"Retry-After": "1"}
+        return jsonify({"error": str(exc)}), 422
+    if job_id is None:
+        return None
+    logger.info("Requisição repetida: devolvendo o job original", extra={"key": key, "job_id": job_id})
+    return jsonify({"job_id": job_id, "message": "Job criado com sucesso"}), 201, {"Idempotent-Replayed": "true"}
+
+@operations_bp.route("/process:stream", methods=["POST"])
+@swag_from({
+    "tags": ["Operations"],
+    "description": (
+        "Cria um job a partir de um upload NDJSON (uma operação por linha), validado e gravado "
+        "em lotes durante a leitura. Linhas inválidas são reportadas sem rejeitar o upload"
+    ),
+    "consumes": ["application/x-ndjson"],
+    "parameters": [{
+        "name": "fidc_id",
+        "in": "query",
+        "type": "string",
+        "required": True
+    }, {
+        "name": "Idempotency-Key",
+        "in": "header",
+        "type": "string",
+        "required": False
+    }, {
+        "in": "body",
+        "name": "body",
+        "schema": {
+            "type": "string",
+            "example": (
+                '{"id": "op_001", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1000}\n'
+                '{"id": "op_002", "asset_code": "VALE3", "operation_type": "SELL", "quantity": 500}\n'
+            )
+        }
+    }],
+    "responses": {
+        201: {"description": "Job criado com as operações válidas; erros por linha em errors"},
+        400: {"description": "fidc_id ausente ou nenhuma operação válida"},
+        404: {"description": "FIDC não encontrado"},
+        409: {"description": "Requisição original com a mesma Idempotency-Key ainda em andamento"},
+        415: {"description": "Content-Type diferente de application/x-ndjson"}
+    }
+})
+def process_operations_stream():
+    from app.workers.tasks import process_operations_job
+    if request.mimetype not in ("application/x-ndjson", "application/jsonl"):
+        return jsonify({"error": "Content-Type must be application/x-ndjson"}), 415
+    fidc_id = request.args.get("fidc_id")
+    if not fidc_id:
+        return jsonify({"error": "Invalid input", "messages": {"fidc_id": ["Missing data for required field."]}}), 400
+    if db.session.get(FidcCash, fidc_id) is None:
+        return fidc_not_found(fidc_id)
+
+    # O corpo não é lido antes do processamento, então a deduplicação aqui é só pela Idempotency-Key
+    header_key = request.headers.get("Idempotency-Key")
+    idempotency_key = idempotency_service.idempotency_key(f"process:stream:{fidc_id}", header_key) if header_key else None
+    if idempotency_key:
+        replay = reserve_idempotency_key(idempotency_key)
+        if replay is not None:
+            return replay
+
+    job_id = None
+    dispatched = False
+    try:
+        # O job existe desde o início do upload; só é despachado depois da última linha
+        job = ProcessingJob(status="RECEIVING")
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.job_id
+        logger.info("Upload NDJSON de operações iniciado", extra={"job_id": job_id, "fidc_id": fidc_id})
+
+        # Leitura linha a linha do corpo: nada é materializado além do lote corrente.
+        # O buffer evita que readline() leia o stream do WSGI byte a byte
+        result = ingest_ndjson_operations(
+            job_id, io.BufferedReader(request.stream, STREAM_READ_BUFFER_SIZE), fidc_id=fidc_id
+        )
+
+        job = db.session.get(ProcessingJob, job_id)
+        if not result["accepted"]:
+            db.session.delete(job)
+            db.session.commit()
+            logger.warning("Upload NDJSON sem operações válidas", extra={"job_id": job_id, "rejected": result["rejected"]})
+            if idempotency_key:
+                idempotency_service.release(idempotency_key)
+            return jsonify({
+                "error": "Invalid input",
+                "rejected": result["rejected"],
+                "errors": result["errors"]
+            }), 400
+
+        job.status = "PROCESSING"
+        db.session.commit()
+        start_job_progress(job_id, result["accepted"])
+        process_operations_job.delay(job_id, fidc_id)
+        dispatched = True
+        logger.info("Processamento assíncrono disparado", extra={"job_id": job_id})
+    except Exception:
+        # Upload interrompido (cliente desconectou, erro no banco): os lotes já confirmados
+        # não podem ficar PENDING sem job despachado
+        if job_id is not None and not dispatched:
+            discard_job(job_id)
+        if idempotency_key:
+            idempotency_service.release(idempotency_key)
+        raise
+    if idempotency_key:
+        idempotency_service.complete(idempotency_key, job_id)
+
+    return jsonify({
+        "job_id": job_id,
+        "message": "Job criado com sucesso",
+        "accepted": result["accepted"],
+        "rejected": result["rejected"],
+        "errors": result["errors"]
+    }), 201
+
+def discard_job(job_id):
+    """Remove o job não despachado (upload NDJSON interrompido, ids em conflito) e as operações já confirmadas."""
+    try:
+        db.session.rollback()
+        deleted = delete_job_operations(job_id)
+        job = db.session.get(ProcessingJob, job_id)
+        if job:
+            db.session.delete(job)
+        db.session.commit()
+        logger.warning("Job não despachado descartado", extra={"job_id": job_id, "operations": deleted})
+    except Exception as exc:
+        db.session.rollback()
+        logger.error("Falha ao descartar job não despachado", extra={"job_id": job_id, "error": str(exc)})
+
 @operations_bp.route("/export", methods=["POST"])
 @swag_from({
     "tags": ["Operations"],
@@ -86,7 +289,9 @@ def process_operations():
             "example": {
                 "fidc_id": "FIDC001",
                 "start_date": "2025-09-01",
-                "end_date": "2025-09-30"
+                "end_date": "2025-09-30",
+                "format": "parquet",
+                "partition_by_date": True
             }
         }
     }],
@@ -102,57 +307,31 @@ def export_operations():
         logger.warning("Payload inválido para exportação de operações", extra={"error": err.messages})
         return jsonify({"error": "Invalid input", "messages": err.messages}), 400
 
-    # Busca operações no banco
-    operations = db.session.query(Operation).filter(
-        Operation.asset_code.isnot(None),
-        Operation.created_at >= validated["start_date"],
-        Operation.created_at <= validated["end_date"],
-        Operation.fidc_id == validated["fidc_id"]
-    ).all()
-
-    logger.info("Operações buscadas para exportação", extra={
-        "fidc_id": validated["fidc_id"],
-        "start_date": str(validated["start_date"]),
-        "end_date": str(validated["end_date"]),
-        "total_operations": len(operations)
-    })
-
-    # Serializa para CSV em memória
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "id", "asset_code", "operation_type", "quantity", "status",
-        "execution_price", "total_value", "tax_paid", "created_at"
-    ])
-    for op in operations:
-        writer.writerow([
-            op.id, op.asset_code, op.operation_type, op.quantity, op.status,
-            op.execution_price, op.total_value, op.tax_paid,
-            op.created_at.isoformat() if op.created_at else ""
-        ])
-    output.seek(0)
-
-    # Upload para Minio/S3 usando client centralizado
-    s3 = get_s3_client()
-    bucket = os.getenv("MINIO_BUCKET", "fidc-exports")
-    filename = f"export_{validated['fidc_id']}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
-
-    # Cria o bucket se não existir
-    try:
-        s3.head_bucket(Bucket=bucket)
-    except Exception:
-        s3.create_bucket(Bucket=bucket)
-
-    s3.put_object(Bucket=bucket, Key=filename, Body=output.getvalue())
+    # Exporta em streaming: cursor server-side -> csv/csv.gz/parquet -> upload multipart (Minio/S3)
+    result = export_service.export_operations(
+        validated["fidc_id"],
+        validated.get("start_date"),
+        validated.get("end_date"),
+        export_format=validated["format"],
+        partition_by_date=validated["partition_by_date"],
+        mode=validated["mode"]
+    )
 
     logger.info("Exportação de operações concluída e enviada ao bucket", extra={
         "fidc_id": validated["fidc_id"],
-        "file": filename,
-        "bucket": bucket,
-        "total_operations": len(operations)
+        "start_date": str(validated.get("start_date")),
+        "end_date": str(validated.get("end_date")),
+        "format": result["format"],
+        "mode": validated["mode"],
+        "unchanged": result["unchanged"],
+        "files": result["files"],
+        "bucket": result["bucket"],
+        "total_operations": result["total_operations"]
     })
 
     return jsonify({
         "message": f"Export job for {validated.get('fidc_id')} completed",
-        "file": filename
-    }), 200
\ No newline at end of file
+        "file": result["file"],
+        "files": result["files"],
+        "unchanged": result["unchanged"]
+    }), 200
@@ -1,4 +1,5 @@
-from marshmallow import Schema, fields
+import os
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
 
 class FidcCashSchema(Schema):
     fidc_id = fields.Str(required=True)
@@ -11,11 +12,22 @@ class ProcessingJobSchema(Schema):
     created_at = fields.DateTime()
     completed_at = fields.DateTime(allow_none=True)
 
+# Limite de job_ids por requisição em /jobs/status:batch
+JOB_STATUS_BATCH_MAX_IDS = int(os.getenv("JOB_STATUS_BATCH_MAX_IDS", "500"))
+
+class JobStatusBatchSchema(Schema):
+    job_ids = fields.List(
+        fields.Str(), required=True,
+        validate=validate.Length(min=1, max=JOB_STATUS_BATCH_MAX_IDS)
+    )
+
 class OperationSchema(Schema):
-    id = fields.Str(required=True)
-    asset_code = fields.Str(required=True)
-    operation_type = fields.Str(required=True)
+    # Texto vazio não chega ao banco: no COPY (CSV) campo vazio vira NULL e viola o NOT NULL
+    id = fields.Str(required=True, validate=validate.Length(min=1))
+    asset_code = fields.Str(required=True, validate=validate.Length(min=1))
+    operation_type = fields.Str(required=True, validate=validate.Length(min=1))
     quantity = fields.Int(required=True)
+    operation_date = fields.Date()
     status = fields.Str()
     execution_price = fields.Float(allow_none=True)
     total_value = fields.Float(allow_none=True)
@@ -26,7 +38,33 @@ class ProcessOperationsSchema(Schema):
     fidc_id = fields.Str(required=True)
     operations = fields.List(fields.Nested(OperationSchema), required=True)
 
+    @validates_schema
+    def validate_unique_ids(self, data, **kwargs):
+        # A PK particionada (id, created_at) não rejeita id repetido: validado aqui
+        seen = set()
+        repeated = []
+        for op_data in data.get("operations", []):
+            if op_data["id"] in seen and op_data["id"] not in repeated:
+                repeated.append(op_data["id"])
+            seen.add(op_data["id"])
+        if repeated:
+            raise ValidationError({"operations": [f"Ids repetidos no lote: {', '.join(repeated)}"]})
+
 class ExportOperationsSchema(Schema):
     fidc_id = fields.Str(required=True)
-    start_date = fields.Date(required=True)
-    end_date = fields.Date(required=True)
\ No newline at end of file
+    start_date = fields.Date()
+    end_date = fields.Date()
+    format = fields.Str(load_default="csv", validate=validate.OneOf(["csv", "csv.gz", "parquet"]))
+    partition_by_date = fields.Bool(load_default=False)
+    mode = fields.Str(load_default="full", validate=validate.OneOf(["full", "incremental"]))
+
+    @validates_schema
+    def validate_period(self, data, **kwargs):
+        # No modo incremental o período é opcional: o watermark define o início
+        if data.get("mode", "full") == "full":
+            missing = {
+                name: ["Missing data for required field."]
+                for name in ("start_date", "end_date") if name not in data
+            }
+            if missing:
+                raise ValidationError(missing)
\ No newline at end of file
@@ -1,27 +1,97 @@
 import os
 import random
-import redis
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app.services.rate_limiter import rate_limiter, RATE_LIMIT_TIMEOUT
+from app.utils.metrics import timed, ASSET_PRICE_SECONDS
 
-# Conexão Redis para rate limit
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "redis"),
-    port=6379,
-    db=0
-)
+# Consulta em lote: ativos distintos em paralelo, num pool de threads limitado
+ASSET_PRICE_MAX_CONCURRENCY = int(os.getenv("ASSET_PRICE_MAX_CONCURRENCY", "16"))
+# Tempo máximo por ativo, contado do início da consulta (0 desativa)
+ASSET_PRICE_TIMEOUT = float(os.getenv("ASSET_PRICE_TIMEOUT", "60"))
+# Hedge: consulta ainda sem resposta após esse tempo ganha uma cópia; vale a primeira resposta (0 desativa)
+ASSET_PRICE_HEDGE_AFTER = float(os.getenv("ASSET_PRICE_HEDGE_AFTER", "0"))
+# Intervalo de verificação de timeouts e hedges enquanto há consultas em andamento
+ASSET_PRICE_POLL_INTERVAL = 0.05
 
-def get_asset_price(asset_code):
+@timed(ASSET_PRICE_SECONDS, outcome=True)
+def get_asset_price(asset_code, timeout=RATE_LIMIT_TIMEOUT):
     """
     Simula consulta de preço de ativo com rate limit por ativo.
-    - Limite: 10 requisições por minuto por ativo.
+    - Limite: 10 requisições por minuto por ativo (token bucket no Redis).
+    - Acima do limite, aguarda o próximo token por até `timeout` segundos.
     - 30% de chance de falha.
     - Preço aleatório entre 10 e 100.
     """
-    key = f"asset_price_rate_limit:{asset_code}"
-    current = redis_client.incr(key)
-    if current == 1:
-        redis_client.expire(key, 60)
-    if current > 10:
-        raise Exception("Rate limit excedido para este ativo (10 req/min)")
+    rate_limiter.acquire(asset_code, timeout=timeout)
     if random.random() < 0.3:
         raise Exception("Falha ao consultar preço do ativo")
-    return round(random.uniform(10, 100), 2)
\ No newline at end of file
+    return round(random.uniform(10, 100), 2)
+
+def get_asset_prices(asset_codes, fetch=None, max_workers=ASSET_PRICE_MAX_CONCURRENCY,
+                     timeout=ASSET_PRICE_TIMEOUT, hedge_after=ASSET_PRICE_HEDGE_AFTER):
+    """
+    Consulta o preço de vários ativos em paralelo, uma vez por ativo distinto.
+    - fetch: função de consulta de um ativo (padrão: get_asset_price).
+    - timeout: tempo máximo por ativo; estourado, o ativo vai para os erros com TimeoutError.
+    - hedge_after: consulta sem resposta após esse tempo ganha uma cópia (uma por ativo).
+    O tempo total fica limitado pela consulta mais lenta, não pela soma delas.
+    Retorna (prices, errors): {asset_code: preço} e {asset_code: exceção}.
+    """
+    fetch = fetch or get_asset_price
+    asset_codes = list(dict.fromkeys(asset_codes))
+    prices = {}
+    errors = {}
+    if not asset_codes:
+        return prices, errors
+
+    started_at = {}
+
+    def run(call):
+        started_at[call] = time.monotonic()
+        return fetch(call[0])
+
+    def in_flight(asset_code):
+        return any(call[0] == asset_code for call in pending.values())
+
+    # Com hedge, cada ativo pode ter até duas consultas simultâneas
+    calls_per_asset = 2 if hedge_after else 1
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(asset_codes) * calls_per_asset)))
+    pending = {executor.submit(run, (asset_code, 0)): (asset_code, 0) for asset_code in asset_codes}
+    hedged = set()
+    poll_interval = ASSET_PRICE_POLL_INTERVAL if timeout or hedge_after else None
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                asset_code, _ = pending.pop(future)
+                if asset_code in prices or asset_code in errors:
+                    continue
+                try:
+                    prices[asset_code] = future.result()
+                except Exception as exc:
+                    # Com o hedge ainda em andamento, a resposta dele decide
+                    if not in_flight(asset_code):
+                        errors[asset_code] = exc
+
+            now = time.monotonic()
+            for future, call in list(pending.items()):
+                asset_code = call[0]
+                if asset_code in prices or asset_code in errors:
+                    pending.pop(future)
+                    future.cancel()
+                    continue
+                if call not in started_at:
+                    continue
+                elapsed = now - started_at[call]
+                if timeout and elapsed > timeout:
+                    # A thread não é interrompida: o resultado tardio é descartado
+                    pending.pop(future)
+                    if not in_flight(asset_code):
+                        errors[asset_code] = TimeoutError(f"Consulta de preço excedeu {timeout}s")
+                elif hedge_after and elapsed > hedge_after and asset_code not in hedged:
+                    hedged.add(asset_code)
+                    pending[executor.submit(run, (asset_code, 1))] = (asset_code, 1)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return prices, errors
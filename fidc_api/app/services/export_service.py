@@ -0,0 +1,370 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import select, and_, or_, func
+from app.db import db
+from app.db.routing import use_primary
+from app.db.models import Operation, ExportManifest, ProcessingJob
+from app.services.job_service import IN_FLIGHT_JOB_STATUSES, stale_before
+from app.utils.s3_client import get_s3_client
+from app.utils.logger import get_logger
+from app.utils.metrics import timed, S3_UPLOAD_SECONDS
+
+logger = get_logger(__name__)
+
+# S3 exige partes de no mínimo 5 MiB (exceto a última)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+EXPORT_PART_SIZE = max(S3_MIN_PART_SIZE, int(os.getenv("EXPORT_PART_SIZE", str(8 * 1024 * 1024))))
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+
+EXPORT_FORMATS = ("csv", "csv.gz", "parquet")
+EXPORT_MODES = ("full", "incremental")
+# Margem do delta incremental: created_at é gravado antes do commit (COPY/lotes do upload),
+# então linhas confirmadas com atraso ainda entram no delta seguinte
+EXPORT_INCREMENTAL_SAFETY_SECONDS = int(os.getenv("EXPORT_INCREMENTAL_SAFETY_SECONDS", "300"))
+
+EXPORT_COLUMNS = [
+    "id", "asset_code", "operation_type", "quantity", "status",
+    "execution_price", "total_value", "tax_paid", "created_at"
+]
+
+
+class S3MultipartWriter:
+    """
+    Arquivo somente-escrita que envia o conteúdo ao S3 em partes de part_size bytes.
+    - Memória limitada a uma parte em buffer, independente do tamanho total.
+    - Objetos menores que uma parte são enviados com um único put_object.
+    - Em caso de erro dentro do bloco with, o upload multipart é abortado.
+    """
+
+    def __init__(self, s3, bucket, key, part_size=EXPORT_PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = None
+        self.parts = []
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(memoryview(self._buffer)[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            with timed(S3_UPLOAD_SECONDS, operation="create_multipart_upload"):
+                self.upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        part_number = len(self.parts) + 1
+        with timed(S3_UPLOAD_SECONDS, operation="upload_part"):
+            response = self.s3.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=body
+            )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self):
+        if self.closed:
+            return
+        if self.upload_id is None:
+            with timed(S3_UPLOAD_SECONDS, operation="put_object"):
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            with timed(S3_UPLOAD_SECONDS, operation="complete_multipart_upload"):
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                    MultipartUpload={"Parts": self.parts}
+                )
+        self._buffer = bytearray()
+        self.closed = True
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self._buffer = bytearray()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def ensure_bucket(s3, bucket):
+    # Cria o bucket se não existir
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except Exception:
+        s3.create_bucket(Bucket=bucket)
+
+
+def iter_export_rows(fidc_id, start_date=None, end_date=None, after=None, before=None, yield_per=EXPORT_YIELD_PER):
+    """
+    Itera as operações do FIDC via cursor server-side (yield_per), sem carregar tudo em memória.
+    - start_date/end_date: intervalo de created_at (inclusivo), quando informados.
+    - after: watermark (created_at, id) exclusivo, para exportações incrementais.
+    - before: limite superior exclusivo de created_at.
+    Cada linha é uma tupla na ordem de EXPORT_COLUMNS.
+    """
+    query = (
+        select(*[getattr(Operation, name) for name in EXPORT_COLUMNS])
+        .where(_export_filter(fidc_id, start_date, end_date, after, before))
+        .order_by(Operation.created_at, Operation.id)
+        .execution_options(yield_per=yield_per)
+    )
+    for row in db.session.execute(query):
+        yield row
+
+
+def _export_filter(fidc_id, start_date=None, end_date=None, after=None, before=None):
+    conditions = [Operation.asset_code.isnot(None), Operation.fidc_id == fidc_id]
+    if start_date is not None:
+        conditions.append(Operation.created_at >= start_date)
+    if end_date is not None:
+        conditions.append(Operation.created_at <= end_date)
+    if after is not None:
+        watermark_created_at, watermark_id = after
+        conditions.append(or_(
+            Operation.created_at > watermark_created_at,
+            and_(Operation.created_at == watermark_created_at, Operation.id > watermark_id)
+        ))
+    if before is not None:
+        conditions.append(Operation.created_at < before)
+    return and_(*conditions)
+
+
+def iter_csv_chunks(rows, compress=False, rows_per_chunk=EXPORT_YIELD_PER, columns=EXPORT_COLUMNS):
+    """
+    Serializa linhas em CSV de forma incremental, gerando blocos de bytes.
+    Com compress=True, os blocos saem em gzip (zlib em modo streaming).
+    columns: cabeçalho, na ordem das tuplas; created_at deve ser a última coluna.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    pending = 1
+
+    def drain():
+        data = output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate()
+        return compressor.compress(data) if compressor else data
+
+    for row in rows:
+        created_at = row[-1]
+        writer.writerow(list(row[:-1]) + [created_at.isoformat() if created_at else ""])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield drain()
+            pending = 0
+
+    data = drain()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+def write_parquet(rows, fileobj, rows_per_batch=EXPORT_YIELD_PER):
+    """
+    Escreve linhas em Parquet, montando record batches Arrow direto do cursor.
+    Cada batch vira um row group: memória limitada a rows_per_batch linhas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("asset_code", pa.string()),
+        ("operation_type", pa.string()),
+        ("quantity", pa.int64()),
+        ("status", pa.string()),
+        ("execution_price", pa.float64()),
+        ("total_value", pa.float64()),
+        ("tax_paid", pa.float64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+    def to_batch(batch_rows):
+        columns = list(zip(*batch_rows))
+        return pa.RecordBatch.from_arrays(
+            [pa.array(columns[i], type=field.type) for i, field in enumerate(schema)],
+            schema=schema
+        )
+
+    writer = pq.ParquetWriter(fileobj, schema, compression="snappy")
+    try:
+        batch_rows = []
+        for row in rows:
+            batch_rows.append(tuple(row))
+            if len(batch_rows) >= rows_per_batch:
+                writer.write_batch(to_batch(batch_rows))
+                batch_rows = []
+        if batch_rows:
+            writer.write_batch(to_batch(batch_rows))
+    finally:
+        writer.close()
+
+
+def write_export(rows, fileobj, export_format):
+    if export_format == "parquet":
+        write_parquet(rows, fileobj)
+        return
+    for chunk in iter_csv_chunks(rows, compress=export_format == "csv.gz"):
+        fileobj.write(chunk)
+
+
+def incremental_cutoff(fidc_id, now=None):
+    """
+    Limite superior (exclusivo) de created_at do delta incremental do FIDC: o menor entre
+    - a operação PENDING mais antiga do FIDC em um job em andamento (IN_FLIGHT_JOB_STATUSES), que ainda
+      pode ser liquidada depois de outras mais novas. Operações de jobs encerrados, de outros FIDCs ou de
+      jobs abandonados (criados há mais de JOB_STALE_SECONDS) não seguram o delta;
+    - now - EXPORT_INCREMENTAL_SAFETY_SECONDS, para linhas com created_at anterior ao commit.
+    """
+    oldest_in_flight = db.session.execute(
+        select(func.min(Operation.created_at))
+        .join(ProcessingJob, ProcessingJob.job_id == Operation.job_id)
+        .where(
+            Operation.fidc_id == fidc_id,
+            Operation.status == "PENDING",
+            ProcessingJob.status.in_(IN_FLIGHT_JOB_STATUSES),
+            ProcessingJob.created_at >= stale_before(now)
+        )
+    ).scalar()
+    safe_until = (now or datetime.utcnow()) - timedelta(seconds=EXPORT_INCREMENTAL_SAFETY_SECONDS)
+    return min(oldest_in_flight, safe_until) if oldest_in_flight else safe_until
+
+
+def get_latest_manifest(fidc_id, export_format):
+    # Watermark da exportação anterior: lido no primário, nunca de uma réplica atrasada
+    with use_primary():
+        return (
+            db.session.query(ExportManifest)
+            .filter_by(fidc_id=fidc_id, format=export_format)
+            .order_by(ExportManifest.created_at.desc())
+            .first()
+        )
+
+
+def export_operations(fidc_id, start_date=None, end_date=None, export_format="csv", partition_by_date=False,
+                      mode="full", part_size=EXPORT_PART_SIZE):
+    """
+    Exporta operações de um FIDC para o bucket em streaming: cursor -> csv/csv.gz/parquet -> multipart.
+    - partition_by_date: um objeto por dia no layout Hive fidc_id=<id>/date=<AAAA-MM-DD>/.
+    - mode="incremental": exporta só o delta após o watermark do último manifesto do FIDC/formato
+      e registra um novo manifesto. Sem novidades, devolve os objetos do manifesto anterior.
+    Retorna um resumo com arquivos, bucket, total de operações e bytes enviados.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {export_format}")
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Modo de exportação inválido: {mode}")
+
+    bucket = os.getenv("MINIO_BUCKET", "fidc-exports")
+    after = None
+    before = None
+    manifest = None
+    if mode == "incremental":
+        manifest = get_latest_manifest(fidc_id, export_format)
+        if manifest and manifest.watermark_created_at is not None:
+            after = (manifest.watermark_created_at, manifest.watermark_id)
+        before = incremental_cutoff(fidc_id)
+
+        has_delta = db.session.query(
+            select(Operation.id).where(_export_filter(fidc_id, start_date, end_date, after, before)).exists()
+        ).scalar()
+        if not has_delta:
+            files = list(manifest.object_keys) if manifest else []
+            return {
+                "file": files[0] if files else None,
+                "files": files,
+                "bucket": bucket,
+                "format": export_format,
+                "total_operations": 0,
+                "bytes": 0,
+                "parts": 0,
+                "unchanged": True
+            }
+
+    s3 = get_s3_client()
+    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    ensure_bucket(s3, bucket)
+
+    total_operations = 0
+    last_row = None
+
+    def tracked(rows):
+        nonlocal total_operations, last_row
+        for row in rows:
+            total_operations += 1
+            last_row = row
+            yield row
+
+    rows = tracked(iter_export_rows(fidc_id, start_date, end_date, after=after, before=before))
+    if partition_by_date:
+        # Linhas vêm ordenadas por created_at: cada dia é um bloco contíguo
+        objects = (
+            (f"fidc_id={fidc_id}/date={day.isoformat()}/export_{timestamp}.{export_format}", day_rows)
+            for day, day_rows in groupby(rows, key=lambda row: row[-1].date())
+        )
+    else:
+        objects = [(f"export_{fidc_id}_{timestamp}.{export_format}", rows)]
+
+    files = []
+    total_bytes = 0
+    total_parts = 0
+    for key, object_rows in objects:
+        with S3MultipartWriter(s3, bucket, key, part_size=part_size) as upload:
+            write_export(object_rows, upload, export_format)
+        files.append(key)
+        total_bytes += upload.bytes_written
+        total_parts += len(upload.parts) or 1
+
+    if mode == "incremental":
+        watermark = (last_row[-1], last_row[0]) if last_row else after or (None, None)
+        db.session.add(ExportManifest(
+            fidc_id=fidc_id,
+            format=export_format,
+            watermark_created_at=watermark[0],
+            watermark_id=watermark[1],
+            object_keys=files,
+            total_operations=total_operations
+        ))
+        db.session.commit()
+
+    return {
+        "file": files[0] if files else None,
+        "files": files,
+        "bucket": bucket,
+        "format": export_format,
+        "total_operations": total_operations,
+        "bytes": total_bytes,
+        "parts": total_parts,
+        "unchanged": False
+    }
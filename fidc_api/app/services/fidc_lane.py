@@ -0,0 +1,83 @@
+import os
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import OperationalError
+from app.db import db
+from app.db.models import FidcCash
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Tempo máximo (ms) aguardando a fila do FIDC antes de desistir (Postgres); o task é reenfileirado (FidcLaneBusy)
+FIDC_LOCK_TIMEOUT_MS = int(os.getenv("FIDC_LOCK_TIMEOUT_MS", "30000"))
+# Tentativas de liquidação quando outro job do mesmo FIDC alterou o caixa no meio do caminho
+FIDC_LANE_MAX_ATTEMPTS = int(os.getenv("FIDC_LANE_MAX_ATTEMPTS", "20"))
+
+# SQLSTATE lock_not_available: lock_timeout estourado esperando a linha do FIDC
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+class FidcCashConflict(Exception):
+    """O caixa do FIDC mudou entre a leitura e a gravação: a liquidação precisa ser refeita."""
+
+
+class FidcLaneBusy(Exception):
+    """A fila do FIDC não andou dentro de FIDC_LOCK_TIMEOUT_MS: não é falha do job, só espera."""
+
+
+def lock_fidc_cash(fidc_id):
+    """
+    Entra na fila de liquidação do FIDC e lê o caixa atualizado.
+    - Postgres: SELECT ... FOR UPDATE na linha do FIDC, mantido até o commit/rollback.
+      Jobs do mesmo FIDC esperam em fila; jobs de FIDCs diferentes não se bloqueiam.
+    - Demais bancos: leitura simples; a serialização fica a cargo de update_fidc_cash.
+    Retorna o FidcCash ou None se o FIDC não existir; FidcLaneBusy se o lock_timeout estourar.
+    """
+    query = select(FidcCash).where(FidcCash.fidc_id == fidc_id).execution_options(populate_existing=True)
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(
+            select(func.set_config("lock_timeout", f"{FIDC_LOCK_TIMEOUT_MS}ms", True))
+        )
+        query = query.with_for_update()
+    try:
+        return db.session.execute(query).scalar_one_or_none()
+    except OperationalError as exc:
+        if getattr(exc.orig, "pgcode", None) == LOCK_NOT_AVAILABLE:
+            raise FidcLaneBusy(f"Fila do FIDC {fidc_id} ocupada por mais de {FIDC_LOCK_TIMEOUT_MS}ms") from exc
+        raise
+
+
+def update_fidc_cash(fidc, available_cash, updated_at):
+    """
+    Grava o novo caixa do FIDC somente se ele ainda for o valor lido em lock_fidc_cash
+    (compare-and-set). Com o lock da linha sempre confere; sem lock, detecta a corrida
+    e levanta FidcCashConflict em vez de sobrescrever o caixa de outro job.
+    Não faz commit: o chamador controla a transação.
+    """
+    table = FidcCash.__table__
+    result = db.session.execute(
+        update(table)
+        .where(table.c.fidc_id == fidc.fidc_id, table.c.available_cash == fidc.available_cash)
+        .values(available_cash=available_cash, updated_at=updated_at)
+    )
+    if result.rowcount != 1:
+        raise FidcCashConflict(f"Caixa do FIDC {fidc.fidc_id} alterado por outro job")
+
+
+def run_in_fidc_lane(fidc_id, settle, max_attempts=FIDC_LANE_MAX_ATTEMPTS):
+    """
+    Executa settle(fidc) serializado por FIDC: trava o caixa, liquida e confirma a transação.
+    Em FidcCashConflict, desfaz a transação e refaz a liquidação com o caixa atualizado.
+    settle recebe o FidcCash travado (ou None) e não deve fazer commit.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = settle(lock_fidc_cash(fidc_id))
+            db.session.commit()
+            return result
+        except FidcCashConflict:
+            db.session.rollback()
+            logger.warning("Conflito no caixa do FIDC, refazendo liquidação", extra={
+                "fidc_id": fidc_id,
+                "attempt": attempt
+            })
+    raise FidcCashConflict(f"Caixa do FIDC {fidc_id} em disputa após {max_attempts} tentativas")
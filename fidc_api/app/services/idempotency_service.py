@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+import redis
+
+from app.utils.logger import get_logger
+from app.utils.redis_client import get_redis_client
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Reserva enquanto a primeira requisição ainda está criando o job
+IDEMPOTENCY_PENDING_TTL = int(os.getenv("IDEMPOTENCY_PENDING_TTL", "60"))
+IDEMPOTENCY_KEY_PREFIX = "idempotency"
+
+
+class IdempotencyConflict(Exception):
+    """A chave já foi usada com outro payload, ou a requisição original ainda está em andamento."""
+
+    def __init__(self, message, in_progress=False):
+        super().__init__(message)
+        self.in_progress = in_progress
+
+
+def payload_fingerprint(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def idempotency_key(scope, header_key=None, fingerprint=None):
+    """
+    Chave Redis do registro: pelo header Idempotency-Key quando informado,
+    senão pelo hash do payload (reenvio idêntico sem header).
+    """
+    if header_key:
+        return f"{IDEMPOTENCY_KEY_PREFIX}:{scope}:key:{header_key}"
+    return f"{IDEMPOTENCY_KEY_PREFIX}:{scope}:payload:{fingerprint}"
+
+
+def reserve(key, fingerprint=None):
+    """
+    Reserva a chave com SET NX (um único round-trip). Retorna None se a reserva foi feita
+    (a requisição deve seguir) ou o job_id original se for um reenvio.
+    Lança IdempotencyConflict se o payload divergir ou a requisição original ainda estiver em andamento.
+    Com o Redis indisponível, segue sem deduplicação.
+    """
+    record = json.dumps({"fingerprint": fingerprint})
+    try:
+        client = get_redis_client()
+        if client.set(key, record, nx=True, ex=IDEMPOTENCY_PENDING_TTL):
+            return None
+        existing = client.get(key)
+    except redis.RedisError as exc:
+        logger.warning("Falha ao reservar chave de idempotência", extra={"key": key, "error": str(exc)})
+        return None
+
+    if existing is None:
+        # Reserva expirou entre o SET e o GET: trata como requisição nova
+        return reserve(key, fingerprint)
+    existing = json.loads(existing)
+    if fingerprint and existing.get("fingerprint") and existing["fingerprint"] != fingerprint:
+        raise IdempotencyConflict("Idempotency-Key já utilizada com outro payload")
+    if not existing.get("job_id"):
+        raise IdempotencyConflict("Requisição original ainda em processamento", in_progress=True)
+    return existing["job_id"]
+
+
+def complete(key, job_id, fingerprint=None):
+    """Associa a chave ao job criado, pelo período de IDEMPOTENCY_TTL."""
+    try:
+        get_redis_client().set(key, json.dumps({"fingerprint": fingerprint, "job_id": job_id}), ex=IDEMPOTENCY_TTL)
+    except redis.RedisError as exc:
+        logger.warning("Falha ao gravar chave de idempotência", extra={"key": key, "job_id": job_id, "error": str(exc)})
+
+
+def release(key):
+    """Libera a reserva quando a requisição original falha, permitindo um novo envio."""
+    try:
+        get_redis_client().delete(key)
+    except redis.RedisError as exc:
+        logger.warning("Falha ao liberar chave de idempotência", extra={"key": key, "error": str(exc)})
@@ -1,9 +1,31 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
 from app.db import db
-from app.db.models import ProcessingJob
+from app.db.models import ProcessingJob, Operation
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Jobs cujas operações PENDING ainda podem ser liquidadas
+IN_FLIGHT_JOB_STATUSES = ("RECEIVING", "PROCESSING")
+# Job em andamento há mais tempo que isso foi abandonado (API derrubada no meio do upload, chord perdido):
+# não segura a exportação incremental e é encerrado como FAILED pelo beat
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", str(6 * 3600)))
+
+def stale_before(now=None):
+    """created_at a partir do qual um job em andamento ainda não é considerado abandonado."""
+    return (now or datetime.utcnow()) - timedelta(seconds=JOB_STALE_SECONDS)
+
+def get_stale_job_ids(now=None):
+    """Jobs em andamento (IN_FLIGHT_JOB_STATUSES) criados antes de stale_before."""
+    return [
+        job_id for job_id, in db.session.query(ProcessingJob.job_id).filter(
+            ProcessingJob.status.in_(IN_FLIGHT_JOB_STATUSES),
+            ProcessingJob.created_at < stale_before(now)
+        )
+    ]
+
 def create_job(status="PROCESSING"):
     job = ProcessingJob(status=status)
     db.session.add(job)
@@ -33,4 +55,57 @@ def delete_job(job_id):
         logger.info("Job deletado", extra={"job_id": job_id})
     else:
         logger.warning("Tentativa de deletar job inexistente", extra={"job_id": job_id})
-    return job
\ No newline at end of file
+    return job
+
+def get_operation_counts(job_id):
+    """
+    Contagem de operações do job por status em uma única consulta agregada
+    (GROUP BY status, coberta pelo índice (job_id, status)).
+    """
+    counts = dict(
+        db.session.query(Operation.status, func.count(Operation.id))
+        .filter(Operation.job_id == job_id)
+        .group_by(Operation.status)
+        .all()
+    )
+    return {
+        "total_operations": sum(counts.values()),
+        "processed": counts.get("PROCESSED", 0),
+        "failed": counts.get("FAILED", 0)
+    }
+
+def get_jobs_status(job_ids):
+    """
+    Status de vários jobs com duas consultas, independente da quantidade:
+    um IN (...) em processing_jobs e um GROUP BY (job_id, status) em operations.
+    Retorna {job_id: payload} apenas para os jobs encontrados.
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    if not job_ids:
+        return {}
+
+    jobs = db.session.query(ProcessingJob).filter(ProcessingJob.job_id.in_(job_ids)).all()
+    if not jobs:
+        return {}
+
+    counts = {job.job_id: {} for job in jobs}
+    rows = (
+        db.session.query(Operation.job_id, Operation.status, func.count(Operation.id))
+        .filter(Operation.job_id.in_(list(counts)))
+        .group_by(Operation.job_id, Operation.status)
+        .all()
+    )
+    for job_id, status, count in rows:
+        counts[job_id][status] = count
+
+    return {
+        job.job_id: {
+            "job_id": job.job_id,
+            "status": job.status,
+            "total_operations": sum(counts[job.job_id].values()),
+            "processed": counts[job.job_id].get("PROCESSED", 0),
+            "failed": counts[job.job_id].get("FAILED", 0),
+            "estimated_completion": job.completed_at.isoformat() if job.completed_at else None
+        }
+        for job in jobs
+    }
@@ -1,9 +1,29 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from marshmallow import ValidationError
+from sqlalchemy import insert, update, values, column, bindparam, select, func, String, Float
+from sqlalchemy.exc import IntegrityError
 from app.db import db
-from app.db.models import Operation
+from app.db.models import Operation, OperationId
+from app.schemas.schemas import OperationSchema
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+OPERATIONS_BULK_CHUNK_SIZE = int(os.getenv("OPERATIONS_BULK_CHUNK_SIZE", "1000"))
+# Leitura das operações do job pelo worker (cursor server-side)
+OPERATIONS_YIELD_PER = int(os.getenv("OPERATIONS_YIELD_PER", "1000"))
+# Ingestão NDJSON: máximo de erros por linha devolvidos na resposta (o total é sempre informado)
+STREAM_MAX_REPORTED_ERRORS = int(os.getenv("STREAM_MAX_REPORTED_ERRORS", "100"))
+
+# SQLSTATE de chave duplicada no Postgres
+UNIQUE_VIOLATION = "23505"
+
+PENDING_COLUMNS = ["id", "asset_code", "operation_type", "quantity", "status", "created_at", "job_id", "fidc_id", "sequence"]
+
 def create_operation(id, asset_code, operation_type, quantity, status="PENDING", execution_price=None, total_value=None, tax_paid=None):
     op = Operation(
         id=id,
@@ -15,6 +35,7 @@ def create_operation(id, asset_code, operation_type, quantity, status="PENDING",
         total_value=total_value,
         tax_paid=tax_paid
     )
+    db.session.add(OperationId(id=id))
     db.session.add(op)
     db.session.commit()
     logger.info("Operação criada", extra={"operation_id": id})
@@ -39,8 +60,370 @@ def delete_operation(op_id):
     op = get_operation(op_id)
     if op:
         db.session.delete(op)
+        db.session.execute(OperationId.__table__.delete().where(OperationId.id == op_id))
         db.session.commit()
         logger.info("Operação deletada", extra={"operation_id": op_id})
     else:
         logger.warning("Tentativa de deletar operação inexistente", extra={"operation_id": op_id})
-    return op
\ No newline at end of file
+    return op
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _copy_rows(table_name, columns, rows):
+    """Ingestão via COPY ... FROM STDIN (Postgres): um único comando por chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Em CSV, campo vazio sem aspas é NULL para o COPY (fidc_id opcional)
+        writer.writerow([
+            row[name].isoformat() if isinstance(row[name], datetime) else row[name] for name in columns
+        ])
+    buffer.seek(0)
+    raw = db.session.connection().connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def _job_predicates(table, job_id, created_range=None):
+    """
+    Filtro das operações do job. created_range (menor e maior created_at das linhas) vira um BETWEEN
+    com constantes: no Postgres o planner descarta as partições fora da faixa.
+    """
+    predicates = [table.c.job_id == job_id]
+    if created_range is not None:
+        predicates.append(table.c.created_at.between(*created_range))
+    return predicates
+
+def created_at_range(operations):
+    """Menor e maior created_at das operações (lidas por iter_pending_operations), ou None se vazio."""
+    created = [operation.created_at for operation in operations]
+    return (min(created), max(created)) if created else None
+
+def bulk_insert_pending_operations(job_id, operations, fidc_id=None, chunk_size=OPERATIONS_BULK_CHUNK_SIZE,
+                                   start_sequence=0):
+    """
+    Grava as operações de um job com status PENDING em lote.
+    - sequence: start_sequence + posição na lista, salvo se a operação já trouxer "sequence".
+    - fidc_id gravado já na ingestão: a exportação incremental do FIDC enxerga as operações PENDING
+      do fundo, e as que falham antes da liquidação aparecem na exportação do FIDC.
+    - Postgres: COPY por chunk; demais bancos: um executemany por chunk.
+    - Os ids são registrados em operation_ids no mesmo chunk: id já existente (em qualquer partição,
+      mesmo arquivada) levanta IntegrityError.
+    - Não faz commit: o chamador controla a transação.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": op_data["id"],
+            "asset_code": op_data["asset_code"],
+            "operation_type": op_data["operation_type"],
+            "quantity": op_data["quantity"],
+            "status": "PENDING",
+            "created_at": now,
+            "job_id": job_id,
+            "fidc_id": fidc_id,
+            "sequence": op_data.get("sequence", start_sequence + index)
+        }
+        for index, op_data in enumerate(operations)
+    ]
+    use_copy = db.session.get_bind().dialect.name == "postgresql"
+    for chunk in _chunks(rows, chunk_size):
+        if use_copy:
+            _copy_rows(OperationId.__tablename__, ["id"], chunk)
+            _copy_rows(Operation.__tablename__, PENDING_COLUMNS, chunk)
+        else:
+            db.session.execute(insert(OperationId), [{"id": row["id"]} for row in chunk])
+            db.session.execute(insert(Operation), chunk)
+    logger.info("Operações PENDING gravadas em lote", extra={"job_id": job_id, "total_operations": len(rows)})
+    return len(rows)
+
+def bulk_settle_operations(job_id, rows, created_range=None, chunk_size=OPERATIONS_BULK_CHUNK_SIZE):
+    """
+    Atualiza operações já gravadas do job com o resultado da liquidação.
+    - rows: dicts com id, status, execution_price, total_value, tax_paid e fidc_id.
+    - created_range: menor e maior created_at das operações, para o Postgres ler só as partições do job.
+    - Postgres: um UPDATE ... FROM (VALUES ...) por chunk; demais bancos: UPDATE em executemany.
+    - Não faz commit: o chamador controla a transação. Retorna o total de linhas atualizadas.
+    """
+    use_values = db.session.get_bind().dialect.name == "postgresql"
+    updated = 0
+    for chunk in _chunks(rows, chunk_size):
+        if use_values:
+            settled = values(
+                column("id", String),
+                column("status", String),
+                column("execution_price", Float),
+                column("total_value", Float),
+                column("tax_paid", Float),
+                column("fidc_id", String),
+                name="settled"
+            ).data([
+                (row["id"], row["status"], row["execution_price"], row["total_value"], row["tax_paid"], row["fidc_id"])
+                for row in chunk
+            ])
+            table = Operation.__table__
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id == settled.c.id, *_job_predicates(table, job_id, created_range))
+                .values(
+                    status=settled.c.status,
+                    execution_price=settled.c.execution_price,
+                    total_value=settled.c.total_value,
+                    tax_paid=settled.c.tax_paid,
+                    fidc_id=settled.c.fidc_id
+                )
+            )
+            updated += result.rowcount
+        else:
+            table = Operation.__table__
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam("settled_id"), *_job_predicates(table, job_id, created_range))
+                .values(
+                    status=bindparam("settled_status"),
+                    execution_price=bindparam("settled_execution_price"),
+                    total_value=bindparam("settled_total_value"),
+                    tax_paid=bindparam("settled_tax_paid"),
+                    fidc_id=bindparam("settled_fidc_id")
+                ),
+                [{f"settled_{key}": value for key, value in row.items()} for row in chunk]
+            )
+            updated += result.rowcount
+    return updated
+
+def ingest_ndjson_operations(job_id, lines, fidc_id=None, chunk_size=OPERATIONS_BULK_CHUNK_SIZE,
+                             max_reported_errors=STREAM_MAX_REPORTED_ERRORS):
+    """
+    Ingestão incremental de operações em NDJSON (uma operação por linha).
+    - Cada linha é validada isoladamente; linhas inválidas ou com id repetido viram erros
+      e não rejeitam o restante do upload.
+    - A cada chunk_size linhas válidas o lote é gravado como PENDING e confirmado,
+      então a memória fica limitada a um lote (mais os ids já vistos, para detectar repetição).
+    - sequence segue a ordem das linhas, que é a ordem de liquidação.
+    Retorna {accepted, rejected, errors}.
+    """
+    schema = OperationSchema()
+    next_sequence = 0
+    seen_ids = set()
+    batch = []
+    errors = []
+    accepted = 0
+    rejected = 0
+
+    def reject(line_number, messages):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < max_reported_errors:
+            errors.append({"line": line_number, "messages": messages})
+
+    def flush():
+        nonlocal next_sequence, accepted
+        for op_data, line_number in _insert_new_operations(job_id, batch, next_sequence, fidc_id):
+            if line_number is None:
+                accepted += 1
+            else:
+                reject(line_number, {"id": ["Operação já existente."]})
+        db.session.commit()
+        next_sequence += len(batch)
+        batch.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Cada linha deve ser um objeto JSON.")
+            op_data = schema.load(record)
+        except ValidationError as err:
+            reject(line_number, err.messages)
+            continue
+        except ValueError as err:
+            reject(line_number, {"_line": [str(err)]})
+            continue
+        if op_data["id"] in seen_ids:
+            reject(line_number, {"id": ["Id repetido no upload."]})
+            continue
+        seen_ids.add(op_data["id"])
+        batch.append((op_data, line_number))
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+
+    logger.info("Upload NDJSON de operações ingerido", extra={
+        "job_id": job_id,
+        "accepted": accepted,
+        "rejected": rejected
+    })
+    return {"accepted": accepted, "rejected": rejected, "errors": errors}
+
+def is_unique_violation(exc):
+    """IntegrityError de chave duplicada (Postgres 23505, SQLite "UNIQUE constraint failed"), não NOT NULL/FK."""
+    orig = getattr(exc, "orig", None)
+    return getattr(orig, "pgcode", None) == UNIQUE_VIOLATION or "UNIQUE constraint failed" in str(orig)
+
+def find_existing_operation_ids(ids, chunk_size=OPERATIONS_BULK_CHUNK_SIZE):
+    """
+    Ids já gravados em operations, consultados em chunks.
+    Consulta o registro operation_ids, que inclui os ids de partições já arquivadas. A verificação
+    evita rejeitar o lote inteiro; a unicidade em si é garantida pela PK de operation_ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    existing = set()
+    for chunk in _chunks(ids, chunk_size):
+        existing.update(db.session.scalars(select(OperationId.id).where(OperationId.id.in_(chunk))))
+    return existing
+
+def _insert_new_operations(job_id, batch, start_sequence, fidc_id=None):
+    """
+    Grava um lote do upload em um savepoint, sem os ids que já existem no banco.
+    Gera (operação, None) se gravada ou (operação, linha) se rejeitada.
+    """
+    operations = [
+        {
+            **{key: op_data[key] for key in ("id", "asset_code", "operation_type", "quantity")},
+            "sequence": start_sequence + index
+        }
+        for index, (op_data, _) in enumerate(batch)
+    ]
+    ids = [op_data["id"] for op_data in operations]
+    existing = find_existing_operation_ids(ids)
+    try:
+        new = [op_data for op_data in operations if op_data["id"] not in existing]
+        if new:
+            with db.session.begin_nested():
+                bulk_insert_pending_operations(job_id, new, fidc_id=fidc_id)
+    except IntegrityError as exc:
+        if not is_unique_violation(exc):
+            raise
+        # Outra requisição gravou algum dos ids depois da verificação: verifica de novo e grava o restante
+        existing = find_existing_operation_ids(ids)
+        new = [op_data for op_data in operations if op_data["id"] not in existing]
+        if new:
+            with db.session.begin_nested():
+                bulk_insert_pending_operations(job_id, new, fidc_id=fidc_id)
+    for op_data, (_, line_number) in zip(operations, batch):
+        yield op_data, line_number if op_data["id"] in existing else None
+
+def delete_job_operations(job_id):
+    """Remove todas as operações do job e libera os ids (upload descartado antes do despacho). Não faz commit."""
+    table = Operation.__table__
+    db.session.execute(
+        OperationId.__table__.delete().where(OperationId.id.in_(select(table.c.id).where(table.c.job_id == job_id)))
+    )
+    return db.session.execute(table.delete().where(table.c.job_id == job_id)).rowcount
+
+def get_pending_sequence_bounds(job_id):
+    """Menor e maior sequence das operações PENDING do job, ou None se não houver nenhuma."""
+    first, last = db.session.execute(
+        select(func.min(Operation.sequence), func.max(Operation.sequence))
+        .where(Operation.job_id == job_id, Operation.status == "PENDING")
+    ).one()
+    return None if first is None else (first, last)
+
+def iter_pending_operations(job_id, first_sequence=None, last_sequence=None, yield_per=OPERATIONS_YIELD_PER):
+    """
+    Itera as operações PENDING do job em ordem de envio, opcionalmente numa faixa de sequence (inclusiva).
+    Cursor server-side (yield_per): o worker não depende do payload original da requisição.
+    execution_price preenchido indica operação já preparada (checkpoint do chunk); created_at
+    permite restringir as atualizações seguintes às partições das operações (created_at_range).
+    """
+    query = select(
+        Operation.id, Operation.asset_code, Operation.operation_type, Operation.quantity, Operation.sequence,
+        Operation.execution_price, Operation.created_at
+    ).where(Operation.job_id == job_id, Operation.status == "PENDING")
+    if first_sequence is not None:
+        query = query.where(Operation.sequence >= first_sequence)
+    if last_sequence is not None:
+        query = query.where(Operation.sequence <= last_sequence)
+    query = query.order_by(Operation.sequence).execution_options(yield_per=yield_per)
+    for row in db.session.execute(query):
+        yield row
+
+def save_operation_prices(job_id, first_sequence, last_sequence, prices):
+    """
+    Checkpoint da preparação: grava o preço de cada ativo nas operações PENDING ainda sem preço
+    da faixa de sequence, com um UPDATE por ativo (executemany).
+    Não faz commit: o chamador controla a transação. Retorna o total de linhas atualizadas.
+    """
+    if not prices:
+        return 0
+    table = Operation.__table__
+    result = db.session.execute(
+        update(table)
+        .where(
+            table.c.job_id == job_id,
+            table.c.sequence.between(first_sequence, last_sequence),
+            table.c.asset_code == bindparam("priced_asset_code"),
+            table.c.status == "PENDING",
+            table.c.execution_price.is_(None)
+        )
+        .values(execution_price=bindparam("priced_execution_price")),
+        [
+            {"priced_asset_code": asset_code, "priced_execution_price": price}
+            for asset_code, price in prices.items()
+        ]
+    )
+    return result.rowcount
+
+def get_saved_job_prices(job_id, asset_codes):
+    """Preços já gravados nas operações do job (checkpoint de outros chunks), por asset_code."""
+    asset_codes = list(set(asset_codes))
+    if not asset_codes:
+        return {}
+    rows = db.session.execute(
+        select(Operation.asset_code, func.min(Operation.execution_price))
+        .where(
+            Operation.job_id == job_id,
+            Operation.asset_code.in_(asset_codes),
+            Operation.execution_price.isnot(None)
+        )
+        .group_by(Operation.asset_code)
+    )
+    return {asset_code: price for asset_code, price in rows}
+
+def fail_operations(job_id, failures, created_range=None, chunk_size=OPERATIONS_BULK_CHUNK_SIZE):
+    """
+    Marca operações do job como FAILED definitivamente, com o motivo em failure_reason.
+    - failures: pares (id, motivo).
+    - created_range: menor e maior created_at das operações, para o Postgres ler só as partições do job.
+    Não faz commit: o chamador controla a transação. Retorna o total de linhas atualizadas.
+    """
+    table = Operation.__table__
+    updated = 0
+    for chunk in _chunks(failures, chunk_size):
+        result = db.session.execute(
+            update(table)
+            .where(
+                table.c.id == bindparam("failed_id"),
+                table.c.status == "PENDING",
+                *_job_predicates(table, job_id, created_range)
+            )
+            .values(status="FAILED", failure_reason=bindparam("failed_reason")),
+            [{"failed_id": op_id, "failed_reason": reason} for op_id, reason in chunk]
+        )
+        updated += result.rowcount
+    return updated
+
+def fail_pending_job_operations(job_id, reason, fidc_id=None):
+    """
+    Marca como FAILED, com o motivo em failure_reason, todas as operações do job ainda PENDING
+    (job encerrado sem liquidação: tentativas esgotadas). Um único UPDATE pelo índice (job_id, status).
+    fidc_id, se informado, completa as operações gravadas sem ele (ingeridas antes de o fidc_id ser
+    gravado na ingestão), para que apareçam na exportação do FIDC.
+    Não faz commit: o chamador controla a transação. Retorna o total de linhas atualizadas.
+    """
+    table = Operation.__table__
+    values = {"status": "FAILED", "failure_reason": reason}
+    if fidc_id is not None:
+        values["fidc_id"] = func.coalesce(table.c.fidc_id, fidc_id)
+    result = db.session.execute(
+        update(table)
+        .where(table.c.job_id == job_id, table.c.status == "PENDING")
+        .values(**values)
+    )
+    return result.rowcount
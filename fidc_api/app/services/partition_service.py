@@ -0,0 +1,235 @@
+import os
+import re
+from datetime import datetime
+from sqlalchemy import column, func, select, table, text
+from app.db import db
+from app.db.models import ArchivedPartition, Operation, ProcessingJob
+from app.services.export_service import S3MultipartWriter, ensure_bucket, iter_csv_chunks, EXPORT_YIELD_PER
+from app.services.job_service import IN_FLIGHT_JOB_STATUSES
+from app.utils.s3_client import get_s3_client
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Partições mensais criadas à frente do mês corrente (beat diário e boot do worker)
+OPERATIONS_PARTITIONS_AHEAD = int(os.getenv("OPERATIONS_PARTITIONS_AHEAD", "2"))
+# Meses mantidos no banco, contando o corrente; partições mais antigas são arquivadas no S3
+OPERATIONS_HOT_MONTHS = int(os.getenv("OPERATIONS_HOT_MONTHS", "3"))
+OPERATIONS_ARCHIVE_PREFIX = os.getenv("OPERATIONS_ARCHIVE_PREFIX", "archive/operations").strip("/")
+# Depois de arquivada e desanexada, a partição é removida do banco (senão fica como tabela avulsa)
+OPERATIONS_ARCHIVE_DROP = os.getenv("OPERATIONS_ARCHIVE_DROP", "false").lower() in ("1", "true", "yes")
+
+# Arquivo com todas as colunas da operação; created_at por último (formato de iter_csv_chunks)
+ARCHIVE_COLUMNS = [name for name in Operation.__table__.columns.keys() if name != "created_at"] + ["created_at"]
+
+PARTITION_BOUND = re.compile(r"FROM \((?P<lower>[^)]+)\) TO \((?P<upper>[^)]+)\)")
+
+
+class PartitionArchiveError(Exception):
+    """O arquivo enviado ao S3 não confere com a partição: ela continua anexada."""
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def add_months(month, months):
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return datetime(month.year + year, month_index + 1, 1)
+
+def partition_name(month):
+    return f"{Operation.__tablename__}_{month:%Y_%m}"
+
+def parse_partition_bound(expression):
+    """
+    Limites de pg_get_expr(relpartbound): "FOR VALUES FROM ('2026-10-01 00:00:00') TO (...)".
+    Retorna (lower, upper); MINVALUE/MAXVALUE viram None.
+    """
+    match = PARTITION_BOUND.search(expression or "")
+    if not match:
+        return None, None
+
+    def bound(value):
+        value = value.strip()
+        if value in ("MINVALUE", "MAXVALUE"):
+            return None
+        return datetime.fromisoformat(value.strip("'"))
+
+    return bound(match.group("lower")), bound(match.group("upper"))
+
+def is_partitioned():
+    """operations é uma tabela particionada (só no Postgres, após a migração 0006)."""
+    if db.session.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.session.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"),
+        {"name": Operation.__tablename__}
+    ).scalar())
+
+def list_partitions():
+    """Partições anexadas a operations: [(nome, lower, upper, detach_pending)] em ordem de limite inferior."""
+    rows = db.session.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": Operation.__tablename__}).all()
+    partitions = [(name, *parse_partition_bound(bound), detach_pending) for name, bound, detach_pending in rows]
+    return sorted(partitions, key=lambda partition: partition[1] or datetime.min)
+
+def missing_partition_months(partitions, months_ahead, today=None):
+    """
+    Meses (do corrente até months_ahead à frente) sem partição em partitions [(nome, lower, upper, ...)].
+    Meses já cobertos por outra faixa (ex.: operations_legacy, que vai até o fim do mês da migração) ficam de fora.
+    """
+    current_month = month_start(today or datetime.utcnow())
+    missing = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current_month, offset)
+        next_month = add_months(month, 1)
+        covered = any(
+            (lower is None or lower < next_month) and (upper is None or upper > month)
+            for _, lower, upper, *_ in partitions
+        )
+        if not covered:
+            missing.append(month)
+    return missing
+
+def ensure_partitions(months_ahead=OPERATIONS_PARTITIONS_AHEAD, today=None):
+    """
+    Cria as partições mensais do mês corrente e dos months_ahead seguintes que ainda não existirem.
+    Sem partição para o mês, o INSERT falha: roda no boot do worker, no deploy e diariamente no beat.
+    Retorna os nomes das partições criadas; sem particionamento (SQLite, antes da 0006), não faz nada.
+    """
+    if not is_partitioned():
+        return []
+    created = []
+    for month in missing_partition_months(list_partitions(), months_ahead, today):
+        name = partition_name(month)
+        # IF NOT EXISTS: workers e deploy podem rodar ao mesmo tempo
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {Operation.__tablename__} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+        created.append(name)
+    db.session.commit()
+    logger.info("Partições de operações garantidas", extra={"created": created, "months_ahead": months_ahead})
+    return created
+
+def archive_partitions(hot_months=OPERATIONS_HOT_MONTHS, today=None, drop=OPERATIONS_ARCHIVE_DROP, s3=None):
+    """
+    Arquiva as partições fechadas: limite superior até o início do mês mais antigo mantido
+    (hot_months contando o corrente) e nenhuma operação PENDING de job em andamento.
+    Cada partição é exportada para o S3, conferida e desanexada (ver archive_partition).
+    Retorna um resumo por partição.
+    """
+    if not is_partitioned():
+        return []
+    cutoff = add_months(month_start(today or datetime.utcnow()), -(max(hot_months, 1) - 1))
+    archived = []
+    for name, _, upper, detach_pending in list_partitions():
+        if detach_pending:
+            # DETACH CONCURRENTLY interrompido: só falta concluir
+            _detach_partition(name, finalize=True, drop=drop)
+            continue
+        if upper is None or upper > cutoff:
+            continue
+        result = archive_partition(name, drop=drop, s3=s3)
+        if result:
+            archived.append(result)
+    return archived
+
+def archive_partition(name, drop=OPERATIONS_ARCHIVE_DROP, s3=None, yield_per=EXPORT_YIELD_PER):
+    """
+    Exporta a partição em csv.gz para <OPERATIONS_ARCHIVE_PREFIX>/<partição>.csv.gz (multipart, em streaming)
+    e a desanexa com DETACH ... CONCURRENTLY, sem bloquear leituras e escritas em operations.
+    - Partição com operações PENDING de job em andamento (RECEIVING/PROCESSING) fica para a próxima
+      execução. PENDING de jobs encerrados ou sem job (ex.: histórico da operations_legacy) não muda
+      mais: é arquivada como está, senão a partição nunca sairia do banco.
+    - A contagem de linhas enviadas é conferida antes de desanexar (PartitionArchiveError se divergir).
+    - O arquivamento é registrado em archived_partitions antes do DETACH (ver has_archived_partitions).
+    Retorna o resumo, ou None se a partição foi mantida.
+    """
+    partition = table(name, *[column(column_name) for column_name in ARCHIVE_COLUMNS])
+    pending = in_flight_pending_jobs(name)
+    if pending:
+        db.session.rollback()
+        logger.warning("Partição com operações PENDING de jobs em andamento não arquivada", extra={
+            "partition": name,
+            "pending": sum(pending.values()),
+            "jobs": sorted(pending)[:20]
+        })
+        return None
+
+    s3 = s3 or get_s3_client()
+    bucket = os.getenv("MINIO_BUCKET", "fidc-exports")
+    key = f"{OPERATIONS_ARCHIVE_PREFIX}/{name}.csv.gz"
+    ensure_bucket(s3, bucket)
+
+    total_rows = 0
+
+    def tracked(rows):
+        nonlocal total_rows
+        for row in rows:
+            total_rows += 1
+            yield row
+
+    rows = db.session.execute(
+        select(*partition.c)
+        .order_by(partition.c.created_at, partition.c.id)
+        .execution_options(yield_per=yield_per)
+    )
+    with S3MultipartWriter(s3, bucket, key) as upload:
+        for chunk in iter_csv_chunks(tracked(rows), compress=True, columns=ARCHIVE_COLUMNS):
+            upload.write(chunk)
+
+    expected = db.session.execute(select(func.count()).select_from(partition)).scalar()
+    # DETACH CONCURRENTLY espera as transações abertas que usam a tabela, inclusive a desta sessão
+    db.session.rollback()
+    if expected != total_rows:
+        raise PartitionArchiveError(
+            f"Partição {name} com {expected} operações, {total_rows} arquivadas em {key}"
+        )
+
+    # merge: nova tentativa depois de um DETACH que falhou
+    db.session.merge(ArchivedPartition(partition=name, bucket=bucket, key=key, operations=total_rows))
+    db.session.commit()
+    _detach_partition(name, drop=drop)
+    logger.info("Partição de operações arquivada", extra={
+        "partition": name,
+        "bucket": bucket,
+        "key": key,
+        "operations": total_rows,
+        "bytes": upload.bytes_written,
+        "dropped": drop
+    })
+    return {
+        "partition": name,
+        "bucket": bucket,
+        "key": key,
+        "operations": total_rows,
+        "bytes": upload.bytes_written,
+        "dropped": drop
+    }
+
+def has_archived_partitions():
+    """Alguma partição de operations já foi arquivada (histórico incompleto no banco)."""
+    return db.session.query(select(ArchivedPartition.partition).exists()).scalar()
+
+def in_flight_pending_jobs(name):
+    """Operações PENDING da partição (ou tabela) name por job em andamento: {job_id: quantidade}."""
+    partition = table(name, column("job_id"), column("status"))
+    rows = db.session.execute(
+        select(partition.c.job_id, func.count())
+        .join(ProcessingJob, ProcessingJob.job_id == partition.c.job_id)
+        .where(partition.c.status == "PENDING", ProcessingJob.status.in_(IN_FLIGHT_JOB_STATUSES))
+        .group_by(partition.c.job_id)
+    )
+    return {job_id: count for job_id, count in rows}
+
+def _detach_partition(name, finalize=False, drop=False):
+    # CONCURRENTLY (Postgres 14+) não roda dentro de transação
+    mode = "FINALIZE" if finalize else "CONCURRENTLY"
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"ALTER TABLE {Operation.__tablename__} DETACH PARTITION {name} {mode}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+    logger.info("Partição de operações desanexada", extra={"partition": name, "finalize": finalize, "dropped": drop})
@@ -0,0 +1,146 @@
+import os
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from app.db import db
+from app.db.models import FidcCash, Operation, Position, ProcessingJob
+from app.services.fidc_lane import lock_fidc_cash
+from app.services.partition_service import has_archived_partitions
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rebuild: operações lidas do histórico por cursor server-side
+POSITIONS_REBUILD_YIELD_PER = int(os.getenv("POSITIONS_REBUILD_YIELD_PER", "5000"))
+
+
+class PositionsRebuildError(Exception):
+    """O histórico de operações no banco está incompleto: o rebuild sobrescreveria posições corretas."""
+
+def apply_trade(quantity, average_cost, realized_pnl, operation_type, trade_quantity, total_value):
+    """
+    Aplica uma operação liquidada à posição pelo custo médio. Retorna (quantity, average_cost, realized_pnl).
+    - Valor unitário: total_value / quantidade (compra: bruto + taxa; venda: bruto - taxa).
+    - No sentido da posição (ou com a posição zerada) recalcula o custo médio.
+    - No sentido contrário realiza o resultado sobre a parte encerrada; se a posição inverter,
+      o saldo restante abre com o valor unitário da operação.
+    Função pura: não acessa banco.
+    """
+    if trade_quantity <= 0:
+        return quantity, average_cost, realized_pnl
+    signed_quantity = trade_quantity if operation_type == "BUY" else -trade_quantity
+    unit_value = total_value / trade_quantity
+
+    if quantity == 0 or (quantity > 0) == (signed_quantity > 0):
+        new_quantity = quantity + signed_quantity
+        average_cost = (abs(quantity) * average_cost + trade_quantity * unit_value) / abs(new_quantity)
+        return new_quantity, average_cost, realized_pnl
+
+    closed = min(trade_quantity, abs(quantity))
+    direction = 1 if quantity > 0 else -1
+    realized_pnl += closed * (unit_value - average_cost) * direction
+    new_quantity = quantity + signed_quantity
+    if new_quantity == 0:
+        average_cost = 0.0
+    elif (new_quantity > 0) != (quantity > 0):
+        average_cost = unit_value
+    return new_quantity, average_cost, realized_pnl
+
+def apply_settled_operations(fidc_id, operations, total_values, updated_at):
+    """
+    Atualiza as posições do FIDC com as operações liquidadas de um job, na ordem de liquidação.
+    - Lê e grava só as posições dos ativos do job.
+    - Não faz commit: roda na mesma transação (e na fila do FIDC) que grava o caixa.
+    Retorna a quantidade de posições atualizadas.
+    """
+    asset_codes = {operation.asset_code for operation in operations}
+    if not asset_codes:
+        return 0
+    positions = {
+        position.asset_code: position
+        for position in db.session.execute(
+            select(Position)
+            .where(Position.fidc_id == fidc_id, Position.asset_code.in_(asset_codes))
+            .execution_options(populate_existing=True)
+        ).scalars()
+    }
+    state = {
+        asset_code: (position.quantity, position.average_cost, position.realized_pnl)
+        for asset_code, position in positions.items()
+    }
+    for operation, total_value in zip(operations, total_values):
+        state[operation.asset_code] = apply_trade(
+            *state.get(operation.asset_code, (0, 0.0, 0.0)),
+            operation.operation_type, operation.quantity, total_value
+        )
+
+    for asset_code, (quantity, average_cost, realized_pnl) in state.items():
+        position = positions.get(asset_code)
+        if position is None:
+            position = Position(fidc_id=fidc_id, asset_code=asset_code)
+            db.session.add(position)
+        position.quantity = quantity
+        position.average_cost = average_cost
+        position.realized_pnl = realized_pnl
+        position.updated_at = updated_at
+    return len(state)
+
+def get_positions(fidc_id):
+    """Posições do FIDC (chave primária (fidc_id, asset_code)): custo proporcional aos ativos, não às operações."""
+    return db.session.execute(
+        select(Position).where(Position.fidc_id == fidc_id).order_by(Position.asset_code)
+    ).scalars().all()
+
+def rebuild_positions(fidc_id=None, yield_per=POSITIONS_REBUILD_YIELD_PER):
+    """
+    Recalcula as posições a partir do histórico de operações PROCESSED, um FIDC por vez.
+    - Ordem de liquidação: conclusão do job e sequence dentro do job.
+    - Cada FIDC é reconstruído na fila de liquidação dele e substituído em um único commit.
+    - Com partições de operations arquivadas (archived_partitions), o histórico está incompleto:
+      levanta PositionsRebuildError sem alterar nada.
+    Retorna {fidc_id: quantidade de posições}.
+    """
+    if has_archived_partitions():
+        raise PositionsRebuildError(
+            "Há partições de operations arquivadas: o histórico no banco está incompleto e o rebuild "
+            "sobrescreveria as posições atuais"
+        )
+    fidc_ids = [fidc_id] if fidc_id else db.session.scalars(select(FidcCash.fidc_id).order_by(FidcCash.fidc_id)).all()
+    rebuilt = {}
+    for current_fidc_id in fidc_ids:
+        # Mesmo lock da liquidação (Postgres): nenhum job do FIDC liquida durante o rebuild
+        if lock_fidc_cash(current_fidc_id) is None:
+            db.session.rollback()
+            logger.warning("FIDC não encontrado para rebuild de posições", extra={"fidc_id": current_fidc_id})
+            continue
+
+        query = (
+            select(Operation.asset_code, Operation.operation_type, Operation.quantity, Operation.total_value)
+            .outerjoin(ProcessingJob, ProcessingJob.job_id == Operation.job_id)
+            .where(Operation.fidc_id == current_fidc_id, Operation.status == "PROCESSED")
+            .order_by(ProcessingJob.completed_at, Operation.job_id, Operation.sequence, Operation.id)
+            .execution_options(yield_per=yield_per)
+        )
+        state = {}
+        for row in db.session.execute(query):
+            state[row.asset_code] = apply_trade(
+                *state.get(row.asset_code, (0, 0.0, 0.0)), row.operation_type, row.quantity, row.total_value
+            )
+
+        now = datetime.utcnow()
+        db.session.execute(delete(Position).where(Position.fidc_id == current_fidc_id))
+        if state:
+            db.session.execute(insert(Position), [
+                {
+                    "fidc_id": current_fidc_id,
+                    "asset_code": asset_code,
+                    "quantity": quantity,
+                    "average_cost": average_cost,
+                    "realized_pnl": realized_pnl,
+                    "updated_at": now
+                }
+                for asset_code, (quantity, average_cost, realized_pnl) in state.items()
+            ])
+        db.session.commit()
+        rebuilt[current_fidc_id] = len(state)
+        logger.info("Posições do FIDC reconstruídas", extra={"fidc_id": current_fidc_id, "positions": len(state)})
+    return rebuilt
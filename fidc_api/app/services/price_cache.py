@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from app.utils.logger import get_logger
+from app.utils.redis_client import get_redis_client
+
+logger = get_logger(__name__)
+
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "60"))
+PRICE_CACHE_MAX_SIZE = int(os.getenv("PRICE_CACHE_MAX_SIZE", "1024"))
+PRICE_CACHE_KEY_PREFIX = "asset_price_cache"
+# Preço fixado por job: o primeiro preço de cada ativo vale para todos os chunks do job
+JOB_PRICE_TTL = int(os.getenv("JOB_PRICE_TTL", "86400"))
+JOB_PRICE_KEY_PREFIX = "job_prices"
+
+
+class PriceCache:
+    """
+    Cache de preços de ativos em duas camadas na frente de get_asset_price.
+    - L1: LRU em memória do processo, com TTL por entrada.
+    - L2: Redis compartilhado entre workers, com o mesmo TTL (SET ... EX).
+    - Falhas do Redis são tratadas como miss: o cache nunca derruba o job.
+    """
+
+    def __init__(self, fetcher=None, redis_client=None, ttl=PRICE_CACHE_TTL, max_size=PRICE_CACHE_MAX_SIZE):
+        self._fetcher = fetcher
+        self._redis = redis_client
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def _fetch(self, asset_code):
+        if self._fetcher is None:
+            from app.services.asset_service import get_asset_price
+            self._fetcher = get_asset_price
+        return self._fetcher(asset_code)
+
+    def _get_local(self, asset_code):
+        with self._lock:
+            entry = self._entries.get(asset_code)
+            if entry is None:
+                return None
+            price, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[asset_code]
+                return None
+            self._entries.move_to_end(asset_code)
+            return price
+
+    def _set_local(self, asset_code, price):
+        with self._lock:
+            self._entries[asset_code] = (price, time.monotonic() + self.ttl)
+            self._entries.move_to_end(asset_code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, asset_code):
+        try:
+            value = self.redis.get(f"{PRICE_CACHE_KEY_PREFIX}:{asset_code}")
+        except redis.RedisError as exc:
+            logger.warning("Falha ao ler cache de preço no Redis", extra={"asset_code": asset_code, "error": str(exc)})
+            return None
+        return float(value) if value is not None else None
+
+    def _set_shared(self, asset_code, price):
+        try:
+            self.redis.set(f"{PRICE_CACHE_KEY_PREFIX}:{asset_code}", price, ex=self.ttl)
+        except redis.RedisError as exc:
+            logger.warning("Falha ao gravar cache de preço no Redis", extra={"asset_code": asset_code, "error": str(exc)})
+
+    def get(self, asset_code):
+        price = self._get_local(asset_code)
+        if price is not None:
+            self.local_hits += 1
+            return price
+
+        price = self._get_shared(asset_code)
+        if price is not None:
+            self.redis_hits += 1
+            self._set_local(asset_code, price)
+            return price
+
+        self.misses += 1
+        price = self._fetch(asset_code)
+        self._set_local(asset_code, price)
+        self._set_shared(asset_code, price)
+        return price
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+
+class JobPriceMemo:
+    """
+    Memo de preços com escopo de um job: cada asset_code é resolvido uma única
+    vez e todas as operações do job usam o mesmo preço.
+    - Com job_id, o primeiro preço de cada ativo é fixado no Redis (HSETNX em job_prices:<job_id>)
+      e lido pelos demais chunks do job, em qualquer worker, mesmo depois de expirar o cache.
+    - prices: preços já conhecidos do job (ex.: gravados por outros chunks), usados sem consulta.
+    Com o Redis indisponível, vale o preço do cache/consulta (como no PriceCache).
+    """
+
+    def __init__(self, cache, job_id=None, prices=None, ttl=JOB_PRICE_TTL):
+        self._cache = cache
+        self._job_id = job_id
+        self._prices = dict(prices or {})
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, asset_code):
+        if asset_code in self._prices:
+            self.hits += 1
+            return self._prices[asset_code]
+        self.misses += 1
+        price = self._get_pinned(asset_code)
+        if price is None:
+            price = self._pin(asset_code, self._cache.get(asset_code))
+        self._prices[asset_code] = price
+        return price
+
+    def _key(self):
+        return f"{JOB_PRICE_KEY_PREFIX}:{self._job_id}"
+
+    def _get_pinned(self, asset_code):
+        if self._job_id is None:
+            return None
+        try:
+            value = self._cache.redis.hget(self._key(), asset_code)
+        except redis.RedisError as exc:
+            logger.warning("Falha ao ler preço fixado do job", extra={"job_id": self._job_id, "error": str(exc)})
+            return None
+        return float(value) if value is not None else None
+
+    def _pin(self, asset_code, price):
+        # HSETNX + HGET na mesma transação: chunks concorrentes ficam com o preço de quem gravou primeiro
+        if self._job_id is None:
+            return price
+        try:
+            pipe = self._cache.redis.pipeline()
+            pipe.hsetnx(self._key(), asset_code, price)
+            pipe.hget(self._key(), asset_code)
+            pipe.expire(self._key(), self.ttl)
+            _, pinned, _ = pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Falha ao fixar preço do job", extra={"job_id": self._job_id, "error": str(exc)})
+            return price
+        return float(pinned) if pinned is not None else price
+
+    def prices(self):
+        """Preço resolvido de cada asset_code, para repassar à liquidação."""
+        return dict(self._prices)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "distinct_assets": len(self._prices)}
+
+
+# Cache compartilhado do processo (um por worker)
+price_cache = PriceCache()
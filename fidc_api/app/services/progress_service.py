@@ -0,0 +1,144 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import redis
+
+from app.utils.logger import get_logger
+from app.utils.redis_client import get_redis_client
+
+logger = get_logger(__name__)
+
+JOB_PROGRESS_TTL = int(os.getenv("JOB_PROGRESS_TTL", "86400"))
+JOB_PROGRESS_KEY_PREFIX = "job_progress"
+JOB_EVENTS_CHANNEL_PREFIX = "job_events"
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+
+def _key(job_id):
+    return f"{JOB_PROGRESS_KEY_PREFIX}:{job_id}"
+
+def _channel(job_id):
+    return f"{JOB_EVENTS_CHANNEL_PREFIX}:{job_id}"
+
+def _execute(job_id, commands, event="progress"):
+    """
+    Executa comandos no hash de progresso e publica o evento no canal do job,
+    tudo em um único round-trip. Falhas do Redis não interrompem o job.
+    """
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        commands(pipe, _key(job_id))
+        pipe.expire(_key(job_id), JOB_PROGRESS_TTL)
+        pipe.publish(_channel(job_id), json.dumps({"job_id": job_id, "event": event}))
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("Falha ao publicar progresso do job", extra={"job_id": job_id, "error": str(exc)})
+
+def start_job_progress(job_id, total_operations):
+    now = time.time()
+    _execute(job_id, lambda pipe, key: pipe.hset(key, mapping={
+        "status": "PROCESSING",
+        "total": total_operations,
+        "prepared": 0,
+        "processed": 0,
+        "failed": 0,
+        "started_at": now,
+        "updated_at": now,
+    }))
+
+def add_prepared_operations(job_id, count, failed=0):
+    """
+    Chunk preparado (preço + validação): alimenta a vazão observada do job e soma as falhas
+    definitivas do chunk no mesmo round-trip. processed só avança na liquidação (finish_job_progress).
+    """
+    def commands(pipe, key):
+        pipe.hincrby(key, "prepared", count)
+        if failed:
+            pipe.hincrby(key, "failed", failed)
+        pipe.hset(key, "updated_at", time.time())
+    _execute(job_id, commands)
+
+def finish_job_progress(job_id, status, processed=0, failed=0):
+    now = time.time()
+    _execute(job_id, lambda pipe, key: pipe.hset(key, mapping={
+        "status": status,
+        "processed": processed,
+        "failed": failed,
+        "updated_at": now,
+        "completed_at": now,
+    }), event=status.lower())
+
+def get_job_progress(job_id):
+    """
+    Lê o progresso do job no Redis. Retorna None se não houver registro ou se o Redis falhar,
+    para que o chamador use o banco como fallback.
+    """
+    try:
+        data = get_redis_client().hgetall(_key(job_id))
+    except redis.RedisError as exc:
+        logger.warning("Falha ao ler progresso do job", extra={"job_id": job_id, "error": str(exc)})
+        return None
+
+    data = {key.decode(): value.decode() for key, value in data.items()}
+    # Registro incompleto (ex.: start_job_progress falhou ou expirou): usa o banco
+    if "status" not in data or "started_at" not in data:
+        return None
+
+    total = int(data.get("total", 0))
+    prepared = int(data.get("prepared", 0))
+    started_at = float(data["started_at"])
+    updated_at = float(data["updated_at"])
+    completed_at = float(data["completed_at"]) if "completed_at" in data else None
+
+    elapsed = updated_at - started_at
+    ops_per_sec = prepared / elapsed if prepared and elapsed > 0 else None
+
+    # ETA a partir da vazão observada, ancorado na última atualização (estável entre polls)
+    if completed_at is not None:
+        estimated_completion = completed_at
+    elif ops_per_sec:
+        estimated_completion = updated_at + max(total - prepared, 0) / ops_per_sec
+    else:
+        estimated_completion = None
+
+    return {
+        "status": data["status"],
+        "total_operations": total,
+        "prepared": prepared,
+        "processed": int(data.get("processed", 0)),
+        "failed": int(data.get("failed", 0)),
+        "ops_per_sec": round(ops_per_sec, 2) if ops_per_sec else None,
+        "estimated_completion": (
+            datetime.utcfromtimestamp(estimated_completion).isoformat() if estimated_completion else None
+        ),
+    }
+
+def subscribe_job_events(job_id):
+    """Assina o canal de eventos do job. Retorna None se o Redis estiver indisponível."""
+    try:
+        pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(_channel(job_id))
+        return pubsub
+    except redis.RedisError as exc:
+        logger.warning("Falha ao assinar eventos do job", extra={"job_id": job_id, "error": str(exc)})
+        return None
+
+def wait_for_job_event(pubsub, timeout):
+    """Aguarda o próximo evento do job por até timeout segundos. Retorna o evento ou None."""
+    if pubsub is None:
+        time.sleep(timeout)
+        return None
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = pubsub.get_message(timeout=remaining)
+            if message and message["type"] == "message":
+                return json.loads(message["data"])
+    except redis.RedisError as exc:
+        logger.warning("Falha ao aguardar eventos do job", extra={"error": str(exc)})
+        return None
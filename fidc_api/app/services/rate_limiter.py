@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+import time
+
+from app.utils.redis_client import get_redis_client
+from app.utils.metrics import RATE_LIMIT_WAIT_SECONDS
+
+RATE_LIMIT_CAPACITY = int(os.getenv("ASSET_PRICE_RATE_LIMIT", "10"))
+RATE_LIMIT_PERIOD = float(os.getenv("ASSET_PRICE_RATE_PERIOD", "60"))
+RATE_LIMIT_TIMEOUT = float(os.getenv("ASSET_PRICE_RATE_TIMEOUT", "30"))
+RATE_LIMIT_KEY_PREFIX = "asset_price_bucket"
+
+# Token bucket atômico: recarga, consumo e expiração em um único round-trip.
+# Usa o relógio do Redis (TIME) para que todos os workers compartilhem a mesma base de tempo.
+# Retorna {permitido (0/1), espera estimada em ms até o próximo token}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_per_ms)
+
+local allowed = 0
+local wait_ms = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait_ms = math.ceil((requested - tokens) / refill_per_ms)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_per_ms) + 1000)
+return {allowed, wait_ms}
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Nenhum token ficou disponível dentro do timeout de acquire()."""
+
+
+class TokenBucketRateLimiter:
+    """
+    Rate limit por ativo com token bucket no Redis.
+    - capacity tokens a cada period segundos, recarregados continuamente.
+    - acquire() aguarda o próximo token em vez de falhar imediatamente.
+    - Métricas de espera acumuladas por processo (stats()).
+    """
+
+    def __init__(self, redis_client=None, capacity=RATE_LIMIT_CAPACITY, period=RATE_LIMIT_PERIOD,
+                 key_prefix=RATE_LIMIT_KEY_PREFIX):
+        self._redis = redis_client
+        self._script = None
+        self.capacity = capacity
+        self.period = period
+        self.key_prefix = key_prefix
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def _key(self, asset_code):
+        return f"{self.key_prefix}:{asset_code}"
+
+    def try_acquire(self, asset_code):
+        """Tenta consumir um token. Retorna (permitido, segundos até o próximo token)."""
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        refill_per_ms = self.capacity / (self.period * 1000.0)
+        allowed, wait_ms = self._script(keys=[self._key(asset_code)], args=[self.capacity, refill_per_ms, 1])
+        return bool(allowed), int(wait_ms) / 1000.0
+
+    def _record(self, waited, acquired):
+        RATE_LIMIT_WAIT_SECONDS.labels(outcome="acquired" if acquired else "timeout").observe(waited)
+        with self._lock:
+            if acquired:
+                self.acquired += 1
+            else:
+                self.timeouts += 1
+            if waited > 0:
+                self.waits += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def acquire(self, asset_code, timeout=RATE_LIMIT_TIMEOUT):
+        """
+        Bloqueia até obter um token para o ativo. Retorna o tempo esperado em segundos.
+        Lança RateLimitTimeout se o próximo token não estiver disponível dentro do timeout.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        waited = 0.0
+        while True:
+            allowed, wait = self.try_acquire(asset_code)
+            now = time.monotonic()
+            if allowed:
+                self._record(waited, True)
+                return waited
+            if deadline is not None and now + wait > deadline:
+                self._record(waited, False)
+                raise RateLimitTimeout(
+                    f"Rate limit excedido para o ativo {asset_code} "
+                    f"({self.capacity} req/{int(self.period)}s)"
+                )
+            time.sleep(wait)
+            waited = time.monotonic() - start
+
+    async def acquire_async(self, asset_code, timeout=RATE_LIMIT_TIMEOUT):
+        """Versão assíncrona de acquire(): aguarda o token sem bloquear o event loop."""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        waited = 0.0
+        while True:
+            allowed, wait = await asyncio.to_thread(self.try_acquire, asset_code)
+            now = time.monotonic()
+            if allowed:
+                self._record(waited, True)
+                return waited
+            if deadline is not None and now + wait > deadline:
+                self._record(waited, False)
+                raise RateLimitTimeout(
+                    f"Rate limit excedido para o ativo {asset_code} "
+                    f"({self.capacity} req/{int(self.period)}s)"
+                )
+            await asyncio.sleep(wait)
+            waited = time.monotonic() - start
+
+    def stats(self):
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "waits": self.waits,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "avg_wait_seconds": round(self.total_wait / self.waits, 3) if self.waits else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+            }
+
+
+# Limiter compartilhado do processo
+rate_limiter = TokenBucketRateLimiter()
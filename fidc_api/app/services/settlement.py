@@ -0,0 +1,85 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+BUY_TAX_RATE = 0.005
+SELL_TAX_RATE = 0.003
+
+
+class InsufficientCash(Exception):
+    """
+    Compra sem caixa suficiente no lote: com o mesmo caixa e os mesmos preços, uma nova tentativa
+    falha do mesmo jeito. overdraw_index é a posição da operação no lote (SettlementResult.overdraw_index).
+    """
+
+    def __init__(self, message, overdraw_index):
+        super().__init__(message)
+        self.overdraw_index = overdraw_index
+
+
+class SettlementResult(NamedTuple):
+    """
+    Resultado da liquidação de um lote, com um valor por operação.
+    - total: custo total da compra (bruto + taxa) ou líquido da venda (bruto - taxa).
+    - cash_after: caixa do FIDC após cada operação.
+    - settled: quantidade de operações liquidadas (prefixo do lote).
+    - overdraw_index: posição da primeira compra sem caixa suficiente, ou None.
+    """
+    gross: np.ndarray
+    tax: np.ndarray
+    total: np.ndarray
+    cash_after: np.ndarray
+    settled: int
+    overdraw_index: Optional[int]
+    final_cash: float
+
+
+def settle_batch(quantities, prices, operation_types, available_cash):
+    """
+    Liquida um lote de operações BUY/SELL de forma vetorizada, na ordem recebida.
+    - Taxa: 0,5% sobre compras e 0,3% sobre vendas.
+    - O caixa corrente é a soma acumulada dos deltas a partir de available_cash.
+    - A liquidação para antes da primeira compra que deixaria o caixa negativo.
+    Função pura: não acessa banco nem Redis.
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    operation_types = np.asarray(operation_types, dtype=str)
+
+    if not (quantities.shape == prices.shape == operation_types.shape):
+        raise ValueError("quantities, prices e operation_types devem ter o mesmo tamanho")
+
+    is_buy = operation_types == "BUY"
+    is_sell = operation_types == "SELL"
+    if not np.all(is_buy | is_sell):
+        raise ValueError("Tipo de operação inválido")
+    if np.any(prices <= 0):
+        raise ValueError("Preço do ativo inválido")
+
+    gross = quantities * prices
+    tax = gross * np.where(is_buy, BUY_TAX_RATE, SELL_TAX_RATE)
+    total = np.where(is_buy, gross + tax, gross - tax)
+    delta = np.where(is_buy, -total, total)
+
+    # Soma acumulada a partir do caixa inicial, na mesma ordem do loop sequencial
+    cash_after = np.cumsum(np.concatenate(([float(available_cash)], delta)))[1:]
+
+    overdrawn = np.flatnonzero(is_buy & (cash_after < 0))
+    if overdrawn.size:
+        overdraw_index = int(overdrawn[0])
+        settled = overdraw_index
+    else:
+        overdraw_index = None
+        settled = len(delta)
+
+    final_cash = float(cash_after[settled - 1]) if settled else float(available_cash)
+
+    return SettlementResult(
+        gross=gross,
+        tax=tax,
+        total=total,
+        cash_after=cash_after,
+        settled=settled,
+        overdraw_index=overdraw_index,
+        final_cash=final_cash,
+    )
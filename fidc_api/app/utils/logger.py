@@ -1,6 +1,32 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-import json
+import threading
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback sem a dependência opcional
+    orjson = None
+    import json
+
+# Atributos padrão do LogRecord: todo o resto veio do extra e vai para o JSON
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Escrita em thread de background (QueueHandler/QueueListener); "false" volta ao StreamHandler síncrono
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+# Fração dos logs por operação efetivamente emitidos (1 = todos, 0 = nenhum)
+LOG_OPERATION_SAMPLE_RATE = float(os.getenv("LOG_OPERATION_SAMPLE_RATE", "0.01"))
+
+
+def _dumps(log_record):
+    if orjson is not None:
+        return orjson.dumps(log_record, default=str).decode()
+    return json.dumps(log_record, default=str)
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record):
@@ -10,20 +36,121 @@ class JsonFormatter(logging.Formatter):
             "name": record.name,
             "message": record.getMessage(),
         }
-        # Adiciona job_id ou operation_id se estiverem presentes no extra
-        if hasattr(record, "job_id"):
-            log_record["job_id"] = record.job_id
-        if hasattr(record, "operation_id"):
-            log_record["operation_id"] = record.operation_id
+        # Todos os campos do extra (job_id, operation_id, métricas etc.)
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and key not in log_record:
+                log_record[key] = value
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        elif record.exc_text:
+            log_record["exception"] = record.exc_text
+        return _dumps(log_record)
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enfileira o record sem serializá-lo: a formatação JSON e a escrita acontecem na thread do listener.
+    Só a mensagem e a exceção são resolvidas aqui, pois dependem do estado do chamador.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Cópia: os handlers seguintes (propagação) ainda recebem o exc_info original
+            record = copy.copy(record)
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # Resolver a mensagem não altera o resultado de getMessage() para os demais handlers
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_queue_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _start_listener():
+    global _queue_handler, _listener
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    if _queue_handler is None:
+        _queue_handler = _RecordQueueHandler(log_queue)
+    else:
+        _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def _get_handler():
+    with _lock:
+        if _listener is None:
+            _start_listener()
+    return _queue_handler
+
+
+def _restart_after_fork():
+    # Workers prefork do Celery herdam o handler, mas não a thread do listener
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+def stop_logging():
+    """Esvazia a fila e encerra o listener (chamado automaticamente na saída do processo)."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
 
 def get_logger(name):
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(JsonFormatter())
+        if LOG_ASYNC:
+            handler = _get_handler()
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(JsonFormatter())
         logger.addHandler(handler)
         logger.setLevel(logging.INFO)
-    return logger
\ No newline at end of file
+    return logger
+
+
+class OperationLogSampler:
+    """
+    Amostragem dos logs por operação de um job (caminho quente do worker).
+    - Emite 1 a cada round(1 / sample_rate) registros; os demais só são contados.
+    - summary() devolve os totais para o log de fechamento do job.
+    """
+
+    def __init__(self, logger, job_id, sample_rate=LOG_OPERATION_SAMPLE_RATE):
+        self.logger = logger
+        self.job_id = job_id
+        self.step = max(1, round(1 / sample_rate)) if sample_rate > 0 else None
+        self.seen = 0
+        self.logged = 0
+
+    def info(self, message, **extra):
+        index = self.seen
+        self.seen += 1
+        if self.step is None or index % self.step:
+            return
+        self.logged += 1
+        self.logger.info(message, extra={"job_id": self.job_id, "sampled": True, **extra})
+
+    def summary(self):
+        return {
+            "operations_seen": self.seen,
+            "operations_logged": self.logged,
+            "operations_suppressed": self.seen - self.logged
+        }
@@ -0,0 +1,146 @@
+import os
+import time
+from contextlib import ContextDecorator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, start_http_server
+)
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Com PROMETHEUS_MULTIPROC_DIR definido, processos do worker (prefork) gravam em arquivos
+# compartilhados e o exporter agrega todos eles
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "fidc_http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ["blueprint", "route", "method", "status"], buckets=FAST_BUCKETS
+)
+ASSET_PRICE_SECONDS = Histogram(
+    "fidc_asset_price_fetch_seconds", "Latência de get_asset_price (inclui espera do rate limit)",
+    ["outcome"], buckets=WAIT_BUCKETS
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "fidc_rate_limit_wait_seconds", "Tempo aguardando token do rate limit por ativo",
+    ["outcome"], buckets=WAIT_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "fidc_db_duration_seconds", "Latência de flush e commit da sessão do banco",
+    ["operation"], buckets=FAST_BUCKETS
+)
+S3_UPLOAD_SECONDS = Histogram(
+    "fidc_s3_upload_duration_seconds", "Latência das chamadas de upload ao S3",
+    ["operation"], buckets=FAST_BUCKETS
+)
+OPERATIONS_TOTAL = Counter(
+    "fidc_operations_total", "Operações liquidadas pelos jobs, por status", ["status"]
+)
+JOBS_TOTAL = Counter(
+    "fidc_jobs_total", "Jobs finalizados, por status", ["status"]
+)
+
+
+class timed(ContextDecorator):
+    """
+    Mede a duração de um bloco ou função em um histograma, inclusive quando há exceção.
+    Com outcome=True, acrescenta o label outcome=ok/error.
+        with timed(DB_SECONDS, operation="commit"): ...
+        @timed(ASSET_PRICE_SECONDS, outcome=True)
+    """
+
+    def __init__(self, histogram, outcome=False, **labels):
+        self.histogram = histogram
+        self.outcome = outcome
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self.labels)
+        if self.outcome:
+            labels["outcome"] = "error" if exc_type else "ok"
+        histogram = self.histogram.labels(**labels) if labels else self.histogram
+        histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+# Flush e commit de todas as sessões do SQLAlchemy (API e worker)
+@event.listens_for(Session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    session.info["metrics_flush_start"] = time.perf_counter()
+
+@event.listens_for(Session, "after_flush_postexec")
+def _after_flush(session, flush_context):
+    start = session.info.pop("metrics_flush_start", None)
+    if start is not None:
+        DB_SECONDS.labels(operation="flush").observe(time.perf_counter() - start)
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["metrics_commit_start"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    start = session.info.pop("metrics_commit_start", None)
+    if start is not None:
+        DB_SECONDS.labels(operation="commit").observe(time.perf_counter() - start)
+
+
+def get_registry():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def render_metrics():
+    """Retorna (corpo, content-type) no formato de exposição do Prometheus."""
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def init_app_metrics(app):
+    """Mede a latência de cada requisição, rotulada por blueprint e regra de rota (não pela URL)."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_request_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop("metrics_request_start", None)
+        if start is not None:
+            HTTP_REQUEST_SECONDS.labels(
+                blueprint=request.blueprint or "",
+                route=request.url_rule.rule if request.url_rule else "unmatched",
+                method=request.method,
+                status=response.status_code
+            ).observe(time.perf_counter() - start)
+        return response
+
+
+def start_worker_metrics_server(port=WORKER_METRICS_PORT):
+    """Exporter HTTP do worker (porta WORKER_METRICS_PORT; 0 desativa)."""
+    if not port:
+        return None
+    server = start_http_server(port, registry=get_registry())
+    logger.info("Exporter de métricas do worker iniciado", extra={"port": port})
+    return server
+
+
+def mark_process_dead(pid):
+    # Remove os gauges "live" do processo filho encerrado (modo multiprocesso)
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,23 @@
+import os
+import redis
+
+_redis_client = None
+
+def get_redis_client():
+    """
+    Retorna o client Redis compartilhado do processo.
+    - Usa REDIS_URL quando definido; caso contrário, REDIS_HOST/REDIS_PORT.
+    - O client mantém um pool de conexões, por isso é criado uma única vez.
+    """
+    global _redis_client
+    if _redis_client is None:
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            _redis_client = redis.Redis.from_url(redis_url)
+        else:
+            _redis_client = redis.Redis(
+                host=os.getenv("REDIS_HOST", "redis"),
+                port=int(os.getenv("REDIS_PORT", "6379")),
+                db=0
+            )
+    return _redis_client
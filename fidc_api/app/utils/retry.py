@@ -0,0 +1,34 @@
+import random
+import time
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Backoff exponencial com full jitter: uniforme em [0, min(max_delay, base_delay * 2^(attempt-1))]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def retry_with_backoff(func, *args, max_attempts=3, base_delay=0.5, max_delay=8.0,
+                       retry_on=(Exception,), sleep=time.sleep):
+    """
+    Chama func(*args) até max_attempts vezes, aguardando backoff_delay entre as tentativas.
+    Exceções fora de retry_on, ou a da última tentativa, são repassadas ao chamador.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func(*args)
+        except retry_on as exc:
+            if attempt >= max_attempts:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning("Falha transitória, nova tentativa", extra={
+                "function": getattr(func, "__name__", repr(func)),
+                "attempt": attempt,
+                "max_attempts": max_attempts,
+                "delay": round(delay, 3),
+                "error": str(exc)
+            })
+            sleep(delay)
@@ -1,11 +1,13 @@
-import boto3
 import os
 
 def get_s3_client():
+    # Import tardio: boto3 é pesado e só é necessário nos fluxos de exportação
+    import boto3
+
     return boto3.client(
         "s3",
         endpoint_url=os.getenv("MINIO_ENDPOINT"),
         aws_access_key_id=os.getenv("MINIO_ROOT_USER"),
         aws_secret_access_key=os.getenv("MINIO_ROOT_PASSWORD"),
         region_name="us-east-1"
-    )
\ No newline at end of file
+    )
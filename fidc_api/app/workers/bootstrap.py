@@ -0,0 +1,49 @@
+import os
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from app import create_app
+from app.db import db
+from app.utils.logger import get_logger
+from app.utils.metrics import start_worker_metrics_server, mark_process_dead
+
+logger = get_logger(__name__)
+
+_worker_app = None
+
+def get_worker_app():
+    """
+    Retorna o app Flask do processo worker, criado uma única vez.
+    Engine e pool de conexões são reaproveitados por todas as tasks do processo.
+    """
+    global _worker_app
+    if _worker_app is None:
+        _worker_app = create_app(worker=True)
+    return _worker_app
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    app = get_worker_app()
+    with app.app_context():
+        # Conexões herdadas do processo pai (fork) não podem ser compartilhadas
+        db.engine.dispose(close=False)
+    logger.info("App do worker inicializado", extra={"pool": app.config["SQLALCHEMY_ENGINE_OPTIONS"]})
+
+@worker_init.connect
+def init_worker_metrics(**kwargs):
+    # Exporter no processo principal do worker; com PROMETHEUS_MULTIPROC_DIR agrega os processos filhos
+    start_worker_metrics_server()
+
+@worker_init.connect
+def ensure_operations_partitions_on_boot(**kwargs):
+    # Partição do mês corrente garantida antes de consumir jobs, mesmo sem o beat rodando.
+    # No processo principal (uma vez por worker): os filhos descartam as conexões herdadas
+    from app.services.partition_service import ensure_partitions
+
+    try:
+        with get_worker_app().app_context():
+            ensure_partitions()
+    except Exception as exc:
+        logger.warning("Falha ao garantir as partições de operações", extra={"error": str(exc)})
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    mark_process_dead(os.getpid())
@@ -1,7 +1,23 @@
-from celery import Celery
-from app import create_app
-from app.utils.logger import get_logger
-from app.services.asset_service import get_asset_price
+import os
+from celery import Celery, chord
+from celery.schedules import crontab
+from app.workers.bootstrap import get_worker_app
+from app.utils.logger import get_logger, OperationLogSampler
+from app.utils.metrics import OPERATIONS_TOTAL, JOBS_TOTAL
+from app.utils.retry import backoff_delay, retry_with_backoff
+from app.services.asset_service import get_asset_prices
+from app.services.price_cache import price_cache, JobPriceMemo
+from app.services.rate_limiter import rate_limiter
+from app.services.settlement import InsufficientCash, settle_batch
+from app.services.operation_service import (
+    bulk_settle_operations, created_at_range, fail_operations, fail_pending_job_operations, get_pending_sequence_bounds,
+    get_saved_job_prices, iter_pending_operations, save_operation_prices
+)
+from app.services.job_service import get_operation_counts, get_stale_job_ids, JOB_STALE_SECONDS
+from app.services.position_service import apply_settled_operations
+from app.services.progress_service import add_prepared_operations, finish_job_progress
+from app.services.fidc_lane import FidcLaneBusy, run_in_fidc_lane, update_fidc_cash
+from app.services.partition_service import archive_partitions, ensure_partitions
 
 celery = Celery(
     "fidc_tasks",
@@ -11,80 +27,366 @@ celery = Celery(
 
 logger = get_logger(__name__)
 
-@celery.task(bind=True, max_retries=3, default_retry_delay=5)
-def process_operations_job(self, job_id, fidc_id, operations):
-    app = create_app()
-    with app.app_context():
+# Manutenção das partições de operations (celery beat): criação diária das próximas,
+# arquivamento mensal das que saíram da janela de OPERATIONS_HOT_MONTHS.
+# Jobs abandonados (em andamento há mais de JOB_STALE_SECONDS) são encerrados a cada 15 minutos
+celery.conf.beat_schedule = {
+    "fail-stale-jobs": {
+        "task": "app.workers.tasks.fail_stale_jobs",
+        "schedule": crontab(minute="*/15")
+    },
+    "ensure-operations-partitions": {
+        "task": "app.workers.tasks.ensure_operations_partitions",
+        "schedule": crontab(minute=5, hour=0)
+    },
+    "archive-operations-partitions": {
+        "task": "app.workers.tasks.archive_operations_partitions",
+        "schedule": crontab(minute=0, hour=3, day_of_month=1)
+    }
+}
+
+# Quantidade de operações por sub-task de preparação (preço + validação)
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "500"))
+
+# Consulta de preço por ativo: tentativas com backoff exponencial (full jitter) antes da falha definitiva
+PRICE_FETCH_MAX_ATTEMPTS = int(os.getenv("PRICE_FETCH_MAX_ATTEMPTS", "5"))
+PRICE_RETRY_BASE_DELAY = float(os.getenv("PRICE_RETRY_BASE_DELAY", "0.5"))
+PRICE_RETRY_MAX_DELAY = float(os.getenv("PRICE_RETRY_MAX_DELAY", "8"))
+# Tempo máximo por ativo no chunk, incluindo as novas tentativas
+PRICE_FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", "300"))
+
+# Fila do FIDC ocupada (lock_timeout): a liquidação volta para a fila após até esse tempo (s), com jitter,
+# sem consumir as tentativas do job
+FIDC_LANE_RETRY_DELAY = float(os.getenv("FIDC_LANE_RETRY_DELAY", "2"))
+
+VALID_OPERATION_TYPES = ("BUY", "SELL")
+
+def split_sequence_range(first_sequence, last_sequence, chunk_size):
+    """Divide a faixa [first_sequence, last_sequence] em faixas inclusivas de até chunk_size posições."""
+    return [
+        (start, min(start + chunk_size - 1, last_sequence))
+        for start in range(first_sequence, last_sequence + 1, chunk_size)
+    ]
+
+@celery.task
+def process_operations_job(job_id, fidc_id):
+    """
+    Orquestra o processamento de um job (claim-check: a mensagem leva só job_id/fidc_id).
+    - As operações PENDING já estão no banco; o job é dividido em faixas de sequence de JOB_CHUNK_SIZE.
+    - Chunks são preparados em paralelo (preço + validação), sem tocar no caixa.
+    - A liquidação roda uma única vez, em ordem, no callback do chord.
+    """
+    with get_worker_app().app_context():
+        bounds = get_pending_sequence_bounds(job_id)
+    if bounds is None:
+        logger.warning("Job sem operações PENDING para processar", extra={"job_id": job_id})
+        return
+
+    ranges = split_sequence_range(bounds[0], bounds[1], JOB_CHUNK_SIZE)
+    logger.info("Iniciando processamento do job", extra={"job_id": job_id, "chunks": len(ranges)})
+
+    # Errback só nos chunks: a liquidação encerra o job por conta própria ao esgotar as tentativas
+    # (no callback, o errback rodaria de novo depois dela e sobrescreveria o motivo da falha)
+    chord(
+        prepare_operations_chunk.s(job_id, index, first_sequence, last_sequence).on_error(mark_job_failed.s(job_id))
+        for index, (first_sequence, last_sequence) in enumerate(ranges)
+    )(settle_operations_job.s(job_id, fidc_id))
+    logger.info("Chunks do job despachados", extra={"job_id": job_id, "chunks": len(ranges)})
+
+@celery.task(bind=True, max_retries=3, default_retry_delay=5, acks_late=True, reject_on_worker_lost=True)
+def prepare_operations_chunk(self, job_id, chunk_index, first_sequence, last_sequence):
+    """
+    Prepara uma faixa de operações do job: valida e consulta o preço de cada ativo distinto.
+    - Os ativos distintos são consultados em paralelo (get_asset_prices); falhas de preço são
+      repetidas por ativo, com backoff (PRICE_FETCH_MAX_ATTEMPTS). Esgotadas as tentativas ou o
+      PRICE_FETCH_TIMEOUT, só as operações daquele ativo viram FAILED, com o motivo em failure_reason.
+    - Os preços são gravados nas operações (checkpoint) e confirmados ao fim do chunk: uma nova
+      tentativa, ou a reentrega após a queda do worker (acks_late), só consulta o que falta.
+    Não acessa o caixa do FIDC, portanto chunks podem rodar em qualquer ordem e worker.
+    """
+    with get_worker_app().app_context():
+        operations = [
+            operation for operation in iter_pending_operations(job_id, first_sequence, last_sequence)
+            if operation.execution_price is None
+        ]
+        saved_prices = get_saved_job_prices(job_id, (operation.asset_code for operation in operations))
+
+    valid = [operation for operation in operations if operation.operation_type in VALID_OPERATION_TYPES]
+    failures = [
+        (operation.id, "Tipo de operação inválido")
+        for operation in operations if operation.operation_type not in VALID_OPERATION_TYPES
+    ]
+
+    # Cada ativo distinto é consultado uma única vez por chunk, todos em paralelo: o chunk espera a
+    # consulta mais lenta, não a soma delas. O preço é fixado por job (Redis e checkpoint no banco):
+    # todos os chunks liquidam o ativo pelo mesmo preço, mesmo depois de expirar o cache
+    prices = JobPriceMemo(price_cache, job_id=job_id, prices=saved_prices)
+
+    def fetch_price(asset_code):
+        return retry_with_backoff(
+            prices.get, asset_code,
+            max_attempts=PRICE_FETCH_MAX_ATTEMPTS,
+            base_delay=PRICE_RETRY_BASE_DELAY,
+            max_delay=PRICE_RETRY_MAX_DELAY
+        )
+
+    _, price_errors = get_asset_prices(
+        (operation.asset_code for operation in valid), fetch=fetch_price, timeout=PRICE_FETCH_TIMEOUT
+    )
+    unavailable = {asset_code: f"Preço indisponível: {exc}" for asset_code, exc in price_errors.items()}
+    failures.extend(
+        (operation.id, unavailable[operation.asset_code]) for operation in valid if operation.asset_code in unavailable
+    )
+
+    try:
+        with get_worker_app().app_context():
+            from app.db import db
+            save_operation_prices(job_id, first_sequence, last_sequence, prices.prices())
+            failed = fail_operations(job_id, failures, created_range=created_at_range(operations))
+            db.session.commit()
+    except Exception as exc:
+        logger.warning("Erro ao gravar checkpoint do chunk", extra={"job_id": job_id, "chunk": chunk_index, "error": str(exc)})
+        raise self.retry(exc=exc)
+
+    if failed:
+        OPERATIONS_TOTAL.labels(status="FAILED").inc(failed)
+        logger.warning("Operações com falha definitiva no chunk", extra={
+            "job_id": job_id,
+            "chunk": chunk_index,
+            "failed": failed,
+            "unavailable_assets": sorted(unavailable)
+        })
+    add_prepared_operations(job_id, len(operations), failed=failed)
+    logger.info("Chunk do job preparado", extra={
+        "job_id": job_id,
+        "chunk": chunk_index,
+        "operations": len(operations),
+        "failed": failed,
+        "price_memo": prices.stats()
+    })
+    return {
+        "chunk": chunk_index,
+        "first_sequence": first_sequence,
+        "last_sequence": last_sequence,
+        "operations": len(operations),
+        "failed": failed
+    }
+
+@celery.task(bind=True, max_retries=3, default_retry_delay=5, acks_late=True, reject_on_worker_lost=True)
+def settle_operations_job(self, prepared_chunks, job_id, fidc_id, lane_waits=0):
+    """
+    Liquida o job inteiro, em ordem de sequence, com as operações e os preços gravados
+    pelos chunks (checkpoint no banco). Operações com falha definitiva já estão FAILED e ficam de fora.
+    Caixa, posições, operações e status do job são gravados no mesmo commit, dentro da fila do FIDC.
+    Entre as tentativas o job segue PROCESSING; esgotadas, as operações restantes viram FAILED com o motivo.
+    Espera na fila do FIDC (FidcLaneBusy) reenfileira o task sem contar como tentativa (lane_waits).
+    Caixa insuficiente (InsufficientCash) não muda numa nova tentativa: o job falha na hora.
+    """
+    with get_worker_app().app_context():
         from app.db import db
-        from app.db.models import FidcCash, Operation, ProcessingJob
+        from app.db.models import ProcessingJob
         from datetime import datetime
 
-        logger.info(f"Iniciando processamento do job", extra={"job_id": job_id})
+        job = db.session.get(ProcessingJob, job_id)
+        if job and job.status in ("COMPLETED", "FAILED"):
+            # Reentrega após a queda do worker depois do commit (FAILED só é gravado no fim): nada a refazer
+            logger.info("Job já finalizado", extra={"job_id": job_id, "status": job.status})
+            return
 
-        try:
-            job = db.session.get(ProcessingJob, job_id)
-            fidc = db.session.get(FidcCash, fidc_id)
+        def settle(fidc):
+            # Lock do job: fail_stale_jobs não encerra o job no meio da liquidação (e vice-versa)
+            job = db.session.get(ProcessingJob, job_id, with_for_update=True)
             if not job or not fidc:
                 logger.error("Job ou FIDC não encontrado", extra={"job_id": job_id, "fidc_id": fidc_id})
+                return None
+            if job.status in ("COMPLETED", "FAILED"):
+                # Encerrado enquanto esperava a fila do FIDC (ex.: job abandonado, fail_stale_jobs)
+                logger.info("Job já finalizado", extra={"job_id": job_id, "status": job.status})
+                return None
+
+            operations = list(iter_pending_operations(job_id))
+            if any(operation.execution_price is None for operation in operations):
+                raise Exception("Operações do job ainda sem preço")
+            prices = [operation.execution_price for operation in operations]
+
+            # Liquidação vetorizada do lote inteiro (taxas e caixa corrente), sobre o caixa travado
+            result = settle_batch(
+                [operation.quantity for operation in operations],
+                prices,
+                [operation.operation_type for operation in operations],
+                fidc.available_cash
+            )
+            if result.overdraw_index is not None:
+                overdrawn = operations[result.overdraw_index]
+                raise InsufficientCash(
+                    f"Caixa insuficiente para compra: operação {overdrawn.id} (sequence {overdrawn.sequence}) "
+                    f"de {float(result.total[result.overdraw_index]):.2f}",
+                    result.overdraw_index
+                )
+
+            # Atomicidade: caixa, operações e job no mesmo commit
+            now = datetime.utcnow()
+            settled_rows = [
+                {
+                    "id": operation.id,
+                    "status": "PROCESSED",
+                    "execution_price": prices[i],
+                    "total_value": float(result.total[i]),
+                    "tax_paid": float(result.tax[i]),
+                    "fidc_id": fidc_id
+                }
+                for i, operation in enumerate(operations)
+            ]
+            updated = bulk_settle_operations(job_id, settled_rows, created_range=created_at_range(operations))
+            if updated != len(settled_rows):
+                raise Exception("Operações do job não encontradas para liquidação")
+
+            # Posições por ativo na mesma transação do caixa
+            apply_settled_operations(fidc_id, operations, [row["total_value"] for row in settled_rows], now)
+            update_fidc_cash(fidc, result.final_cash, now)
+            failed = get_operation_counts(job_id)["failed"]
+            # Job sem nenhuma operação liquidável (todas com falha definitiva) termina FAILED
+            job.status = "FAILED" if failed and not operations else "COMPLETED"
+            job.completed_at = now
+            return result, operations, failed, job.status
+
+        try:
+            # Fila por FIDC: jobs do mesmo fundo liquidam um de cada vez, fundos diferentes em paralelo
+            settled = run_in_fidc_lane(fidc_id, settle)
+            if settled is None:
+                # FIDC inexistente: nenhuma tentativa vai liquidar o job
+                _fail_job(job_id, "FIDC não encontrado")
                 return
+            result, operations, failed, status = settled
+            # Log por operação amostrado (LOG_OPERATION_SAMPLE_RATE); o resumo fecha o job
+            operation_logs = OperationLogSampler(logger, job_id)
+            for operation in operations:
+                operation_logs.info("Operação processada", operation_id=operation.id, status="PROCESSED")
+            finish_job_progress(job_id, status, processed=result.settled, failed=failed)
+            OPERATIONS_TOTAL.labels(status="PROCESSED").inc(result.settled)
+            JOBS_TOTAL.labels(status=status).inc()
 
-            with db.session.begin(): # Atomicidade
-                processed = 0
-
-                for op_data in operations:
-                    asset_price = get_asset_price(op_data["asset_code"])
-                    if asset_price <= 0:
-                        raise Exception("Preço do ativo inválido")
-
-                    gross_value = op_data["quantity"] * asset_price
-
-                    if op_data["operation_type"] == "BUY":
-                        tax = gross_value * 0.005
-                        total_cost = gross_value + tax
-                        if fidc.available_cash < total_cost:
-                            raise Exception("Caixa insuficiente para compra")
-                        fidc.available_cash -= total_cost
-                        op_status = "PROCESSED"
-                        total_value = total_cost
-                    elif op_data["operation_type"] == "SELL":
-                        tax = gross_value * 0.003
-                        net_proceeds = gross_value - tax
-                        fidc.available_cash += net_proceeds
-                        op_status = "PROCESSED"
-                        total_value = net_proceeds
-                    else:
-                        raise Exception("Tipo de operação inválido")
-
-                    operation = Operation(
-                        id=op_data["id"],
-                        asset_code=op_data["asset_code"],
-                        operation_type=op_data["operation_type"],
-                        quantity=op_data["quantity"],
-                        status=op_status,
-                        execution_price=asset_price,
-                        total_value=total_value,
-                        tax_paid=tax,
-                        job_id=job_id,
-                        fidc_id=fidc_id,
-                        created_at=datetime.utcnow()
-                    )
-                    db.session.add(operation)
-                    processed += 1
-                    logger.info("Operação processada", extra={"job_id": job_id, "operation_id": op_data["id"], "status": op_status})
-
-                job.status = "COMPLETED"
-                job.completed_at = datetime.utcnow()
-                db.session.add(job)
-
-            logger.info("Job finalizado com sucesso", extra={"job_id": job_id, "processed": processed})
+            logger.info("Job finalizado", extra={
+                "job_id": job_id,
+                "status": status,
+                "processed": result.settled,
+                "failed": failed,
+                "chunks": len(prepared_chunks),
+                "operation_logs": operation_logs.summary(),
+                "price_cache": price_cache.stats(),
+                "rate_limit": rate_limiter.stats()
+            })
 
+        except FidcLaneBusy as exc:
+            db.session.rollback()
+            logger.info("Fila do FIDC ocupada, liquidação reenfileirada", extra={
+                "job_id": job_id,
+                "fidc_id": fidc_id,
+                "lane_waits": lane_waits + 1
+            })
+            raise self.retry(
+                exc=exc,
+                countdown=backoff_delay(1, FIDC_LANE_RETRY_DELAY, FIDC_LANE_RETRY_DELAY),
+                # Sempre permitido: o limite de tentativas vale só para erros da liquidação
+                max_retries=self.request.retries + 1,
+                kwargs={"lane_waits": lane_waits + 1}
+            )
+        except InsufficientCash as exc:
+            # Falha determinística: sem novas tentativas segurando a fila do FIDC
+            db.session.rollback()
+            logger.error("Caixa insuficiente, job encerrado sem novas tentativas", extra={
+                "job_id": job_id,
+                "fidc_id": fidc_id,
+                "overdraw_index": exc.overdraw_index,
+                "error": str(exc)
+            })
+            _fail_job(job_id, str(exc), fidc_id=fidc_id)
         except Exception as exc:
+            db.session.rollback()
+            # Reenfileiramentos por fila ocupada não contam como tentativa
+            attempts = self.request.retries - lane_waits
+            if attempts < self.max_retries:
+                # O job segue PROCESSING (sem evento terminal): as operações ficam PENDING com o
+                # preço gravado, e a nova tentativa retoma a liquidação do checkpoint
+                logger.warning("Erro no job, nova tentativa", extra={
+                    "job_id": job_id,
+                    "attempt": attempts + 1,
+                    "error": str(exc)
+                })
+                raise self.retry(exc=exc, max_retries=self.max_retries + lane_waits, kwargs={"lane_waits": lane_waits})
+            # Última tentativa: as operações restantes do job não serão mais liquidadas
             logger.error("Erro no job", extra={"job_id": job_id, "error": str(exc)})
-            # Atualiza o status do job para FAILED fora da transação
-            job = db.session.get(ProcessingJob, job_id)
-            if job:
-                job.status = "FAILED"
-                job.completed_at = datetime.utcnow()
-                db.session.add(job)
-                db.session.commit()
-            self.retry(exc=exc)
\ No newline at end of file
+            _fail_job(job_id, f"Liquidação falhou: {exc}", fidc_id=fidc_id)
+            raise
+
+@celery.task
+def mark_job_failed(request, exc, traceback, job_id):
+    """
+    Errback dos chunks: um chunk esgotou as tentativas, então o job inteiro falha.
+    Com vários chunks falhando, só o primeiro encerra o job.
+    """
+    logger.error("Erro no job", extra={"job_id": job_id, "error": str(exc)})
+    with get_worker_app().app_context():
+        _fail_job(job_id, f"Preparação do job falhou: {exc}")
+
+def _fail_job(job_id, reason, fidc_id=None):
+    """Encerra o job como FAILED (_mark_failed) e contabiliza nas métricas, se ele ainda não estava encerrado."""
+    failed = _mark_failed(job_id, reason, fidc_id)
+    if failed is None:
+        return
+    OPERATIONS_TOTAL.labels(status="FAILED").inc(failed)
+    JOBS_TOTAL.labels(status="FAILED").inc()
+
+def _mark_failed(job_id, reason, fidc_id=None):
+    """
+    Encerra o job como FAILED: as operações ainda PENDING viram FAILED com o motivo, no mesmo commit
+    do status do job. Retorna quantas operações falharam agora, ou None se o job não existe ou já
+    estava encerrado (COMPLETED/FAILED): motivo, completed_at e progresso ficam como estavam.
+    """
+    from app.db import db
+    from app.db.models import ProcessingJob
+    from datetime import datetime
+
+    job = db.session.get(ProcessingJob, job_id, with_for_update=True)
+    if not job or job.status in ("COMPLETED", "FAILED"):
+        db.session.rollback()
+        logger.info("Job já encerrado, nada a marcar como FAILED", extra={
+            "job_id": job_id,
+            "status": job.status if job else None
+        })
+        return None
+    failed = fail_pending_job_operations(job_id, reason, fidc_id)
+    job.status = "FAILED"
+    job.completed_at = datetime.utcnow()
+    db.session.commit()
+    counts = get_operation_counts(job_id)
+    finish_job_progress(job_id, "FAILED", processed=counts["processed"], failed=counts["failed"])
+    return failed
+
+@celery.task
+def fail_stale_jobs():
+    """
+    Encerra como FAILED os jobs em andamento há mais de JOB_STALE_SECONDS: upload interrompido sem
+    exceção (API derrubada) ou chord perdido. Senão as operações ficam PENDING para sempre.
+    """
+    with get_worker_app().app_context():
+        job_ids = get_stale_job_ids()
+        for job_id in job_ids:
+            _fail_job(job_id, f"Job abandonado: sem conclusão em {JOB_STALE_SECONDS} s")
+    if job_ids:
+        logger.warning("Jobs abandonados encerrados", extra={"jobs": job_ids[:20], "total": len(job_ids)})
+    return job_ids
+
+@celery.task
+def ensure_operations_partitions():
+    """Garante as partições mensais de operations à frente do mês corrente (no-op sem particionamento)."""
+    with get_worker_app().app_context():
+        return ensure_partitions()
+
+@celery.task
+def archive_operations_partitions():
+    """Arquiva no S3 e desanexa as partições de operations fora da janela quente."""
+    with get_worker_app().app_context():
+        archived = archive_partitions()
+    logger.info("Arquivamento de partições concluído", extra={"partitions": [item["partition"] for item in archived]})
+    return archived
@@ -0,0 +1,72 @@
+"""Schema inicial (equivalente ao antigo db.create_all)
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+Bancos já criados via db.create_all devem ser marcados com
+"flask db stamp 0001_initial_schema" antes do primeiro "flask db upgrade".
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'fidc_cash',
+        sa.Column('fidc_id', sa.String(), nullable=False),
+        sa.Column('available_cash', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('fidc_id')
+    )
+    op.create_table(
+        'processing_jobs',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_table(
+        'operations',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('asset_code', sa.String(), nullable=False),
+        sa.Column('operation_type', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('execution_price', sa.Float(), nullable=True),
+        sa.Column('total_value', sa.Float(), nullable=True),
+        sa.Column('tax_paid', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('job_id', sa.String(), nullable=True),
+        sa.Column('fidc_id', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['fidc_id'], ['fidc_cash.fidc_id']),
+        sa.ForeignKeyConstraint(['job_id'], ['processing_jobs.job_id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'export_manifests',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('fidc_id', sa.String(), nullable=False),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('watermark_created_at', sa.DateTime(), nullable=True),
+        sa.Column('watermark_id', sa.String(), nullable=True),
+        sa.Column('object_keys', sa.JSON(), nullable=False),
+        sa.Column('total_operations', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('export_manifests')
+    op.drop_table('operations')
+    op.drop_table('processing_jobs')
+    op.drop_table('fidc_cash')
@@ -0,0 +1,38 @@
+"""Índices compostos para status de job, exportação e consultas por ativo
+
+Revision ID: 0002_operations_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 09:30:00
+
+No Postgres os índices são criados com CREATE INDEX CONCURRENTLY,
+sem bloquear escritas na tabela operations.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_operations_indexes'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_operations_job_id_status', 'operations', ['job_id', 'status']),
+    ('ix_operations_fidc_id_created_at', 'operations', ['fidc_id', 'created_at']),
+    ('ix_operations_status_created_at', 'operations', ['status', 'created_at']),
+    ('ix_operations_asset_code', 'operations', ['asset_code']),
+    ('ix_export_manifests_fidc_id_format_created_at', 'export_manifests', ['fidc_id', 'format', 'created_at']),
+]
+
+
+def upgrade():
+    # CONCURRENTLY não pode rodar dentro de transação
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
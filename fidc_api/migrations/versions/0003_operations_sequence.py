@@ -0,0 +1,33 @@
+"""Coluna sequence em operations (ordem de envio) para o worker ler o job do banco
+
+Revision ID: 0003_operations_sequence
+Revises: 0002_operations_indexes
+Create Date: 2026-10-18 12:00:00
+
+O job passa a ser despachado apenas com job_id/fidc_id; o worker lê as operações
+PENDING por faixas de (job_id, sequence).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_operations_sequence'
+down_revision = '0002_operations_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Coluna nula: ADD COLUMN sem reescrever a tabela
+    op.add_column('operations', sa.Column('sequence', sa.Integer(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_operations_job_id_sequence', 'operations', ['job_id', 'sequence'], postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_operations_job_id_sequence', table_name='operations', postgresql_concurrently=True)
+    op.drop_column('operations', 'sequence')
@@ -0,0 +1,27 @@
+"""Coluna failure_reason em operations (falha definitiva por operação)
+
+Revision ID: 0004_operations_failure_reason
+Revises: 0003_operations_sequence
+Create Date: 2026-10-18 14:00:00
+
+O worker passa a registrar falhas por operação (preço indisponível após as tentativas,
+tipo inválido) em vez de falhar o job inteiro.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_operations_failure_reason'
+down_revision = '0003_operations_sequence'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Coluna nula: ADD COLUMN sem reescrever a tabela
+    op.add_column('operations', sa.Column('failure_reason', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('operations', 'failure_reason')
@@ -0,0 +1,36 @@
+"""Tabela positions: posição materializada por FIDC e ativo
+
+Revision ID: 0005_positions
+Revises: 0004_operations_failure_reason
+Create Date: 2026-10-18 16:00:00
+
+Atualizada pelo worker no mesmo commit do caixa; "flask positions rebuild" recalcula
+a partir do histórico de operações PROCESSED.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_positions'
+down_revision = '0004_operations_failure_reason'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'positions',
+        sa.Column('fidc_id', sa.String(), nullable=False),
+        sa.Column('asset_code', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('average_cost', sa.Float(), nullable=False),
+        sa.Column('realized_pnl', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['fidc_id'], ['fidc_cash.fidc_id']),
+        sa.PrimaryKeyConstraint('fidc_id', 'asset_code')
+    )
+
+
+def downgrade():
+    op.drop_table('positions')
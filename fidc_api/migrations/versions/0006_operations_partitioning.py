@@ -0,0 +1,110 @@
+"""Particionamento mensal de operations por created_at (Postgres)
+
+Revision ID: 0006_operations_partitioning
+Revises: 0005_positions
+Create Date: 2026-10-18 18:00:00
+
+No Postgres a tabela atual vira a partição operations_legacy (todo o histórico, inclusive o
+mês corrente) de uma nova operations PARTITION BY RANGE (created_at), e são criadas as
+partições mensais dos próximos meses. As seguintes são criadas pelo beat
+(flask partitions ensure). O ATTACH valida a partição legada com uma varredura completa
+sob lock: rodar em janela de manutenção.
+
+Chave primária particionada precisa incluir a coluna de partição: passa a ser (id, created_at).
+Em outros bancos (SQLite nos testes) só created_at passa a ser NOT NULL.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_operations_partitioning'
+down_revision = '0005_positions'
+branch_labels = None
+depends_on = None
+
+# Partições mensais criadas na migração depois do mês corrente (coberto pela legada)
+PARTITIONS_AHEAD = 2
+
+INDEXES = [
+    ('ix_operations_job_id_status', ['job_id', 'status']),
+    ('ix_operations_job_id_sequence', ['job_id', 'sequence']),
+    ('ix_operations_fidc_id_created_at', ['fidc_id', 'created_at']),
+    ('ix_operations_status_created_at', ['status', 'created_at']),
+    ('ix_operations_asset_code', ['asset_code']),
+]
+
+FOREIGN_KEYS = [
+    ('operations_job_id_fkey', 'job_id', 'processing_jobs', 'job_id'),
+    ('operations_fidc_id_fkey', 'fidc_id', 'fidc_cash', 'fidc_id'),
+]
+
+
+def _add_months(month, months):
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return datetime(month.year + year, month_index + 1, 1)
+
+
+def _create_keys_and_indexes(table):
+    for name, column, referred_table, referred_column in FOREIGN_KEYS:
+        op.create_foreign_key(name, table, referred_table, [column], [referred_column])
+    for name, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def upgrade():
+    # Histórico sem created_at fica na faixa mais antiga da partição legada
+    op.execute("UPDATE operations SET created_at = '1970-01-01' WHERE created_at IS NULL")
+
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('operations') as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        return
+
+    # Tabela atual vira partição: nomes de índices e constraints liberados para a tabela particionada
+    op.rename_table('operations', 'operations_legacy')
+    op.execute("ALTER TABLE operations_legacy RENAME CONSTRAINT operations_pkey TO operations_legacy_pkey")
+    for name, column, _, _ in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE operations_legacy RENAME CONSTRAINT {name} TO operations_legacy_{column}_fkey")
+    for name, _ in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_operations_', 'ix_operations_legacy_')}")
+    op.alter_column('operations_legacy', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.execute(
+        "CREATE TABLE operations (LIKE operations_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+    op.create_primary_key('operations_pkey', 'operations', ['id', 'created_at'])
+    _create_keys_and_indexes('operations')
+
+    # No ATTACH, os índices equivalentes da legada são reaproveitados; a PK (id, created_at) é construída.
+    # A legada vai até o fim do mês corrente, que já tem operações gravadas
+    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    op.execute(
+        "ALTER TABLE operations ATTACH PARTITION operations_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{_add_months(current_month, 1):%Y-%m-%d}')"
+    )
+    for offset in range(1, PARTITIONS_AHEAD + 1):
+        month = _add_months(current_month, offset)
+        op.execute(
+            f"CREATE TABLE operations_{month:%Y_%m} PARTITION OF operations "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('operations') as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
+        return
+
+    # Volta para tabela comum com as partições ainda anexadas; partições arquivadas
+    # (desanexadas) não retornam
+    op.execute("CREATE TABLE operations_unpartitioned (LIKE operations INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO operations_unpartitioned SELECT * FROM operations")
+    op.drop_table('operations')
+    op.rename_table('operations_unpartitioned', 'operations')
+    op.alter_column('operations', 'created_at', existing_type=sa.DateTime(), nullable=True)
+    op.create_primary_key('operations_pkey', 'operations', ['id'])
+    _create_keys_and_indexes('operations')
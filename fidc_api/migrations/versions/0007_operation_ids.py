@@ -0,0 +1,33 @@
+"""Tabela operation_ids: unicidade do id de operação entre partições
+
+Revision ID: 0007_operation_ids
+Revises: 0006_operations_partitioning
+Create Date: 2026-10-18 20:00:00
+
+Com operations particionada a PK (id, created_at) não impede o mesmo id em partições diferentes.
+Os ids passam a ser registrados nesta tabela, no mesmo chunk da gravação das operações; a PK
+garante a unicidade, inclusive contra ids de partições já arquivadas. O backfill copia os ids
+das partições anexadas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_operation_ids'
+down_revision = '0006_operations_partitioning'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'operation_ids',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO operation_ids (id) SELECT DISTINCT id FROM operations")
+
+
+def downgrade():
+    op.drop_table('operation_ids')
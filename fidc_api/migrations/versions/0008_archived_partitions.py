@@ -0,0 +1,34 @@
+"""Tabela archived_partitions: registro das partições de operations arquivadas
+
+Revision ID: 0008_archived_partitions
+Revises: 0007_operation_ids
+Create Date: 2026-10-18 22:00:00
+
+Gravada por flask partitions archive antes do DETACH. Com algum registro, o histórico em operations
+está incompleto e flask positions rebuild é recusado.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_archived_partitions'
+down_revision = '0007_operation_ids'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archived_partitions',
+        sa.Column('partition', sa.String(), nullable=False),
+        sa.Column('bucket', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('operations', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('partition')
+    )
+
+
+def downgrade():
+    op.drop_table('archived_partitions')
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# Equivalente a "set PYTHONPATH=fidc_api": o pacote da aplicação é importado como "app"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fidc_api"))
+
+from flask import Flask
+from app.db import db
+
+@pytest.fixture
+def blueprints():
+    """Blueprints registrados no app de teste: [(blueprint, url_prefix)]. Sobrescrever no módulo de teste."""
+    return []
+
+@pytest.fixture
+def app(blueprints):
+    """App Flask mínimo com SQLite em memória e o schema criado, dentro do app context."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    for blueprint, url_prefix in blueprints:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def app_ctx(app):
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,56 @@
+import threading
+import time
+from app.services.asset_service import get_asset_prices
+
+def test_distinct_assets_are_fetched_concurrently():
+    calls = []
+
+    def fetch(asset_code):
+        calls.append(asset_code)
+        time.sleep(0.2)
+        return 10.0
+
+    start = time.perf_counter()
+    prices, errors = get_asset_prices([f"ASSET{i % 10}" for i in range(50)], fetch=fetch, max_workers=10)
+    elapsed = time.perf_counter() - start
+
+    assert prices == {f"ASSET{i}": 10.0 for i in range(10)}
+    assert errors == {}
+    assert sorted(calls) == sorted(prices)
+    # Limitado pela consulta mais lenta, não pela soma (10 x 0,2 s)
+    assert elapsed < 1.0
+
+def test_failed_and_slow_assets_are_reported_without_blocking_the_rest():
+    def fetch(asset_code):
+        if asset_code == "FAIL3":
+            raise Exception("Falha ao consultar preço do ativo")
+        if asset_code == "SLOW3":
+            time.sleep(1)
+        return 10.0
+
+    prices, errors = get_asset_prices(["PETR4", "FAIL3", "SLOW3"], fetch=fetch, timeout=0.2)
+
+    assert prices == {"PETR4": 10.0}
+    assert str(errors["FAIL3"]) == "Falha ao consultar preço do ativo"
+    assert isinstance(errors["SLOW3"], TimeoutError)
+
+def test_slow_call_is_hedged_and_first_answer_wins():
+    release = threading.Event()
+    attempts = []
+
+    def fetch(asset_code):
+        attempts.append(asset_code)
+        if len(attempts) == 1:
+            release.wait(2)
+            return 1.0
+        return 10.0
+
+    start = time.perf_counter()
+    prices, errors = get_asset_prices(["PETR4"], fetch=fetch, max_workers=2, hedge_after=0.1)
+    elapsed = time.perf_counter() - start
+    release.set()
+
+    assert prices == {"PETR4": 10.0}
+    assert errors == {}
+    assert attempts == ["PETR4", "PETR4"]
+    assert elapsed < 1.0
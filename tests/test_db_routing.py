@@ -0,0 +1,72 @@
+import fakeredis
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from app.db import db, routing
+from app.db.models import ProcessingJob
+from app.services import progress_service
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    # Primário e réplica em dois arquivos SQLite; a "replicação" é feita à mão nos testes
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(routing, "DATABASE_REPLICA_URLS", [f"sqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(routing, "_replica_lag", {})
+    monkeypatch.setattr(progress_service, "get_redis_client", lambda: fakeredis.FakeRedis())
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica_0"])
+        yield app
+        db.session.remove()
+    # init_app registra um MetaData por bind no objeto db compartilhado entre os testes
+    db.metadatas.pop("replica_0", None)
+
+def create_job(status, replica_status=None):
+    job = ProcessingJob(status=status)
+    db.session.add(job)
+    db.session.commit()
+    if replica_status:
+        with db.engines["replica_0"].begin() as connection:
+            connection.execute(insert(ProcessingJob.__table__).values(job_id=job.job_id, status=replica_status))
+    job_id = job.job_id
+    db.session.expunge_all()
+    return job_id
+
+def test_status_is_read_from_replica(app):
+    job_id = create_job("PROCESSING", replica_status="COMPLETED")
+
+    response = app.test_client().get(f"/jobs/{job_id}/status")
+
+    assert response.json["status"] == "COMPLETED"
+
+def test_stale_replica_falls_back_to_primary(app, monkeypatch):
+    monkeypatch.setattr(routing, "replica_lag", lambda engine: routing.REPLICA_MAX_LAG_SECONDS + 1)
+    job_id = create_job("PROCESSING", replica_status="COMPLETED")
+
+    response = app.test_client().get(f"/jobs/{job_id}/status")
+
+    assert response.json["status"] == "PROCESSING"
+
+def test_job_not_yet_replicated_is_read_from_primary(app):
+    job_id = create_job("PROCESSING")
+
+    response = app.test_client().get(f"/jobs/{job_id}/status")
+
+    assert response.status_code == 200
+    assert response.json["status"] == "PROCESSING"
+
+def test_writes_and_reads_after_write_stay_on_primary(app):
+    job_id = create_job("PROCESSING", replica_status="COMPLETED")
+    db.session.info.pop(routing.WROTE, None)
+    db.session.info[routing.READ_REPLICA] = True
+
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    db.session.add(ProcessingJob(status="RECEIVING"))
+    db.session.commit()
+    db.session.expunge_all()
+
+    # Após a escrita, a sessão volta a ler do primário
+    assert db.session.get(ProcessingJob, job_id).status == "PROCESSING"
+    assert db.session.query(ProcessingJob).count() == 2
@@ -0,0 +1,252 @@
+import csv
+import gzip
+import io
+import tracemalloc
+from datetime import datetime, date
+
+import boto3
+import pyarrow.parquet as pq
+import pytest
+from flask import Flask
+from moto import mock_aws
+from app.db import db
+from app.db.models import FidcCash, Operation, ProcessingJob
+from app.services import export_service
+from app.services.export_service import export_operations, S3_MIN_PART_SIZE
+from app.services.operation_service import bulk_insert_pending_operations, fail_operations, fail_pending_job_operations
+
+BUCKET = "fidc-exports"
+
+@pytest.fixture
+def app_ctx(monkeypatch, tmp_path):
+    monkeypatch.setenv("MINIO_BUCKET", BUCKET)
+    monkeypatch.setenv("MINIO_ENDPOINT", "")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'export.db'}"
+    db.init_app(app)
+    with mock_aws(), app.app_context():
+        monkeypatch.setattr(export_service, "get_s3_client", lambda: boto3.client("s3", region_name="us-east-1"))
+        db.create_all()
+        db.session.add(FidcCash(fidc_id="FIDC001", available_cash=0.0))
+        db.session.commit()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+def seed_operations(total, start=0, created_at=datetime(2024, 9, 15, 12, 0, 0)):
+    db.session.execute(db.insert(Operation), [
+        {
+            "id": f"op_{i:07d}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 100,
+            "status": "PROCESSED", "execution_price": 35.27, "total_value": 3544.64, "tax_paid": 17.64,
+            "created_at": created_at, "fidc_id": "FIDC001"
+        }
+        for i in range(start, start + total)
+    ])
+    db.session.commit()
+
+def read_object(key):
+    return boto3.client("s3", region_name="us-east-1").get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+def test_small_export_is_single_object(app_ctx):
+    seed_operations(10)
+
+    result = export_operations("FIDC001", date(2024, 9, 1), date(2024, 9, 30))
+
+    rows = list(csv.reader(io.StringIO(read_object(result["file"]).decode())))
+    assert result["total_operations"] == 10
+    assert result["parts"] == 1
+    assert rows[0] == export_service.EXPORT_COLUMNS
+    assert len(rows) == 11
+
+def test_gzip_export(app_ctx):
+    seed_operations(10)
+
+    result = export_operations("FIDC001", date(2024, 9, 1), date(2024, 9, 30), export_format="csv.gz")
+
+    assert result["file"].endswith(".csv.gz")
+    rows = list(csv.reader(io.StringIO(gzip.decompress(read_object(result["file"])).decode())))
+    assert len(rows) == 11
+
+def test_parquet_export(app_ctx):
+    seed_operations(10)
+
+    result = export_operations("FIDC001", date(2024, 9, 1), date(2024, 9, 30), export_format="parquet")
+
+    assert result["file"].endswith(".parquet")
+    table = pq.read_table(io.BytesIO(read_object(result["file"])))
+    assert table.num_rows == 10
+    assert table.column_names == export_service.EXPORT_COLUMNS
+    assert table.column("quantity").to_pylist() == [100] * 10
+
+def test_partitioned_export_writes_one_object_per_day(app_ctx):
+    seed_operations(3, created_at=datetime(2024, 9, 14, 10, 0, 0))
+    seed_operations(2, start=3, created_at=datetime(2024, 9, 15, 10, 0, 0))
+
+    result = export_operations(
+        "FIDC001", date(2024, 9, 1), date(2024, 9, 30), export_format="parquet", partition_by_date=True
+    )
+
+    assert [key.rsplit("/", 1)[0] for key in result["files"]] == [
+        "fidc_id=FIDC001/date=2024-09-14",
+        "fidc_id=FIDC001/date=2024-09-15",
+    ]
+    assert pq.read_table(io.BytesIO(read_object(result["files"][1]))).num_rows == 2
+
+def test_failed_operations_appear_in_the_fidc_export(app_ctx):
+    job = ProcessingJob(status="PROCESSING")
+    db.session.add(job)
+    db.session.commit()
+    bulk_insert_pending_operations(job.job_id, [
+        {"id": f"op_f{i}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1} for i in range(3)
+    ], fidc_id="FIDC001")
+    db.session.commit()
+    # Falha definitiva no chunk (preço indisponível) e job encerrado com o restante PENDING
+    fail_operations(job.job_id, [("op_f0", "Preço indisponível: timeout")])
+    fail_pending_job_operations(job.job_id, "Liquidação falhou: erro")
+    db.session.commit()
+
+    result = export_operations("FIDC001")
+
+    rows = list(csv.DictReader(io.StringIO(read_object(result["file"]).decode())))
+    assert sorted((row["id"], row["status"]) for row in rows) == [
+        ("op_f0", "FAILED"), ("op_f1", "FAILED"), ("op_f2", "FAILED")
+    ]
+
+def test_failing_a_job_fills_missing_fidc_id(app_ctx):
+    # Operação gravada sem fidc_id (antes de ele ser gravado na ingestão)
+    add_pending_operation("op_legacy", "PROCESSING", datetime(2024, 9, 14, 9, 0, 0), fidc_id=None)
+    job_id = db.session.get(Operation, "op_legacy").job_id
+
+    fail_pending_job_operations(job_id, "Liquidação falhou: erro", fidc_id="FIDC001")
+    db.session.commit()
+
+    operation = db.session.get(Operation, "op_legacy")
+    assert (operation.status, operation.fidc_id) == ("FAILED", "FIDC001")
+
+def test_incremental_export_ships_only_the_delta(app_ctx):
+    seed_operations(5, created_at=datetime(2024, 9, 14, 10, 0, 0))
+
+    first = export_operations("FIDC001", export_format="csv", mode="incremental")
+    unchanged = export_operations("FIDC001", export_format="csv", mode="incremental")
+    seed_operations(3, start=5, created_at=datetime(2024, 9, 15, 10, 0, 0))
+    delta = export_operations("FIDC001", export_format="csv", mode="incremental")
+
+    assert first["total_operations"] == 5
+    assert unchanged["unchanged"] is True
+    assert unchanged["files"] == first["files"]
+    assert delta["total_operations"] == 3
+    rows = list(csv.reader(io.StringIO(read_object(delta["file"]).decode())))
+    assert [row[0] for row in rows[1:]] == ["op_0000005", "op_0000006", "op_0000007"]
+
+    manifest = export_service.get_latest_manifest("FIDC001", "csv")
+    assert manifest.watermark_id == "op_0000007"
+    assert manifest.object_keys == delta["files"]
+
+def add_pending_operation(op_id, job_status, created_at, fidc_id="FIDC001", job_created_at=None):
+    job = ProcessingJob(status=job_status, created_at=job_created_at or datetime.utcnow())
+    db.session.add(job)
+    db.session.flush()
+    # fidc_id gravado na ingestão
+    db.session.add(Operation(
+        id=op_id, asset_code="VALE3", operation_type="BUY", quantity=1,
+        status="PENDING", created_at=created_at, job_id=job.job_id, fidc_id=fidc_id
+    ))
+    db.session.commit()
+
+def test_incremental_export_waits_for_pending_operations(app_ctx):
+    seed_operations(2, created_at=datetime(2024, 9, 14, 10, 0, 0))
+    # Operação mais antiga de um job ainda em processamento
+    add_pending_operation("op_pending", "PROCESSING", datetime(2024, 9, 14, 9, 0, 0))
+
+    result = export_operations("FIDC001", export_format="csv", mode="incremental")
+
+    assert result["unchanged"] is True
+    assert result["files"] == []
+
+def test_incremental_export_ignores_pending_rows_of_finished_jobs(app_ctx):
+    # Job encerrado com operação ainda PENDING: não segura o delta (e a linha é exportada como está)
+    add_pending_operation("op_stuck", "FAILED", datetime(2024, 9, 14, 9, 0, 0))
+    seed_operations(2, created_at=datetime(2024, 9, 14, 10, 0, 0))
+
+    result = export_operations("FIDC001", export_format="csv", mode="incremental")
+
+    assert result["total_operations"] == 3
+
+def test_incremental_export_ignores_other_funds_and_abandoned_jobs(app_ctx):
+    db.session.add(FidcCash(fidc_id="FIDC002", available_cash=0.0))
+    # Job em andamento de outro FIDC e job do FIDC abandonado (API derrubada no meio do upload)
+    add_pending_operation("op_other_fund", "PROCESSING", datetime(2024, 9, 14, 9, 0, 0), fidc_id="FIDC002")
+    add_pending_operation(
+        "op_abandoned", "RECEIVING", datetime(2024, 9, 14, 9, 0, 0), job_created_at=datetime(2024, 9, 14, 9, 0, 0)
+    )
+    seed_operations(2, created_at=datetime(2024, 9, 14, 10, 0, 0))
+
+    result = export_operations("FIDC001", export_format="csv", mode="incremental")
+
+    assert result["total_operations"] == 3
+
+def test_incremental_export_keeps_a_safety_margin_behind_now(app_ctx):
+    # Linha com created_at recente pode ter sido confirmada depois de outras mais novas
+    seed_operations(1, created_at=datetime.utcnow())
+
+    result = export_operations("FIDC001", export_format="csv", mode="incremental")
+
+    assert result["unchanged"] is True
+
+class CountingS3:
+    """Client S3 que descarta os bytes: mede só a memória do pipeline de exportação."""
+
+    def __init__(self):
+        self.uploaded = 0
+
+    def head_bucket(self, **kwargs):
+        pass
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "upload"}
+
+    def upload_part(self, Body, **kwargs):
+        self.uploaded += len(Body)
+        return {"ETag": "etag"}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def put_object(self, Body, **kwargs):
+        self.uploaded += len(Body)
+
+def measure_export_peak(monkeypatch, part_size):
+    s3 = CountingS3()
+    monkeypatch.setattr(export_service, "get_s3_client", lambda: s3)
+    tracemalloc.start()
+    result = export_operations("FIDC001", date(2024, 9, 1), date(2024, 9, 30), part_size=part_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert s3.uploaded == result["bytes"]
+    return result, peak
+
+def test_large_export_is_uploaded_in_parts(app_ctx):
+    # ~76 bytes por linha: 80k linhas geram um CSV maior que uma parte mínima do S3
+    seed_operations(80_000)
+
+    result = export_operations("FIDC001", date(2024, 9, 1), date(2024, 9, 30), part_size=S3_MIN_PART_SIZE)
+
+    assert result["total_operations"] == 80_000
+    assert result["parts"] == 2
+    assert len(read_object(result["file"])) == result["bytes"]
+
+def test_export_memory_is_flat_regardless_of_size(app_ctx, monkeypatch):
+    part_size = 128 * 1024
+    seed_operations(10_000)
+    small, small_peak = measure_export_peak(monkeypatch, part_size)
+
+    seed_operations(30_000, start=10_000)
+    large, large_peak = measure_export_peak(monkeypatch, part_size)
+
+    assert large["total_operations"] == 40_000
+    assert large["bytes"] > 3 * small["bytes"]
+    # Pico de memória limitado pelo tamanho da parte e do lote do cursor, não pelo tamanho do export
+    assert large_peak < 1.5 * small_peak
+    assert large_peak < large["bytes"]
@@ -1,5 +1,5 @@
 import pytest
-from fidc_api.app import create_app
+from app import create_app
 
 @pytest.fixture
 def client():
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+import fakeredis
+import pytest
+from app.db import db
+from app.db.models import ProcessingJob
+from app.routes.jobs import jobs_bp
+from app.services import progress_service
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(progress_service, "get_redis_client", lambda: client)
+    return client
+
+@pytest.fixture
+def blueprints():
+    return [(jobs_bp, "/jobs")]
+
+@pytest.fixture
+def client(redis_client, app):
+    return app.test_client()
+
+def test_progress_eta_from_observed_throughput(redis_client):
+    progress_service.start_job_progress("job-1", 100)
+    redis_client.hset("job_progress:job-1", mapping={"started_at": 1000.0, "updated_at": 1010.0, "prepared": 20})
+
+    progress = progress_service.get_job_progress("job-1")
+
+    assert progress["status"] == "PROCESSING"
+    assert progress["ops_per_sec"] == 2.0
+    # 80 operações restantes a 2 ops/s a partir da última atualização
+    assert progress["estimated_completion"] == "1970-01-01T00:17:30"
+
+def test_prepared_chunk_counts_failures_before_settlement(redis_client):
+    progress_service.start_job_progress("job-2", 10)
+
+    progress_service.add_prepared_operations("job-2", 5, failed=2)
+    progress_service.add_prepared_operations("job-2", 5)
+
+    progress = progress_service.get_job_progress("job-2")
+    assert progress["prepared"] == 10
+    assert progress["failed"] == 2
+    # processed só avança na liquidação
+    assert progress["processed"] == 0
+
+def test_status_is_served_from_redis_without_database(client):
+    progress_service.start_job_progress("job-redis", 10)
+
+    response = client.get("/jobs/job-redis/status")
+
+    assert response.status_code == 200
+    assert response.json["status"] == "PROCESSING"
+    assert response.json["total_operations"] == 10
+
+def test_status_falls_back_to_database(client):
+    job = ProcessingJob(status="COMPLETED")
+    db.session.add(job)
+    db.session.commit()
+
+    response = client.get(f"/jobs/{job.job_id}/status")
+
+    assert response.status_code == 200
+    assert response.json["status"] == "COMPLETED"
+
+def test_status_etag_returns_304_when_unchanged(client):
+    progress_service.start_job_progress("job-etag", 10)
+    first = client.get("/jobs/job-etag/status")
+
+    cached = client.get("/jobs/job-etag/status", headers={"If-None-Match": first.headers["ETag"]})
+    progress_service.finish_job_progress("job-etag", "COMPLETED", processed=10)
+    changed = client.get("/jobs/job-etag/status", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert cached.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json["processed"] == 10
+
+def _publish_later(delay, function, *args, **kwargs):
+    timer = threading.Timer(delay, function, args=args, kwargs=kwargs)
+    timer.start()
+    return timer
+
+def test_long_poll_returns_on_completion_event(client):
+    progress_service.start_job_progress("job-wait", 10)
+    timer = _publish_later(0.2, progress_service.finish_job_progress, "job-wait", "COMPLETED", processed=10)
+
+    started = time.monotonic()
+    response = client.get("/jobs/job-wait/status?wait=5")
+    timer.join()
+
+    assert response.status_code == 200
+    assert response.json["status"] == "COMPLETED"
+    assert time.monotonic() - started < 5
+
+def test_long_poll_returns_immediately_for_terminal_job(client):
+    progress_service.start_job_progress("job-done", 10)
+    progress_service.finish_job_progress("job-done", "FAILED")
+
+    started = time.monotonic()
+    response = client.get("/jobs/job-done/status?wait=5")
+
+    assert response.json["status"] == "FAILED"
+    assert time.monotonic() - started < 1
+
+def test_events_stream_until_terminal_status(client):
+    progress_service.start_job_progress("job-sse", 4)
+    timers = [
+        _publish_later(0.2, progress_service.add_prepared_operations, "job-sse", 2),
+        _publish_later(0.4, progress_service.finish_job_progress, "job-sse", "COMPLETED", processed=4),
+    ]
+
+    response = client.get("/jobs/job-sse/events")
+    body = b"".join(response.response).decode()
+    for timer in timers:
+        timer.join()
+
+    assert response.mimetype == "text/event-stream"
+    statuses = [json.loads(line[len("data: "):])["status"] for line in body.splitlines() if line.startswith("data: ")]
+    assert statuses[0] == "PROCESSING"
+    assert statuses[-1] == "COMPLETED"
+
+def test_events_returns_404_for_unknown_job(client):
+    assert client.get("/jobs/unknown/events").status_code == 404
+
+def test_status_batch_reports_missing_jobs_inline(client):
+    job = ProcessingJob(status="COMPLETED")
+    db.session.add(job)
+    db.session.commit()
+
+    response = client.post("/jobs/status:batch", json={"job_ids": [job.job_id, "missing", job.job_id]})
+
+    assert response.status_code == 200
+    assert response.json["jobs"] == [
+        {"job_id": job.job_id, "status": "COMPLETED", "total_operations": 0, "processed": 0, "failed": 0,
+         "estimated_completion": None},
+        {"job_id": "missing", "error": "Job not found"},
+    ]
+
+def test_status_batch_rejects_empty_list(client):
+    assert client.post("/jobs/status:batch", json={"job_ids": []}).status_code == 400
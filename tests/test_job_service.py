@@ -0,0 +1,45 @@
+from app.db import db
+from app.db.models import ProcessingJob, Operation
+from sqlalchemy import event
+from app.services.job_service import get_operation_counts, get_jobs_status
+
+def test_operation_counts_grouped_by_status(app_ctx):
+    job = ProcessingJob(status="PROCESSING")
+    db.session.add(job)
+    db.session.commit()
+    for i, status in enumerate(["PROCESSED", "PROCESSED", "FAILED", "PENDING"]):
+        db.session.add(Operation(
+            id=f"op_{i}", asset_code="PETR4", operation_type="BUY", quantity=1, status=status, job_id=job.job_id
+        ))
+    db.session.commit()
+
+    assert get_operation_counts(job.job_id) == {"total_operations": 4, "processed": 2, "failed": 1}
+    assert get_operation_counts("missing") == {"total_operations": 0, "processed": 0, "failed": 0}
+
+def test_jobs_status_for_many_jobs_in_two_queries(app_ctx):
+    jobs = [ProcessingJob(status="PROCESSING") for _ in range(3)]
+    db.session.add_all(jobs)
+    db.session.commit()
+    for j, job in enumerate(jobs):
+        for i in range(j + 1):
+            db.session.add(Operation(
+                id=f"op_{j}_{i}", asset_code="PETR4", operation_type="BUY", quantity=1,
+                status="PROCESSED" if i % 2 == 0 else "FAILED", job_id=job.job_id
+            ))
+    db.session.commit()
+    job_ids = [job.job_id for job in jobs]
+    db.session.expunge_all()
+
+    statements = []
+    listen = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listen)
+    try:
+        statuses = get_jobs_status(job_ids + ["missing"])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listen)
+
+    assert len(statements) == 2
+    assert set(statuses) == set(job_ids)
+    assert statuses[job_ids[2]]["total_operations"] == 3
+    assert statuses[job_ids[2]]["processed"] == 2
+    assert statuses[job_ids[2]]["failed"] == 1
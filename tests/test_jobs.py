@@ -1,7 +1,7 @@
 import pytest
-from fidc_api.app import create_app
-from fidc_api.app.db import db
-from fidc_api.app.db.models import ProcessingJob
+from app import create_app
+from app.db import db
+from app.db.models import ProcessingJob
 
 @pytest.fixture
 def client():
@@ -0,0 +1,44 @@
+import json
+import sys
+import logging
+from app.utils.logger import JsonFormatter, OperationLogSampler, _RecordQueueHandler
+
+def make_record(**extra):
+    record = logging.LogRecord("fidc", logging.INFO, __file__, 1, "Job %s finalizado", ("job-1",), None)
+    record.__dict__.update(extra)
+    return record
+
+def test_formatter_includes_every_extra():
+    record = make_record(job_id="job-1", chunks=3, price_cache={"misses": 2})
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["message"] == "Job job-1 finalizado"
+    assert payload["job_id"] == "job-1"
+    assert payload["chunks"] == 3
+    assert payload["price_cache"] == {"misses": 2}
+
+def test_queue_handler_resolves_message_and_exception_before_enqueue():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record(job_id="job-1")
+        record.exc_info = sys.exc_info()
+
+    prepared = _RecordQueueHandler(None).prepare(record)
+    payload = json.loads(JsonFormatter().format(prepared))
+
+    assert prepared.args is None and prepared.exc_info is None
+    assert record.exc_info is not None
+    assert "ValueError: boom" in payload["exception"]
+
+def test_operation_sampler_emits_one_in_n_and_summarizes(caplog):
+    logger = logging.getLogger("test_sampler")
+    sampler = OperationLogSampler(logger, "job-1", sample_rate=0.1)
+
+    with caplog.at_level(logging.INFO, logger="test_sampler"):
+        for i in range(25):
+            sampler.info("Operação processada", operation_id=f"op_{i}")
+
+    assert [record.operation_id for record in caplog.records] == ["op_0", "op_10", "op_20"]
+    assert sampler.summary() == {"operations_seen": 25, "operations_logged": 3, "operations_suppressed": 22}
@@ -0,0 +1,55 @@
+import pytest
+from prometheus_client import REGISTRY
+from app.db import db
+from app.db.models import ProcessingJob
+from app.routes.metrics import metrics_bp
+from app.routes.health import health_bp
+from app.utils.metrics import init_app_metrics, timed, ASSET_PRICE_SECONDS
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.fixture
+def blueprints():
+    return [(health_bp, None), (metrics_bp, None)]
+
+@pytest.fixture
+def client(app):
+    init_app_metrics(app)
+    return app.test_client()
+
+def test_timed_observes_success_and_error():
+    ok_before = sample("fidc_asset_price_fetch_seconds_count", outcome="ok")
+    error_before = sample("fidc_asset_price_fetch_seconds_count", outcome="error")
+
+    @timed(ASSET_PRICE_SECONDS, outcome=True)
+    def fetch(fail):
+        if fail:
+            raise RuntimeError("falha")
+        return 10.0
+
+    fetch(False)
+    with pytest.raises(RuntimeError):
+        fetch(True)
+
+    assert sample("fidc_asset_price_fetch_seconds_count", outcome="ok") == ok_before + 1
+    assert sample("fidc_asset_price_fetch_seconds_count", outcome="error") == error_before + 1
+
+def test_metrics_endpoint_exposes_route_and_db_latency(client):
+    before = sample(
+        "fidc_http_request_duration_seconds_count", blueprint="health", route="/health", method="GET", status="200"
+    )
+    commits_before = sample("fidc_db_duration_seconds_count", operation="commit")
+
+    client.get("/health")
+    db.session.add(ProcessingJob(status="PROCESSING"))
+    db.session.commit()
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    assert b"fidc_http_request_duration_seconds_bucket" in response.data
+    assert sample(
+        "fidc_http_request_duration_seconds_count", blueprint="health", route="/health", method="GET", status="200"
+    ) == before + 1
+    assert sample("fidc_db_duration_seconds_count", operation="commit") >= commits_before + 1
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.db import db
+from app.db.models import ProcessingJob, Operation, OperationId
+import json
+from app.services.operation_service import bulk_insert_pending_operations, bulk_settle_operations, ingest_ndjson_operations, iter_pending_operations
+
+def make_operations(total):
+    return [
+        {"id": f"op_{i:05d}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}
+        for i in range(total)
+    ]
+
+def test_bulk_insert_creates_pending_rows(app_ctx):
+    job = ProcessingJob(status="PROCESSING")
+    db.session.add(job)
+    db.session.commit()
+
+    inserted = bulk_insert_pending_operations(job.job_id, make_operations(25), chunk_size=10)
+    db.session.commit()
+
+    assert inserted == 25
+    assert db.session.query(Operation).filter_by(job_id=job.job_id, status="PENDING").count() == 25
+
+def test_bulk_settle_updates_pending_rows_in_place(app_ctx):
+    job = ProcessingJob(status="PROCESSING")
+    db.session.add(job)
+    db.session.commit()
+    bulk_insert_pending_operations(job.job_id, make_operations(5))
+    db.session.commit()
+
+    rows = [
+        {"id": f"op_{i:05d}", "status": "PROCESSED", "execution_price": 10.0,
+         "total_value": 100.5, "tax_paid": 0.5, "fidc_id": None}
+        for i in range(5)
+    ]
+    updated = bulk_settle_operations(job.job_id, rows, chunk_size=2)
+    db.session.commit()
+
+    assert updated == 5
+    assert db.session.query(Operation).count() == 5
+    op = db.session.get(Operation, "op_00003")
+    assert op.status == "PROCESSED"
+    assert op.total_value == 100.5
+
+def test_ndjson_ingest_commits_in_batches_and_reports_bad_lines(app_ctx):
+    job = ProcessingJob(status="RECEIVING")
+    db.session.add(job)
+    db.session.add(Operation(id="op_existing", asset_code="PETR4", operation_type="BUY", quantity=1))
+    db.session.add(OperationId(id="op_existing"))
+    db.session.commit()
+    lines = [json.dumps(op) for op in make_operations(5)]
+    lines.insert(2, "{not json")
+    lines.insert(4, json.dumps({"id": "op_x", "asset_code": "PETR4", "operation_type": "BUY"}))
+    lines.append(json.dumps(make_operations(1)[0]))
+    lines.append(json.dumps({"id": "op_existing", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}))
+    persisted_while_reading = []
+
+    def stream():
+        for line in lines:
+            persisted_while_reading.append(db.session.query(Operation).filter_by(job_id=job.job_id).count())
+            yield line + "\n"
+
+    result = ingest_ndjson_operations(job.job_id, stream(), chunk_size=2)
+
+    assert result["accepted"] == 5
+    assert result["rejected"] == 4
+    assert [error["line"] for error in result["errors"]] == [3, 5, 8, 9]
+    assert "quantity" in result["errors"][1]["messages"]
+    assert [row.id for row in iter_pending_operations(job.job_id)] == [f"op_{i:05d}" for i in range(5)]
+    assert db.session.query(Operation).filter_by(job_id=job.job_id, status="PENDING").count() == 5
+    # Lotes de 2 gravados durante a leitura, antes do fim do upload
+    assert persisted_while_reading == [0, 0, 2, 2, 2, 2, 4, 4, 4]
+
+def test_bulk_settle_only_touches_rows_of_the_job(app_ctx):
+    job = ProcessingJob(status="PROCESSING")
+    other = ProcessingJob(status="PROCESSING")
+    db.session.add_all([job, other])
+    db.session.commit()
+    bulk_insert_pending_operations(other.job_id, make_operations(1))
+    db.session.commit()
+    created_at = db.session.get(Operation, "op_00000").created_at
+
+    rows = [{"id": "op_00000", "status": "PROCESSED", "execution_price": 10.0,
+             "total_value": 100.5, "tax_paid": 0.5, "fidc_id": None}]
+    updated = bulk_settle_operations(job.job_id, rows, created_range=(created_at, created_at))
+    db.session.commit()
+
+    assert updated == 0
+    assert db.session.get(Operation, "op_00000").status == "PENDING"
+
+def test_ids_of_archived_operations_stay_reserved(app_ctx):
+    # Id registrado em operation_ids cuja operação saiu de operations (partição arquivada)
+    job = ProcessingJob(status="RECEIVING")
+    db.session.add_all([job, OperationId(id="op_00001")])
+    db.session.commit()
+
+    result = ingest_ndjson_operations(job.job_id, [json.dumps(op) for op in make_operations(3)])
+
+    assert result["accepted"] == 2
+    assert result["errors"] == [{"line": 2, "messages": {"id": ["Operação já existente."]}}]
+    assert db.session.query(OperationId).count() == 3
+    with pytest.raises(IntegrityError):
+        bulk_insert_pending_operations(job.job_id, make_operations(1))
+        db.session.flush()
@@ -1,14 +1,35 @@
+import boto3
+import fakeredis
 import pytest
-from fidc_api.app import create_app
-from fidc_api.app.db import db
-from fidc_api.app.db.models import ProcessingJob, Operation
+from moto import mock_aws
+from app import create_app
+from app.db import db
+from app.db.models import FidcCash, ProcessingJob, Operation
+from app.services import export_service, idempotency_service, progress_service
+from app.routes import operations as operations_routes
+from app.workers import tasks
 
 @pytest.fixture
-def client():
+def client(monkeypatch):
+    # Offline: Celery, Redis e S3 substituídos por stubs locais
+    dispatched = []
+    monkeypatch.setattr(tasks.process_operations_job, "delay", lambda *args: dispatched.append(args))
+    monkeypatch.setattr(operations_routes, "PROCESS_MAX_PAYLOAD_BYTES", 4096)
+    progress_redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(progress_service, "get_redis_client", lambda: progress_redis)
+    monkeypatch.setattr(idempotency_service, "get_redis_client", lambda: progress_redis)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
     app = create_app(testing=True)
-    with app.app_context():
+    with mock_aws(), app.app_context():
+        monkeypatch.setattr(export_service, "get_s3_client", lambda: boto3.client("s3", region_name="us-east-1"))
         db.create_all()
-        yield app.test_client()
+        db.session.add_all([FidcCash(fidc_id="FIDC001", available_cash=0.0), FidcCash(fidc_id="FIDC002", available_cash=0.0)])
+        db.session.commit()
+        client = app.test_client()
+        client.dispatched = dispatched
+        yield client
         db.session.remove()
         db.drop_all()
 
@@ -34,6 +55,17 @@ def test_process_operations_success(client):
     response = client.post("/operations/process", json=payload)
     assert response.status_code == 201
     assert "job_id" in response.json
+    # Claim-check: a mensagem do Celery leva só os ids, as operações ficam no banco
+    assert client.dispatched == [(response.json["job_id"], "FIDC001")]
+    assert db.session.query(Operation).filter_by(job_id=response.json["job_id"], status="PENDING").count() == 1
+
+def test_process_operations_rejects_oversized_payload(client):
+    operations = [
+        {"id": f"op_{i}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1} for i in range(100)
+    ]
+    response = client.post("/operations/process", json={"fidc_id": "FIDC001", "operations": operations})
+    assert response.status_code == 413
+    assert client.dispatched == []
 
 def test_export_operations_invalid_payload(client):
     # Payload inválido (faltando campos obrigatórios)
@@ -64,4 +96,145 @@ def test_export_operations_success(client):
     }
     response = client.post("/operations/export", json=payload)
     # O teste espera 200, mas pode ser ajustado conforme sua lógica de filtro
-    assert response.status_code in (200, 400)
\ No newline at end of file
+    assert response.status_code in (200, 400)
+
+def test_process_stream_accepts_valid_lines_and_reports_errors(client):
+    body = "\n".join([
+        '{"id": "op_s1", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}',
+        '{"id": "op_s2", "asset_code": "PETR4"}',
+        '{"id": "op_s3", "asset_code": "VALE3", "operation_type": "SELL", "quantity": 5}',
+    ]) + "\n"
+
+    response = client.post(
+        "/operations/process:stream?fidc_id=FIDC001", data=body, content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 201
+    assert response.json["accepted"] == 2
+    assert response.json["rejected"] == 1
+    assert response.json["errors"][0]["line"] == 2
+    job = db.session.get(ProcessingJob, response.json["job_id"])
+    assert job.status == "PROCESSING"
+    assert db.session.query(Operation).filter_by(job_id=job.job_id, fidc_id="FIDC001").count() == 2
+
+def test_process_stream_aborted_mid_read_discards_job_and_committed_batches(client, monkeypatch):
+    ingest = operations_routes.ingest_ndjson_operations
+
+    def disconnecting_ingest(job_id, stream, fidc_id=None):
+        def lines():
+            yield '{"id": "op_a1", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}'
+            yield '{"id": "op_a2", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}'
+            raise OSError("Cliente desconectou")
+        # Lotes de uma linha: op_a1 e op_a2 já confirmados quando a leitura falha
+        return ingest(job_id, lines(), fidc_id=fidc_id, chunk_size=1)
+
+    monkeypatch.setattr(operations_routes, "ingest_ndjson_operations", disconnecting_ingest)
+    with pytest.raises(OSError):
+        client.post(
+            "/operations/process:stream?fidc_id=FIDC001", data="{}\n", content_type="application/x-ndjson",
+            headers={"Idempotency-Key": "upload-1"}
+        )
+
+    assert db.session.query(Operation).count() == 0
+    assert db.session.query(ProcessingJob).count() == 0
+    assert client.dispatched == []
+
+def test_process_stream_rejects_other_content_types(client):
+    response = client.post("/operations/process:stream?fidc_id=FIDC001", json={})
+    assert response.status_code == 415
+
+IDEMPOTENT_PAYLOAD = {
+    "fidc_id": "FIDC001",
+    "operations": [{"id": "op_i1", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}]
+}
+
+def test_process_retry_with_idempotency_key_returns_original_job(client):
+    headers = {"Idempotency-Key": "req-123"}
+    first = client.post("/operations/process", json=IDEMPOTENT_PAYLOAD, headers=headers)
+    retry = client.post("/operations/process", json=IDEMPOTENT_PAYLOAD, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json["job_id"] == first.json["job_id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    # O reenvio não cria job nem dispara o worker
+    assert db.session.query(ProcessingJob).count() == 1
+    assert len(client.dispatched) == 1
+
+def test_process_reused_idempotency_key_with_other_payload_is_rejected(client):
+    headers = {"Idempotency-Key": "req-123"}
+    client.post("/operations/process", json=IDEMPOTENT_PAYLOAD, headers=headers)
+    other = {**IDEMPOTENT_PAYLOAD, "operations": [{**IDEMPOTENT_PAYLOAD["operations"][0], "quantity": 20}]}
+
+    response = client.post("/operations/process", json=other, headers=headers)
+
+    assert response.status_code == 422
+    assert len(client.dispatched) == 1
+
+def test_process_identical_payload_without_key_is_deduplicated(client):
+    first = client.post("/operations/process", json=IDEMPOTENT_PAYLOAD)
+    retry = client.post("/operations/process", json=IDEMPOTENT_PAYLOAD)
+
+    assert retry.status_code == 201
+    assert retry.json["job_id"] == first.json["job_id"]
+    assert len(client.dispatched) == 1
+
+def test_process_rejects_operation_ids_already_stored(client):
+    # Com operations particionada a PK não cobre o id sozinho: a verificação é feita antes de gravar
+    operation = {"id": "op_dup", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}
+    first = client.post("/operations/process", json={"fidc_id": "FIDC001", "operations": [operation]})
+    assert first.status_code == 201
+
+    response = client.post("/operations/process", json={"fidc_id": "FIDC002", "operations": [operation]})
+    assert response.status_code == 409
+    assert response.json["ids"] == ["op_dup"]
+    assert db.session.query(ProcessingJob).count() == 1
+
+    repeated = client.post("/operations/process", json={
+        "fidc_id": "FIDC001",
+        "operations": [dict(operation, id="op_new"), dict(operation, id="op_new")]
+    })
+    assert repeated.status_code == 400
+
+def test_process_rejects_empty_strings(client):
+    operation = {"id": "op_empty", "asset_code": "", "operation_type": "BUY", "quantity": 10}
+
+    response = client.post("/operations/process", json={"fidc_id": "FIDC001", "operations": [operation]})
+
+    assert response.status_code == 400
+    assert "asset_code" in response.json["messages"]["operations"]["0"]
+
+def test_process_non_unique_integrity_error_is_not_reported_as_conflict(client, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+
+    def not_null_violation(*args, **kwargs):
+        raise IntegrityError("COPY operations", {}, Exception("NOT NULL constraint failed: operations.asset_code"))
+
+    monkeypatch.setattr(operations_routes, "bulk_insert_pending_operations", not_null_violation)
+    operation = {"id": "op_null", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}
+
+    with pytest.raises(IntegrityError):
+        client.post("/operations/process", json={"fidc_id": "FIDC001", "operations": [operation]})
+    assert db.session.query(ProcessingJob).count() == 0
+
+def test_process_unknown_fidc_returns_404(client):
+    operation = {"id": "op_nofidc", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}
+
+    response = client.post("/operations/process", json={"fidc_id": "FIDC999", "operations": [operation]})
+    stream = client.post(
+        "/operations/process:stream?fidc_id=FIDC999", data="{}\n", content_type="application/x-ndjson"
+    )
+
+    assert (response.status_code, stream.status_code) == (404, 404)
+    assert db.session.query(ProcessingJob).count() == 0
+
+def test_process_id_stored_after_the_check_returns_409_and_discards_job(client, monkeypatch):
+    operation = {"id": "op_race", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}
+    assert client.post("/operations/process", json={"fidc_id": "FIDC001", "operations": [operation]}).status_code == 201
+    # Outra requisição grava o id entre a verificação e a gravação: a PK de operation_ids recusa
+    monkeypatch.setattr(operations_routes, "find_existing_operation_ids", lambda ids: set())
+
+    response = client.post("/operations/process", json={"fidc_id": "FIDC002", "operations": [operation]})
+
+    assert response.status_code == 409
+    assert db.session.query(ProcessingJob).count() == 1
+    assert db.session.query(Operation).count() == 1
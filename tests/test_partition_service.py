@@ -0,0 +1,50 @@
+from datetime import datetime
+from app.db import db
+from app.db.models import Operation, ProcessingJob
+from app.services.partition_service import (
+    add_months, archive_partitions, ensure_partitions, in_flight_pending_jobs, is_partitioned,
+    missing_partition_months, parse_partition_bound, partition_name
+)
+
+def test_partition_bounds_are_parsed_from_pg_get_expr():
+    assert parse_partition_bound(
+        "FOR VALUES FROM ('2026-11-01 00:00:00') TO ('2026-12-01 00:00:00')"
+    ) == (datetime(2026, 11, 1), datetime(2026, 12, 1))
+    assert parse_partition_bound("FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00')") == (None, datetime(2026, 11, 1))
+
+def test_missing_months_skip_ranges_already_covered():
+    today = datetime(2026, 11, 18)
+    # Legada cobre até o fim do mês da migração; dezembro já existe
+    partitions = [
+        ("operations_legacy", None, datetime(2026, 12, 1), False),
+        ("operations_2026_12", datetime(2026, 12, 1), datetime(2027, 1, 1), False),
+    ]
+    missing = missing_partition_months(partitions, 2, today)
+    assert missing == [datetime(2027, 1, 1)]
+    assert partition_name(missing[0]) == "operations_2027_01"
+    assert add_months(datetime(2026, 12, 1), 1) == datetime(2027, 1, 1)
+
+def test_maintenance_is_a_noop_without_partitioning(app_ctx):
+    # SQLite (e Postgres antes da migração 0006): nada a criar nem arquivar
+    assert not is_partitioned()
+    assert ensure_partitions() == []
+    assert archive_partitions() == []
+
+def test_only_pending_rows_of_in_flight_jobs_block_archival(app_ctx):
+    running = ProcessingJob(status="PROCESSING")
+    failed = ProcessingJob(status="FAILED")
+    db.session.add_all([running, failed])
+    db.session.commit()
+    db.session.add_all([
+        Operation(id="op_1", asset_code="PETR4", operation_type="BUY", quantity=1, job_id=running.job_id),
+        Operation(id="op_2", asset_code="PETR4", operation_type="BUY", quantity=1, job_id=failed.job_id),
+        # Histórico PENDING sem job (ex.: operations_legacy)
+        Operation(id="op_3", asset_code="PETR4", operation_type="BUY", quantity=1),
+    ])
+    db.session.commit()
+
+    assert in_flight_pending_jobs("operations") == {running.job_id: 1}
+
+    running.status = "COMPLETED"
+    db.session.commit()
+    assert in_flight_pending_jobs("operations") == {}
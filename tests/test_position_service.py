@@ -0,0 +1,65 @@
+import pytest
+from app import create_app
+from app.db import db
+from app.db.models import ArchivedPartition, FidcCash, Position
+from app.services.position_service import PositionsRebuildError, apply_trade, rebuild_positions
+
+def test_apply_trade_average_cost_and_realized_pnl():
+    # Compra 10 a 10,00 (+0,5%): custo médio 10,05
+    position = apply_trade(0, 0.0, 0.0, "BUY", 10, 100.5)
+    assert position == pytest.approx((10, 10.05, 0.0))
+
+    # Venda parcial de 4 a 10,00 (-0,3%): realiza 4 x (9,97 - 10,05), custo médio mantido
+    position = apply_trade(*position, "SELL", 4, 39.88)
+    assert position == pytest.approx((6, 10.05, -0.32))
+
+    # Venda de 10 inverte a posição: encerra 6 e abre -4 ao valor da venda
+    position = apply_trade(*position, "SELL", 10, 99.7)
+    assert position == pytest.approx((-4, 9.97, -0.32 + 6 * (9.97 - 10.05)))
+
+    # Compra zera a posição vendida
+    position = apply_trade(*position, "BUY", 4, 40.2)
+    assert position[0] == 0
+    assert position[1] == 0.0
+
+@pytest.fixture
+def client():
+    app = create_app(testing=True)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def test_positions_endpoint(client):
+    db.session.add(FidcCash(fidc_id="FIDC001", available_cash=500.0))
+    db.session.add_all([
+        Position(fidc_id="FIDC001", asset_code="VALE3", quantity=5, average_cost=60.0, realized_pnl=0.0),
+        Position(fidc_id="FIDC001", asset_code="PETR4", quantity=10, average_cost=30.0, realized_pnl=12.5),
+    ])
+    db.session.commit()
+
+    response = client.get("/fidcs/FIDC001/positions")
+
+    assert response.status_code == 200
+    assert response.json["available_cash"] == 500.0
+    assert [position["asset_code"] for position in response.json["positions"]] == ["PETR4", "VALE3"]
+    assert response.json["positions"][0]["realized_pnl"] == 12.5
+
+def test_positions_endpoint_unknown_fidc(client):
+    assert client.get("/fidcs/FIDC999/positions").status_code == 404
+
+def test_rebuild_refuses_after_partitions_were_archived(client):
+    db.session.add(FidcCash(fidc_id="FIDC001", available_cash=500.0))
+    db.session.add(Position(fidc_id="FIDC001", asset_code="PETR4", quantity=10, average_cost=30.0, realized_pnl=0.0))
+    db.session.add(ArchivedPartition(
+        partition="operations_legacy", bucket="fidc-exports", key="archive/operations/operations_legacy.csv.gz",
+        operations=10
+    ))
+    db.session.commit()
+
+    # Sem as operações arquivadas, o rebuild zeraria a posição
+    with pytest.raises(PositionsRebuildError):
+        rebuild_positions()
+
+    assert db.session.get(Position, ("FIDC001", "PETR4")).quantity == 10
@@ -0,0 +1,61 @@
+import fakeredis
+import pytest
+from app.services.price_cache import PriceCache, JobPriceMemo
+
+@pytest.fixture
+def fetcher():
+    calls = []
+
+    def fetch(asset_code):
+        calls.append(asset_code)
+        return 42.0
+
+    fetch.calls = calls
+    return fetch
+
+def test_job_memo_fetches_each_asset_once(fetcher):
+    cache = PriceCache(fetcher=fetcher, redis_client=fakeredis.FakeRedis())
+    memo = JobPriceMemo(cache)
+
+    for asset_code in ["PETR4", "VALE3"] * 50:
+        assert memo.get(asset_code) == 42.0
+
+    assert fetcher.calls == ["PETR4", "VALE3"]
+    assert memo.stats() == {"hits": 98, "misses": 2, "distinct_assets": 2}
+
+def test_shared_cache_is_reused_across_workers(fetcher):
+    server = fakeredis.FakeServer()
+    worker_a = PriceCache(fetcher=fetcher, redis_client=fakeredis.FakeRedis(server=server))
+    worker_b = PriceCache(fetcher=fetcher, redis_client=fakeredis.FakeRedis(server=server))
+
+    worker_a.get("PETR4")
+    worker_b.get("PETR4")
+
+    assert fetcher.calls == ["PETR4"]
+    assert worker_b.stats()["redis_hits"] == 1
+
+def test_local_lru_evicts_least_recently_used(fetcher):
+    cache = PriceCache(fetcher=fetcher, redis_client=fakeredis.FakeRedis(), max_size=2)
+    cache.get("A")
+    cache.get("B")
+    cache.get("A")
+    cache.get("C")
+
+    assert cache.stats()["size"] == 2
+    assert cache._get_local("B") is None
+    assert cache._get_local("A") == 42.0
+
+def test_job_price_is_pinned_across_chunks_after_cache_expiry():
+    prices = iter([10.0, 20.0, 30.0])
+    redis_client = fakeredis.FakeRedis()
+    cache = PriceCache(fetcher=lambda asset_code: next(prices), redis_client=redis_client)
+
+    first_chunk = JobPriceMemo(cache, job_id="job-1")
+    assert first_chunk.get("PETR4") == 10.0
+
+    # Cache expirado (local e Redis): o próximo chunk do job ainda usa o preço fixado
+    cache.clear()
+    redis_client.delete("asset_price_cache:PETR4")
+    assert JobPriceMemo(cache, job_id="job-1").get("PETR4") == 10.0
+    # Outro job consulta de novo
+    assert JobPriceMemo(cache, job_id="job-2").get("PETR4") == 20.0
@@ -0,0 +1,61 @@
+import asyncio
+import fakeredis
+import pytest
+from app.services.rate_limiter import TokenBucketRateLimiter, RateLimitTimeout
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+def test_bucket_allows_capacity_then_blocks(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=3, period=60)
+
+    results = [limiter.try_acquire("PETR4")[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+    allowed, wait = limiter.try_acquire("PETR4")
+    assert not allowed
+    assert 0 < wait <= 20
+
+def test_buckets_are_per_asset(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=1, period=60)
+
+    assert limiter.try_acquire("PETR4")[0]
+    assert limiter.try_acquire("VALE3")[0]
+    assert not limiter.try_acquire("PETR4")[0]
+
+def test_bucket_key_always_has_ttl(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=10, period=60)
+    limiter.try_acquire("PETR4")
+
+    assert redis_client.pttl("asset_price_bucket:PETR4") > 0
+
+def test_acquire_waits_for_next_token(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=5, period=0.5)
+    for _ in range(5):
+        limiter.acquire("PETR4")
+
+    waited = limiter.acquire("PETR4", timeout=2)
+
+    assert waited > 0
+    stats = limiter.stats()
+    assert stats["acquired"] == 6
+    assert stats["waits"] == 1
+    assert stats["max_wait_seconds"] > 0
+
+def test_acquire_times_out(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=1, period=60)
+    limiter.acquire("PETR4")
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("PETR4", timeout=0.1)
+    assert limiter.stats()["timeouts"] == 1
+
+def test_acquire_async(redis_client):
+    limiter = TokenBucketRateLimiter(redis_client=redis_client, capacity=2, period=0.2)
+
+    async def run():
+        return [await limiter.acquire_async("PETR4", timeout=1) for _ in range(3)]
+
+    waits = asyncio.run(run())
+    assert waits[-1] > 0
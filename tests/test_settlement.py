@@ -0,0 +1,68 @@
+import random
+import numpy as np
+import pytest
+from app.services.settlement import settle_batch
+
+def sequential_settle(quantities, prices, operation_types, cash):
+    # Implementação de referência: o loop original do worker
+    totals = []
+    for quantity, price, operation_type in zip(quantities, prices, operation_types):
+        gross = quantity * price
+        if operation_type == "BUY":
+            total = gross + gross * 0.005
+            if cash < total:
+                return totals, cash, len(totals)
+            cash -= total
+        else:
+            total = gross - gross * 0.003
+            cash += total
+        totals.append(total)
+    return totals, cash, None
+
+def test_buy_and_sell_taxes():
+    result = settle_batch([100, 100], [10.0, 10.0], ["BUY", "SELL"], 2000.0)
+
+    assert result.tax.tolist() == pytest.approx([5.0, 3.0])
+    assert result.total.tolist() == pytest.approx([1005.0, 997.0])
+    assert result.settled == 2
+    assert result.overdraw_index is None
+    assert result.final_cash == pytest.approx(2000.0 - 1005.0 + 997.0)
+
+def test_stops_at_first_overdraw():
+    result = settle_batch([10, 100, 1], [10.0, 10.0, 10.0], ["BUY", "BUY", "SELL"], 500.0)
+
+    assert result.overdraw_index == 1
+    assert result.settled == 1
+    assert result.final_cash == pytest.approx(500.0 - 100.5)
+
+def test_sell_can_fund_later_buy():
+    result = settle_batch([100, 100], [10.0, 10.0], ["SELL", "BUY"], 100.0)
+    assert result.overdraw_index is None
+
+def test_invalid_inputs():
+    with pytest.raises(ValueError):
+        settle_batch([1], [10.0], ["HOLD"], 100.0)
+    with pytest.raises(ValueError):
+        settle_batch([1], [0.0], ["BUY"], 100.0)
+
+def test_empty_batch():
+    result = settle_batch([], [], [], 100.0)
+    assert result.settled == 0
+    assert result.final_cash == 100.0
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_sequential_loop(seed):
+    rng = random.Random(seed)
+    size = rng.randint(1, 300)
+    quantities = [rng.randint(1, 1000) for _ in range(size)]
+    prices = [round(rng.uniform(10, 100), 2) for _ in range(size)]
+    operation_types = [rng.choice(["BUY", "SELL"]) for _ in range(size)]
+    cash = rng.uniform(0, 2_000_000)
+
+    totals, final_cash, overdraw_index = sequential_settle(quantities, prices, operation_types, cash)
+    result = settle_batch(quantities, prices, operation_types, cash)
+
+    assert result.overdraw_index == overdraw_index
+    assert result.settled == len(totals)
+    np.testing.assert_allclose(result.total[:result.settled], totals)
+    assert result.final_cash == pytest.approx(final_cash)
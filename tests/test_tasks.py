@@ -0,0 +1,356 @@
+from concurrent.futures import ThreadPoolExecutor
+import fakeredis
+import pytest
+from flask import Flask
+from app.db import db
+from app.db.models import FidcCash, ProcessingJob, Operation
+from app.services.operation_service import bulk_insert_pending_operations, save_operation_prices
+from app.services import price_cache as price_cache_module
+from app.services import progress_service
+from app.services.position_service import get_positions, rebuild_positions
+from app.workers import tasks
+
+@pytest.fixture
+def flask_app(monkeypatch, tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'worker.db'}"
+    db.init_app(app)
+
+    monkeypatch.setattr(tasks, "get_worker_app", lambda: app)
+    monkeypatch.setattr(tasks.celery.conf, "task_always_eager", True)
+    monkeypatch.setattr(tasks.celery.conf, "task_eager_propagates", True)
+    monkeypatch.setattr(price_cache_module.price_cache, "_fetcher", lambda asset_code: 10.0)
+    monkeypatch.setattr(price_cache_module.price_cache, "_redis", fakeredis.FakeRedis())
+    progress_redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(progress_service, "get_redis_client", lambda: progress_redis)
+    monkeypatch.setattr(tasks, "PRICE_RETRY_BASE_DELAY", 0)
+    price_cache_module.price_cache.clear()
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def create_job(operations, available_cash):
+    db.session.add(FidcCash(fidc_id="FIDC001", available_cash=available_cash))
+    job = ProcessingJob(status="PROCESSING")
+    db.session.add(job)
+    db.session.commit()
+    bulk_insert_pending_operations(job.job_id, operations)
+    db.session.commit()
+    progress_service.start_job_progress(job.job_id, len(operations))
+    return job.job_id
+
+def test_split_sequence_range():
+    assert tasks.split_sequence_range(0, 6, 3) == [(0, 2), (3, 5), (6, 6)]
+
+def test_job_is_fanned_out_and_settled_in_order(flask_app, monkeypatch):
+    monkeypatch.setattr(tasks, "JOB_CHUNK_SIZE", 3)
+    operations = [
+        {"id": f"op_{i:03d}", "asset_code": f"ASSET{i % 4}", "operation_type": "BUY" if i % 2 else "SELL", "quantity": 10}
+        for i in range(10)
+    ]
+    job_id = create_job(operations, available_cash=1000.0)
+
+    tasks.process_operations_job.delay(job_id, "FIDC001")
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    assert db.session.query(Operation).filter_by(job_id=job_id, status="PROCESSED").count() == 10
+    # 5 vendas (100 - 0,3%) e 5 compras (100 + 0,5%)
+    assert db.session.get(FidcCash, "FIDC001").available_cash == pytest.approx(1000.0 + 5 * 99.7 - 5 * 100.5)
+    progress = progress_service.get_job_progress(job_id)
+    assert progress["status"] == "COMPLETED"
+    assert progress["processed"] == 10
+
+def test_concurrent_jobs_for_same_fidc_never_overdraw(flask_app):
+    db.session.add_all([FidcCash(fidc_id="FIDC001", available_cash=1000.0), FidcCash(fidc_id="FIDC002", available_cash=1000.0)])
+    db.session.commit()
+    jobs = []
+    for i in range(12):
+        fidc_id = "FIDC001" if i < 10 else "FIDC002"
+        job = ProcessingJob(status="PROCESSING")
+        db.session.add(job)
+        db.session.commit()
+        operations = [{"id": f"op_{i}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10}]
+        bulk_insert_pending_operations(job.job_id, operations)
+        # Checkpoint da preparação: preço já gravado na operação
+        save_operation_prices(job.job_id, 0, 0, {"PETR4": 10.0})
+        db.session.commit()
+        prepared = [{"chunk": 0, "first_sequence": 0, "last_sequence": 0, "operations": 1, "failed": 0}]
+        jobs.append((prepared, job.job_id, fidc_id))
+
+    def settle(args):
+        try:
+            tasks.settle_operations_job.apply(args=args)
+        except Exception:
+            pass
+
+    # Cada compra custa 100,50: só 9 dos 10 jobs do FIDC001 cabem no caixa
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(settle, jobs))
+
+    db.session.expire_all()
+    statuses = [db.session.get(ProcessingJob, job_id).status for _, job_id, _ in jobs]
+    assert statuses[:10].count("COMPLETED") == 9
+    assert statuses[10:] == ["COMPLETED", "COMPLETED"]
+    assert db.session.get(FidcCash, "FIDC001").available_cash == pytest.approx(1000.0 - 9 * 100.5)
+    assert db.session.get(FidcCash, "FIDC002").available_cash == pytest.approx(1000.0 - 2 * 100.5)
+    assert db.session.query(Operation).filter_by(status="PROCESSED", fidc_id="FIDC001").count() == 9
+
+def flaky_fetcher(failures_by_asset):
+    """Falha as primeiras N consultas de cada ativo (N < 0: sempre falha) e registra as chamadas."""
+    calls = []
+
+    def fetch(asset_code):
+        calls.append(asset_code)
+        remaining = failures_by_asset.get(asset_code, 0)
+        if remaining:
+            failures_by_asset[asset_code] = remaining - 1
+            raise Exception("Falha ao consultar preço do ativo")
+        return 10.0
+    fetch.calls = calls
+    return fetch
+
+def test_transient_price_failures_are_retried_per_asset(flask_app, monkeypatch):
+    fetcher = flaky_fetcher({"PETR4": 2})
+    monkeypatch.setattr(price_cache_module.price_cache, "_fetcher", fetcher)
+    operations = [
+        {"id": f"op_{i}", "asset_code": "PETR4" if i % 2 else "VALE3", "operation_type": "SELL", "quantity": 10}
+        for i in range(4)
+    ]
+    job_id = create_job(operations, available_cash=0.0)
+
+    tasks.process_operations_job.delay(job_id, "FIDC001")
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    assert db.session.query(Operation).filter_by(job_id=job_id, status="PROCESSED").count() == 4
+    # Só o ativo com falha foi consultado de novo
+    assert fetcher.calls.count("PETR4") == 3
+    assert fetcher.calls.count("VALE3") == 1
+
+def test_permanent_price_failure_fails_only_that_assets_operations(flask_app, monkeypatch):
+    monkeypatch.setattr(price_cache_module.price_cache, "_fetcher", flaky_fetcher({"PETR4": -1}))
+    operations = [
+        {"id": f"op_{i}", "asset_code": "PETR4" if i % 2 else "VALE3", "operation_type": "SELL", "quantity": 10}
+        for i in range(4)
+    ]
+    job_id = create_job(operations, available_cash=0.0)
+
+    tasks.process_operations_job.delay(job_id, "FIDC001")
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    failed = db.session.query(Operation).filter_by(job_id=job_id, status="FAILED").all()
+    assert sorted(operation.id for operation in failed) == ["op_1", "op_3"]
+    assert all("Preço indisponível" in operation.failure_reason for operation in failed)
+    assert db.session.get(FidcCash, "FIDC001").available_cash == pytest.approx(2 * 99.7)
+    progress = progress_service.get_job_progress(job_id)
+    assert (progress["processed"], progress["failed"]) == (2, 2)
+
+def test_retried_job_resumes_from_checkpoint(flask_app, monkeypatch):
+    monkeypatch.setattr(tasks, "JOB_CHUNK_SIZE", 2)
+    fetcher = flaky_fetcher({})
+    monkeypatch.setattr(price_cache_module.price_cache, "_fetcher", fetcher)
+    operations = [
+        {"id": f"op_{i}", "asset_code": f"ASSET{i}", "operation_type": "SELL", "quantity": 10} for i in range(4)
+    ]
+    job_id = create_job(operations, available_cash=0.0)
+    # Primeiro chunk confirmado antes da queda do worker
+    save_operation_prices(job_id, 0, 1, {"ASSET0": 10.0, "ASSET1": 10.0})
+    db.session.commit()
+
+    tasks.process_operations_job.delay(job_id, "FIDC001")
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    assert db.session.query(Operation).filter_by(job_id=job_id, status="PROCESSED").count() == 4
+    assert sorted(fetcher.calls) == ["ASSET2", "ASSET3"]
+
+def test_settlement_updates_positions_and_rebuild_matches(flask_app):
+    operations = [
+        {"id": "op_p1", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 10},
+        {"id": "op_p2", "asset_code": "PETR4", "operation_type": "SELL", "quantity": 4},
+        {"id": "op_p3", "asset_code": "VALE3", "operation_type": "BUY", "quantity": 5},
+    ]
+    job_id = create_job(operations, available_cash=1000.0)
+
+    tasks.process_operations_job.delay(job_id, "FIDC001")
+
+    def positions():
+        db.session.expire_all()
+        return {
+            position.asset_code: (position.quantity, position.average_cost, position.realized_pnl)
+            for position in get_positions("FIDC001")
+        }
+
+    incremental = positions()
+    assert incremental["PETR4"] == pytest.approx((6, 10.05, 4 * (9.97 - 10.05)))
+    assert incremental["VALE3"] == pytest.approx((5, 10.05, 0.0))
+
+    assert rebuild_positions("FIDC001") == {"FIDC001": 2}
+    rebuilt = positions()
+    assert rebuilt.keys() == incremental.keys()
+    for asset_code, position in incremental.items():
+        assert rebuilt[asset_code] == pytest.approx(position)
+
+def test_exhausted_settlement_fails_remaining_operations(flask_app, monkeypatch):
+    operations = [{"id": "op_big", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}]
+    job_id = create_job(operations, available_cash=100.0)
+    save_operation_prices(job_id, 0, 0, {"PETR4": 10.0})
+    db.session.commit()
+
+    def unavailable(*args):
+        raise ConnectionError("Banco indisponível")
+
+    monkeypatch.setattr(tasks, "settle_batch", unavailable)
+
+    # Tentativa intermediária: o job segue PROCESSING e a operação PENDING
+    with pytest.raises(Exception):
+        tasks.settle_operations_job.apply(args=([], job_id, "FIDC001"), throw=True)
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "PROCESSING"
+    assert db.session.get(Operation, "op_big").status == "PENDING"
+
+    # Última tentativa
+    with pytest.raises(ConnectionError):
+        tasks.settle_operations_job.apply(
+            args=([], job_id, "FIDC001"), retries=tasks.settle_operations_job.max_retries, throw=True
+        )
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "FAILED"
+    operation = db.session.get(Operation, "op_big")
+    assert operation.status == "FAILED"
+    assert "Banco indisponível" in operation.failure_reason
+    progress = progress_service.get_job_progress(job_id)
+    assert (progress["status"], progress["failed"]) == ("FAILED", 1)
+
+def test_insufficient_cash_fails_the_job_without_retrying(flask_app, monkeypatch):
+    operations = [
+        {"id": "op_small", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1},
+        {"id": "op_big", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1000},
+    ]
+    job_id = create_job(operations, available_cash=100.0)
+    save_operation_prices(job_id, 0, 1, {"PETR4": 10.0})
+    db.session.commit()
+    settle_batch = tasks.settle_batch
+    calls = []
+    monkeypatch.setattr(tasks, "settle_batch", lambda *args: calls.append(args) or settle_batch(*args))
+    monkeypatch.setattr(tasks.celery.conf, "task_eager_propagates", False)
+
+    tasks.settle_operations_job.apply(args=([], job_id, "FIDC001"))
+
+    db.session.expire_all()
+    assert len(calls) == 1
+    assert db.session.get(ProcessingJob, job_id).status == "FAILED"
+    assert db.session.get(FidcCash, "FIDC001").available_cash == 100.0
+    reasons = {operation.failure_reason for operation in db.session.query(Operation).filter_by(job_id=job_id)}
+    assert reasons == {"Caixa insuficiente para compra: operação op_big (sequence 1) de 10050.00"}
+
+def test_failing_job_twice_keeps_the_first_reason(flask_app):
+    from app.utils.metrics import JOBS_TOTAL
+
+    operations = [{"id": "op_once", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}]
+    job_id = create_job(operations, available_cash=100.0)
+    failed_jobs = JOBS_TOTAL.labels(status="FAILED")._value.get()
+
+    tasks._fail_job(job_id, "Liquidação falhou: erro")
+    completed_at = db.session.get(ProcessingJob, job_id).completed_at
+    # Um segundo errback (outro chunk, reentrega) não reescreve o job já encerrado
+    tasks.mark_job_failed(None, Exception("chunk esgotou as tentativas"), None, job_id)
+
+    db.session.expire_all()
+    job = db.session.get(ProcessingJob, job_id)
+    assert (job.status, job.completed_at) == ("FAILED", completed_at)
+    assert db.session.get(Operation, "op_once").failure_reason == "Liquidação falhou: erro"
+    assert JOBS_TOTAL.labels(status="FAILED")._value.get() == failed_jobs + 1
+
+def test_errback_is_attached_to_chunks_not_to_settlement(flask_app, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(tasks, "chord", lambda header: lambda callback: dispatched.append((list(header), callback)))
+    job_id = create_job([{"id": "op_1", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}], 100.0)
+
+    tasks.process_operations_job(job_id, "FIDC001")
+
+    (header, callback), = dispatched
+    assert all(chunk.options["link_error"][0]["task"] == tasks.mark_job_failed.name for chunk in header)
+    assert "link_error" not in callback.options
+
+def test_stale_in_flight_jobs_are_failed(flask_app):
+    from datetime import datetime, timedelta
+
+    job_id = create_job([{"id": "op_stale", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}], 100.0)
+    abandoned = db.session.get(ProcessingJob, job_id)
+    abandoned.status = "RECEIVING"
+    abandoned.created_at = datetime.utcnow() - timedelta(seconds=tasks.JOB_STALE_SECONDS + 60)
+    recent = ProcessingJob(status="PROCESSING")
+    db.session.add(recent)
+    db.session.commit()
+
+    assert tasks.fail_stale_jobs() == [job_id]
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "FAILED"
+    assert db.session.get(ProcessingJob, recent.job_id).status == "PROCESSING"
+    assert "abandonado" in db.session.get(Operation, "op_stale").failure_reason
+
+def test_chord_errback_fails_remaining_operations(flask_app):
+    operations = [{"id": f"op_{i}", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1} for i in range(2)]
+    job_id = create_job(operations, available_cash=100.0)
+
+    tasks.mark_job_failed(None, Exception("chunk esgotou as tentativas"), None, job_id)
+
+    db.session.expire_all()
+    assert db.session.get(ProcessingJob, job_id).status == "FAILED"
+    failed = db.session.query(Operation).filter_by(job_id=job_id, status="FAILED").all()
+    assert len(failed) == 2
+    assert all("chunk esgotou" in operation.failure_reason for operation in failed)
+
+def test_busy_fidc_lane_requeues_without_failing_the_job(flask_app, monkeypatch):
+    from app.services.fidc_lane import FidcLaneBusy
+
+    operations = [{"id": "op_lane", "asset_code": "PETR4", "operation_type": "BUY", "quantity": 1}]
+    job_id = create_job(operations, available_cash=100.0)
+    save_operation_prices(job_id, 0, 0, {"PETR4": 10.0})
+    db.session.commit()
+
+    run_in_fidc_lane = tasks.run_in_fidc_lane
+    statuses = []
+
+    def busy_lane(fidc_id, settle):
+        # lock_timeout do SELECT ... FOR UPDATE nas primeiras vezes: fila ocupada, não falha
+        statuses.append((db.session.get(ProcessingJob, job_id).status, progress_service.get_job_progress(job_id)["status"]))
+        if len(statuses) <= 5:
+            raise FidcLaneBusy("Fila do FIDC ocupada")
+        return run_in_fidc_lane(fidc_id, settle)
+
+    monkeypatch.setattr(tasks, "run_in_fidc_lane", busy_lane)
+    monkeypatch.setattr(tasks, "FIDC_LANE_RETRY_DELAY", 0)
+    # Modo eager: apply() só reexecuta os retries com a propagação de exceções desligada
+    monkeypatch.setattr(tasks.celery.conf, "task_eager_propagates", False)
+
+    # Mais esperas na fila do que max_retries: nenhuma conta como tentativa
+    tasks.settle_operations_job.apply(args=([], job_id, "FIDC001"))
+
+    db.session.expire_all()
+    assert len(statuses) == 6
+    assert set(statuses) == {("PROCESSING", "PROCESSING")}
+    assert db.session.get(ProcessingJob, job_id).status == "COMPLETED"
+    assert db.session.get(Operation, "op_lane").status == "PROCESSED"
+
+def test_lock_timeout_is_reported_as_busy_lane(flask_app, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from app.services import fidc_lane
+
+    class LockNotAvailable(Exception):
+        pgcode = fidc_lane.LOCK_NOT_AVAILABLE
+
+    def execute(*args, **kwargs):
+        raise OperationalError("SELECT ... FOR UPDATE", {}, LockNotAvailable("canceling statement due to lock timeout"))
+
+    monkeypatch.setattr(db.session, "execute", execute)
+    with pytest.raises(fidc_lane.FidcLaneBusy):
+        fidc_lane.lock_fidc_cash("FIDC001")